@@ -0,0 +1,123 @@
+"""Incrementally maintained statistics over labelled boxes.
+
+Every counter is updated in O(1) when a box is labelled or removed: per-class
+and per-folder box counts, labelled sets per folder (completion), fixed
+log-scale histograms of box width, height and aspect ratio, and the
+distribution of labelled boxes per image. Only boxes with both a class ID and
+a name count; unlabelled boxes and proposals are ignored.
+"""
+
+import math
+from bisect import bisect_right
+from collections import Counter
+
+from set_index import is_labelled
+
+# Histogram bin edges in pixels: [0, 16), [16, 32), ... [2048, 4096), [4096, inf)
+SIZE_EDGES = [0] + [2 ** k for k in range(4, 13)]
+# Aspect ratio (width / height) bins, symmetric around 1 on a log scale
+ASPECT_EDGES = [0, 1 / 4, 1 / 2, 2 / 3, 3 / 2, 2, 4]
+
+
+def _bin(value, edges):
+    """Index of the bin containing value (edges are ascending lower bounds, so this is O(log bins))"""
+    return max(bisect_right(edges, value) - 1, 0)
+
+
+def bin_labels(edges, fmt="{:g}"):
+    labels = []
+    for low, high in zip(edges, edges[1:] + [None]):
+        labels.append(f"{fmt.format(low)}-{fmt.format(high)}" if high is not None else f">={fmt.format(low)}")
+    return labels
+
+
+class AnnotationStats:
+    """Dataset counters kept in step with every annotation, the working set and the saved folders"""
+
+    def __init__(self, set_index, labels=()):
+        self.set_index = set_index
+        self.rebuild(labels)
+
+    def rebuild(self, labels):
+        self.class_counts = Counter()
+        self.folder_boxes = Counter()
+        self.set_boxes = Counter()        # {global set number: labelled boxes}
+        self.folder_labelled_sets = Counter()
+        self.image_boxes = Counter()      # {image: labelled boxes}
+        self.boxes_per_image = Counter()  # {labelled boxes on an image: number of images}, images with >= 1 box
+        self.width_hist = [0] * len(SIZE_EDGES)
+        self.height_hist = [0] * len(SIZE_EDGES)
+        self.aspect_hist = [0] * len(ASPECT_EDGES)
+        self.total = 0
+        for label in labels:
+            self.add(label)
+
+    def _folder_of_set(self, global_index):
+        return self.set_index.folders[self.set_index.locate(global_index)[0]]
+
+    def _update(self, label, delta):
+        width, height = abs(float(label["width"])), abs(float(label["height"]))
+        self.total += delta
+        self.class_counts[label["name"]] += delta
+        if self.class_counts[label["name"]] <= 0:
+            del self.class_counts[label["name"]]
+        self.width_hist[_bin(width, SIZE_EDGES)] += delta
+        self.height_hist[_bin(height, SIZE_EDGES)] += delta
+        self.aspect_hist[_bin(width / height if height else math.inf, ASPECT_EDGES)] += delta
+
+        image = label["image"]
+        before = self.image_boxes[image]
+        after = before + delta
+        if before:
+            self.boxes_per_image[before] -= 1
+            if not self.boxes_per_image[before]:
+                del self.boxes_per_image[before]
+        if after:
+            self.boxes_per_image[after] += 1
+            self.image_boxes[image] = after
+        else:
+            del self.image_boxes[image]
+
+        global_index = self.set_index.image_to_set.get(image)
+        folder = self._folder_of_set(global_index) if global_index is not None else image.split('/')[0]
+        self.folder_boxes[folder] += delta
+        if global_index is not None:
+            before = self.set_boxes[global_index]
+            self.set_boxes[global_index] = before + delta
+            if before == 0 and delta > 0:
+                self.folder_labelled_sets[folder] += 1
+            elif before + delta == 0:
+                self.folder_labelled_sets[folder] -= 1
+                del self.set_boxes[global_index]
+
+    def add(self, label):
+        if is_labelled(label):
+            self._update(label, 1)
+
+    def remove(self, label):
+        if is_labelled(label):
+            self._update(label, -1)
+
+    def report(self):
+        set_index = self.set_index
+        folders = []
+        for position, folder in enumerate(set_index.folders):
+            total_sets = set_index.offsets[position + 1] - set_index.offsets[position]
+            labelled_sets = self.folder_labelled_sets.get(folder, 0)
+            folders.append({
+                "folder": folder,
+                "sets": total_sets,
+                "labelled_sets": labelled_sets,
+                "completion": labelled_sets / total_sets if total_sets else 0.0,
+                "boxes": self.folder_boxes.get(folder, 0)
+            })
+        return {
+            "boxes": self.total,
+            "labelled_images": len(self.image_boxes),
+            "classes": dict(self.class_counts.most_common()),
+            "folders": folders,
+            "width_histogram": dict(zip(bin_labels(SIZE_EDGES), self.width_hist)),
+            "height_histogram": dict(zip(bin_labels(SIZE_EDGES), self.height_hist)),
+            "aspect_histogram": dict(zip(bin_labels(ASPECT_EDGES, "{:.2f}"), self.aspect_hist)),
+            "boxes_per_image": {str(count): images for count, images in sorted(self.boxes_per_image.items())}
+        }
@@ -0,0 +1,234 @@
+"""SQLite-backed annotation store (WAL mode) used as an optional alternative to out.csv."""
+
+import os
+import sqlite3
+import sys
+import threading
+
+from atomic_io import atomic_write
+from box_array import csv_rows
+
+CSV_HEADER = "image,id,name,centerX,centerY,width,height"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    db_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    image TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    temp_id TEXT,
+    class_id TEXT NOT NULL DEFAULT '',
+    name TEXT NOT NULL DEFAULT '',
+    center_x REAL NOT NULL,
+    center_y REAL NOT NULL,
+    width REAL NOT NULL,
+    height REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_annotations_image ON annotations(image);
+CREATE INDEX IF NOT EXISTS idx_annotations_folder ON annotations(folder);
+CREATE TABLE IF NOT EXISTS classes (
+    name TEXT PRIMARY KEY,
+    id INTEGER NOT NULL UNIQUE
+);
+"""
+
+
+def folder_of(image):
+    """Return the top-level folder of an image path (same rule as the folder reset)"""
+    return image.split('/', 1)[0] if '/' in image else ''
+
+
+class AnnotationStore:
+    """Annotations and the CLASS_TO_ID map in one SQLite file; every change is its own transaction"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves so each write is one explicit transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, sql, params=()):
+        """Run a single statement inside its own transaction and return the cursor"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+                return cur
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _row_to_label(row):
+        """Convert a database row to the label dict format used in app.config["LABELS"]"""
+        label = {
+            "db_id": row["db_id"],
+            "image": row["image"],
+            "id": row["class_id"],
+            "name": row["name"],
+            "centerX": row["center_x"],
+            "centerY": row["center_y"],
+            "width": row["width"],
+            "height": row["height"]
+        }
+        if not row["class_id"] and row["temp_id"]:
+            label["temp_id"] = row["temp_id"]
+        return label
+
+    # ---- annotations -------------------------------------------------
+
+    def add(self, label):
+        """Insert one annotation and return its db_id"""
+        cur = self._write(
+            "INSERT INTO annotations (image, folder, temp_id, class_id, name, center_x, center_y, width, height) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (label["image"], folder_of(label["image"]), label.get("temp_id"),
+             label.get("id") or "", label.get("name") or "",
+             float(label["centerX"]), float(label["centerY"]),
+             float(label["width"]), float(label["height"]))
+        )
+        return cur.lastrowid
+
+    def set_label(self, db_id, class_id, name):
+        """Assign class ID and name to one annotation"""
+        self._write(
+            "UPDATE annotations SET class_id = ?, name = ?, temp_id = NULL WHERE db_id = ?",
+            (str(class_id), name, db_id)
+        )
+
+    def update_box(self, db_id, center_x, center_y, width, height):
+        """Replace the geometry of one annotation"""
+        self._write(
+            "UPDATE annotations SET center_x = ?, center_y = ?, width = ?, height = ? WHERE db_id = ?",
+            (float(center_x), float(center_y), float(width), float(height), db_id)
+        )
+
+    def remove(self, db_id):
+        self._write("DELETE FROM annotations WHERE db_id = ?", (db_id,))
+
+    def remove_folder(self, folder):
+        """Delete every annotation in a folder, returns the number of rows removed"""
+        return self._write("DELETE FROM annotations WHERE folder = ?", (folder,)).rowcount
+
+    def clear(self):
+        """Delete all annotations (the class map is kept)"""
+        self._write("DELETE FROM annotations")
+
+    def labels(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM annotations ORDER BY db_id").fetchall()
+        return [self._row_to_label(row) for row in rows]
+
+    def labels_for_image(self, image):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM annotations WHERE image = ? ORDER BY db_id", (image,)
+            ).fetchall()
+        return [self._row_to_label(row) for row in rows]
+
+    def labels_for_folder(self, folder):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM annotations WHERE folder = ? ORDER BY db_id", (folder,)
+            ).fetchall()
+        return [self._row_to_label(row) for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+
+    # ---- classes -----------------------------------------------------
+
+    def class_map(self):
+        """Return the persisted {class name: class ID} map"""
+        with self._lock:
+            rows = self._conn.execute("SELECT name, id FROM classes").fetchall()
+        return {row["name"]: row["id"] for row in rows}
+
+    def set_class(self, name, class_id):
+        self._write("INSERT OR REPLACE INTO classes (name, id) VALUES (?, ?)", (name, int(class_id)))
+
+    # ---- CSV interop -------------------------------------------------
+
+    def import_csv(self, csv_path, registry=None):
+        """Load an out.csv file into the store in one transaction, returns the number of rows imported.
+
+        With a class_registry.ClassRegistry, class IDs and names are mapped to the registered ones.
+        """
+        rows = []
+        classes = {}
+        with open(csv_path, 'r') as f:
+            for line in f.readlines()[1:]:  # Skip header
+                parts = line.strip().split(',')
+                if len(parts) < 7:
+                    continue
+                class_id = parts[1]
+                if registry is not None and class_id and parts[2]:
+                    class_id, parts[2] = registry.get_or_create(parts[2], class_id)
+                    class_id = str(class_id)
+                name = parts[2].lower() if parts[2] else ""
+                if name and class_id.isdigit() and name not in classes:
+                    classes[name] = int(class_id)
+                rows.append((parts[0], folder_of(parts[0]), None if class_id else str(len(rows) + 1),
+                             class_id, parts[2], float(parts[3]), float(parts[4]),
+                             float(parts[5]), float(parts[6])))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO annotations (image, folder, temp_id, class_id, name, center_x, center_y, width, height) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO classes (name, id) VALUES (?, ?)", list(classes.items())
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def export_csv(self, csv_path):
+        """Write all labelled annotations in the out.csv schema, returns the number of rows written"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT image, class_id, name, center_x, center_y, width, height FROM annotations "
+                "WHERE class_id != '' AND name != '' ORDER BY db_id"
+            ).fetchall()
+        # Rounded by the same vectorized pass as the out.csv writer in app.py
+        lines = csv_rows([
+            {"image": row["image"], "id": row["class_id"], "name": row["name"], "centerX": row["center_x"],
+             "centerY": row["center_y"], "width": row["width"], "height": row["height"]}
+            for row in rows
+        ])
+        with atomic_write(csv_path) as f:
+            f.write(CSV_HEADER + "\n")
+            for line in lines:
+                f.write(line + "\n")
+        return len(rows)
+
+
+if __name__ == "__main__":
+    # Usage: python annotation_store.py import|export <db> <csv>
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python annotation_store.py import|export <db> <csv>")
+        sys.exit(1)
+    command, db_path, csv_path = sys.argv[1:]
+    store = AnnotationStore(db_path)
+    if command == "import":
+        if not os.path.exists(csv_path):
+            print(f"CSV file not found: {csv_path}")
+            sys.exit(1)
+        print(f"Imported {store.import_csv(csv_path)} annotations from {csv_path} into {db_path}")
+    else:
+        print(f"Exported {store.export_csv(csv_path)} annotations from {db_path} to {csv_path}")
+    store.close()
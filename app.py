@@ -7,16 +7,43 @@ from flask import render_template
 from flask import send_file
 import os  
 from datasets import load_dataset
-from huggingface_hub import hf_hub_download
+from huggingface_hub import get_hf_file_metadata, hf_hub_download, hf_hub_url
 from io import BytesIO
 from PIL import Image
 import tempfile
-import shutil
 import json
+import math
 from datetime import datetime
+import bisect
 import hashlib
+import itertools
 import threading
-import requests
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+import http_client
+from annotation_store import AnnotationStore
+from atomic_io import atomic_write, rotate_backup
+import box_array
+from exporters import ImageSizeCache
+from spatial_index import SpatialIndex, DEFAULT_DUPLICATE_IOU
+from view_registration import ViewRegistration, propagate_to_views
+from temporal_propagation import seed_from_previous, make_proposal
+from proposals import PROPOSERS, ProposalEngine
+from image_cache import ContentCache, DEFAULT_MAX_BYTES as DEFAULT_IMAGE_CACHE_BYTES
+import thumbnails
+import tiles
+import transcode
+import integrity
+from set_index import SetIndex, is_labelled
+from manifest import Manifest
+from dataset_schema import DatasetSchema, DEFAULT_SCHEMA, views_of
+from dataset_watcher import DirectoryWatcher, RevisionWatcher, DEFAULT_INTERVAL as DEFAULT_WATCH_INTERVAL, DEFAULT_REVISION_INTERVAL
+from dataset_watcher import fingerprint as dataset_fingerprint
+from search_index import SearchIndex
+from class_registry import ClassRegistry, DEFAULT_REGISTRY
+from annotation_stats import AnnotationStats
+from single_flight import SingleFlight, DownloadLimiter, Overloaded
 
 app = Flask(__name__)
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
@@ -26,6 +53,8 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics_stats.json")
 STATS_BACKUP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "analytics_stats_backup.json")
 STATS_LOCK = threading.Lock()
+# The backup is a copy of STATS_FILE refreshed at most this often (seconds), not on every visit
+STATS_BACKUP_INTERVAL = int(os.getenv("STATS_BACKUP_INTERVAL", "300"))
 
 def get_client_ip():
     """Get client IP address from request"""
@@ -43,7 +72,7 @@ def get_country_from_ip(ip):
     """Get country from IP address using free API"""
     try:
         # Using ip-api.com (free, no API key required)
-        response = requests.get(f'http://ip-api.com/json/{ip}', timeout=2)
+        response = http_client.get(f'http://ip-api.com/json/{ip}', timeout=2, retries=0)
         if response.status_code == 200:
             data = response.json()
             if data.get('status') == 'success':
@@ -114,14 +143,13 @@ def save_stats(stats):
             'user_agents': stats.get('user_agents', {})
         }
         
-        # Save to main file
-        with open(STATS_FILE, 'w') as f:
+        # Save to main file (temp file + fsync + rename, so a crash never leaves a torn file)
+        with atomic_write(STATS_FILE) as f:
             json.dump(stats_to_save, f, indent=2)
         
-        # Create backup copy for redundancy
+        # Rotate backup copy for redundancy, at most every STATS_BACKUP_INTERVAL seconds
         try:
-            import shutil
-            shutil.copy2(STATS_FILE, STATS_BACKUP_FILE)
+            rotate_backup(STATS_FILE, STATS_BACKUP_FILE, STATS_BACKUP_INTERVAL)
         except Exception as backup_error:
             print(f"Warning: Could not create backup: {backup_error}")
         
@@ -133,28 +161,14 @@ def save_stats(stats):
 
 def get_hf_all_time_visits(space_id="0001AMA/auto_object_annotator_0.0.4"):
     """Get HuggingFace Space 'All time visits' from metrics API - returns None if not available"""
-    # Get HuggingFace token from environment (automatically provided in Spaces)
-    hf_token = os.getenv("HF_TOKEN") or os.getenv("HUGGING_FACE_HUB_TOKEN")
-    
-    # If no token in env, try to get it from huggingface_hub
-    if not hf_token:
-        try:
-            from huggingface_hub import HfApi
-            api = HfApi()
-            hf_token = api.token
-        except:
-            pass
-    
-    # Prepare headers with authentication if token is available
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    if hf_token:
-        headers['Authorization'] = f'Bearer {hf_token}'
+    # Headers with the HF token (resolved once at startup) if one is available
+    headers = http_client.hf_headers({'User-Agent': 'Mozilla/5.0'})
     
     # Try the metrics API endpoint with authentication
     try:
-        metrics_url = f"https://huggingface.co/api/spaces/{space_id}/metrics"
+        metrics_url = f"{http_client.hf_endpoint()}/api/spaces/{space_id}/metrics"
         # Use very short timeout (1 second) to prevent blocking page loads
-        response = requests.get(metrics_url, timeout=1, headers=headers)
+        response = http_client.get(metrics_url, timeout=1, headers=headers, retries=0)
         if response.status_code == 200:
             data = response.json()
             # Look for "All time visits" in the response
@@ -186,6 +200,20 @@ def get_hf_all_time_visits(space_id="0001AMA/auto_object_annotator_0.0.4"):
 
 def track_visit():
     """Track a visit - cumulative and persistent"""
+    if app.config.get("ASYNC_ANALYTICS"):
+        return  # asgi_app.py records visits itself, off the request path
+    try:
+        ip = get_client_ip()
+        # Looked up before taking the lock so a slow geolocation call doesn't serialize visits
+        record_visit(ip, get_user_agent_hash(), get_country_from_ip(ip), request.headers.get('User-Agent', 'Unknown'))
+    except Exception as e:
+        # Don't let tracking errors break the app
+        print(f"Error tracking visit: {e}")
+        import traceback
+        traceback.print_exc()
+
+def record_visit(ip, ua_hash, country, ua):
+    """Add one visit to the persistent statistics"""
     try:
         with STATS_LOCK:
             stats = load_stats()
@@ -194,11 +222,7 @@ def track_visit():
             if isinstance(stats.get('unique_visitors'), list):
                 stats['unique_visitors'] = set(stats['unique_visitors'])
             
-            # Get visitor information
-            ip = get_client_ip()
-            ua_hash = get_user_agent_hash()
             visitor_id = f"{ip}_{ua_hash}"
-            country = get_country_from_ip(ip)
             current_date = datetime.now().strftime('%Y-%m-%d')
             current_time = datetime.now().isoformat()
             
@@ -230,7 +254,6 @@ def track_visit():
             # Track user agents
             if 'user_agents' not in stats:
                 stats['user_agents'] = {}
-            ua = request.headers.get('User-Agent', 'Unknown')
             if ua not in stats['user_agents']:
                 stats['user_agents'][ua] = 0
             stats['user_agents'][ua] += 1
@@ -307,7 +330,7 @@ def tagger():
     folder_sets = app.config.get("FOLDER_SETS", [])
     print(f"DEBUG: folder_sets length: {len(folder_sets)}")
     if not folder_sets:
-        error_msg = app.config.get("DATASET_ERROR", "No folders found with all three required image types (sr_int_full.png, -tr_line.png, -tr_int_full.png)")
+        error_msg = app.config.get("DATASET_ERROR", f"No folders found with a complete image set ({get_schema().describe()})")
         return f"""
         <!DOCTYPE html>
         <html>
@@ -357,6 +380,7 @@ def tagger():
     image_set_index = 0
     max_sets = 0
     current_images = []
+    current_views = []
     
     # Safely access current folder set
     try:
@@ -374,7 +398,7 @@ def tagger():
 
         # Get image sets for current folder
         image_sets = current_folder_set['image_sets']
-        if not isinstance(image_sets, list) or len(image_sets) == 0:
+        if not isinstance(image_sets, Sequence) or len(image_sets) == 0:
             raise ValueError(f"No image sets found in folder {current_folder_set.get('folder', 'unknown')}")
             
         max_sets = len(image_sets)
@@ -384,23 +408,18 @@ def tagger():
             image_set_index = 0
             app.config["IMAGE_SET_INDEX"] = 0
 
-        # Get current set of 3 images (all with same file ID prefix)
+        # Get current set of images, one per view (all with same file ID prefix)
         if image_set_index < max_sets:
             current_set = image_sets[image_set_index]
             if not isinstance(current_set, dict):
                 raise ValueError(f"Invalid image set structure at index {image_set_index}")
                 
             # Validate required keys exist
-            required_keys = ['sr_int_full', 'tr_line', 'tr_int_full']
-            for key in required_keys:
-                if key not in current_set:
-                    raise ValueError(f"Missing required image key '{key}' in image set {image_set_index}")
+            current_views = views_of(current_set)
+            if not current_views:
+                raise ValueError(f"Image set {image_set_index} has no views")
                 
-            current_images = [
-                current_set['sr_int_full'],
-                current_set['tr_line'],
-                current_set['tr_int_full']
-            ]
+            current_images = [current_set[view] for view in current_views]
         else:
             raise ValueError(f"Image set index {image_set_index} out of bounds (max: {max_sets})")
             
@@ -440,7 +459,24 @@ def tagger():
         </html>
         """, 500
 
+    if app.config.get("PROPOSAL_ENGINE") is not None and current_images:
+        try:
+            prefetch_proposals(image_set_index)
+            add_cached_proposals(current_images[0])
+        except Exception as e:
+            print(f"Error serving proposals: {e}")
+    if app.config.get("PENDING_PROPAGATION"):
+        try:
+            propagate_pending()
+        except Exception as e:
+            print(f"Error propagating boxes: {e}")
+    if app.config.get("SEEDED_PROPOSALS"):
+        add_seeded_proposals()
+
     labels = app.config["LABELS"]
+    for image in current_images:
+        for image_label in get_box_index().labels_on(image):
+            box_ref(image_label)
     has_prev_folder = app.config["HEAD"] > 0
     has_next_folder = app.config["HEAD"] + 1 < len(app.config["FOLDER_SETS"])
     has_prev_set = image_set_index > 0
@@ -515,6 +551,7 @@ def tagger():
         
         print(f"DEBUG: Rendering template with {len(current_images)} images, folder: {current_folder_name}")
         
+        set_index = get_set_index()
         result = render_template(
             'tagger.html',
             has_prev_folder=has_prev_folder,
@@ -525,11 +562,17 @@ def tagger():
             current_folder_set=current_folder_set,
             current_folder=current_folder_name,
             current_images=current_images,
+            current_views=current_views,
+            integrity_problems=(app.config.get("INVALID_SETS") or {}).get(current_images[0]) if current_images else None,
+            size_mismatches=(app.config.get("MISMATCHED_SETS") or {}).get(current_images[0]) if current_images else None,
             labels=labels,
             head=app.config["HEAD"] + 1,
             len=len(app.config["FOLDER_SETS"]),
             image_set_index=image_set_index + 1,
             max_sets=max_sets,
+            global_index=set_index.global_index(app.config["HEAD"], image_set_index) if len(set_index) else 0,
+            total_sets=len(set_index),
+            unlabelled_sets=set_index.unlabelled_count,
             total_visits=total_visits,
             unique_visitors=unique_count,
             countries_count=countries_count,
@@ -559,31 +602,114 @@ def tagger():
         </html>
         """, 500
 
+def get_store():
+    """Return the SQLite annotation store, or None when out.csv is the only store"""
+    return app.config.get("STORE")
+
+def get_box_index():
+    """Return the per-image spatial index over app.config["LABELS"], building it on first use"""
+    if "BOX_INDEX" not in app.config:
+        app.config["BOX_INDEX"] = SpatialIndex()
+        app.config["BOX_INDEX"].rebuild(app.config["LABELS"])
+    return app.config["BOX_INDEX"]
+
+def saved_labels():
+    """Labelled boxes of the folders save_and_next has taken out of the working set: {image: [label]}"""
+    return app.config.setdefault("SAVED_LABELS", {})
+
+def all_annotations():
+    """The working set plus the saved folders' boxes, which the set, search and stats indexes cover"""
+    return app.config["LABELS"] + [label for labels in saved_labels().values() for label in labels]
+
+def annotations_on(image):
+    """Working and saved boxes on one image"""
+    return get_box_index().labels_on(image) + saved_labels().get(image, [])
+
+def drop_saved(images):
+    """Forget the saved boxes of images (their rows were rewritten or reset)"""
+    saved = saved_labels()
+    for image in images:
+        for label in saved.pop(image, []):
+            stats_remove(label)
+
+def set_labels(labels):
+    """Replace app.config["LABELS"] and keep the spatial and set indexes in sync"""
+    kept = {id(label) for label in labels}
+    for label in app.config["LABELS"]:
+        if id(label) not in kept:
+            stats_remove(label)
+    app.config["LABELS"] = labels
+    get_box_index().rebuild(labels)
+    annotations = all_annotations()
+    if app.config.get("SET_INDEX") is not None:
+        app.config["SET_INDEX"].rebuild_labels(annotations)
+    if app.config.get("SEARCH_INDEX") is not None:
+        app.config["SEARCH_INDEX"].rebuild_classes(annotations)
+
+def get_schema():
+    """Return the dataset schema (views, filename suffixes, file ID rule) loaded at startup"""
+    return app.config.get("SCHEMA") or DEFAULT_SCHEMA
+
+def get_set_index():
+    """Return the flat (folder, image set) index, building it on first use"""
+    if app.config.get("SET_INDEX") is None:
+        app.config["SET_INDEX"] = SetIndex(app.config["FOLDER_SETS"], all_annotations())
+    return app.config["SET_INDEX"]
+
+def get_search_index():
+    """Return the /search inverted index, building it on first use"""
+    if app.config.get("SEARCH_INDEX") is None:
+        app.config["SEARCH_INDEX"] = SearchIndex(get_set_index(), all_annotations())
+    return app.config["SEARCH_INDEX"]
+
+def get_dataset_stats():
+    """Return the incrementally maintained annotation statistics, building them on first use"""
+    if app.config.get("DATASET_STATS") is None:
+        app.config["DATASET_STATS"] = AnnotationStats(get_set_index(), all_annotations())
+    return app.config["DATASET_STATS"]
+
+def stats_add(label):
+    if app.config.get("DATASET_STATS") is not None:
+        app.config["DATASET_STATS"].add(label)
+
+def stats_remove(label):
+    if app.config.get("DATASET_STATS") is not None:
+        app.config["DATASET_STATS"].remove(label)
+
+# Source of box_ref values for boxes without a database row
+BOX_REFS = itertools.count(1)
+
+def box_ref(label):
+    """Identifier of one box for /remove and /label: its database row, else a number assigned on first use.
+
+    Class IDs are shared by every box of a class and client temp_ids can repeat, so neither identifies a box.
+    """
+    if "box_ref" not in label:
+        label["box_ref"] = f"db{label['db_id']}" if label.get("db_id") is not None else f"b{next(BOX_REFS)}"
+    return label["box_ref"]
+
+def refresh_labelled(image):
+    """Update the unlabelled bit and class postings of the image set containing image"""
+    if app.config.get("SET_INDEX") is not None:
+        app.config["SET_INDEX"].refresh(image, annotations_on)
+    if app.config.get("SEARCH_INDEX") is not None:
+        app.config["SEARCH_INDEX"].refresh(image, annotations_on)
+
 def save_annotations_to_csv():
     """Save all labeled annotations to CSV file"""
+    if get_store() is not None:
+        # Every change is already committed to the database; out.csv is written on /export_csv
+        return
     # Write CSV with header and all labeled annotations
-    with open(app.config["OUT"], 'w') as f:
+    with atomic_write(app.config["OUT"]) as f:
         # Write header
         f.write("image,id,name,centerX,centerY,width,height\n")
 
-        # Write ALL labeled annotations from current session
-        current_count = 0
-        for label in app.config["LABELS"]:
-            print(f"DEBUG: Checking label - Image: {label['image']}, ID: {label.get('id', 'None')}, Name: {label.get('name', 'None')}")
-            if label.get("id") and label.get("name"):
-                f.write(
-                    label["image"] + "," +
-                    label["id"] + "," +
-                    label["name"] + "," +
-                    str(round(float(label["centerX"]))) + "," +
-                    str(round(float(label["centerY"]))) + "," +
-                    str(round(float(label["width"]))) + "," +
-                    str(round(float(label["height"]))) + "\n"
-                )
-                current_count += 1
-                print(f"DEBUG: Wrote annotation for {label['image']} with class {label['name']} (ID: {label['id']})")
-        f.flush()  # Ensure data is written to disk immediately
-        print(f"DEBUG: Saved {current_count} labeled annotations to CSV")
+        # Write ALL labeled annotations from current session (rounded in one vectorized pass)
+        rows = box_array.csv_rows(app.config["LABELS"])
+        for row in rows:
+            f.write(row + "\n")
+        print(f"DEBUG: Saved {len(rows)} labeled annotations to CSV")
 
 @app.route('/save_and_next')
 def save_and_next():
@@ -592,53 +718,54 @@ def save_and_next():
         current_folder_set = app.config["FOLDER_SETS"][app.config["HEAD"]]
         current_folder_images = set()
         for image_set in current_folder_set['image_sets']:
-            current_folder_images.add(image_set['sr_int_full'])
-            current_folder_images.add(image_set['tr_line'])
-            current_folder_images.add(image_set['tr_int_full'])
-
-        # Read existing CSV content
-        existing_lines = []
-        if os.path.exists(app.config["OUT"]):
-            with open(app.config["OUT"], 'r') as f:
-                existing_lines = f.readlines()
-
-        # Write back CSV with header and non-current-folder annotations, plus new current folder annotations
-        with open(app.config["OUT"], 'w') as f:
-            # Write header
-            f.write("image,id,name,centerX,centerY,width,height\n")
-
-            # Write existing annotations that are NOT from current folder
-            existing_count = 0
-            for line in existing_lines[1:]:  # Skip header
-                line = line.strip()
-                if line:
-                    image_name = line.split(',')[0]
-                    if image_name not in current_folder_images:
-                        f.write(line + "\n")
-                        existing_count += 1
-            print(f"DEBUG: Wrote {existing_count} existing annotations from other folders")
-
-            # Write ALL labeled annotations from current session (not just current folder)
-            current_count = 0
-            for label in app.config["LABELS"]:
-                print(f"DEBUG: Checking label - Image: {label['image']}, ID: {label.get('id', 'None')}, Name: {label.get('name', 'None')}")
-                if label.get("id") and label.get("name"):
-                    f.write(
-                        label["image"] + "," +
-                        label["id"] + "," +
-                        label["name"] + "," +
-                        str(round(float(label["centerX"]))) + "," +
-                        str(round(float(label["centerY"]))) + "," +
-                        str(round(float(label["width"]))) + "," +
-                        str(round(float(label["height"]))) + "\n"
-                    )
-                    current_count += 1
-                    print(f"DEBUG: Wrote annotation for {label['image']} with class {label['name']} (ID: {label['id']})")
-            print(f"DEBUG: Wrote {current_count} labeled annotations from all folders")
-
-        # Remove current folder annotations from memory but keep others
-        app.config["LABELS"] = [label for label in app.config["LABELS"]
-                               if label["image"] not in current_folder_images]
+            current_folder_images.update(image_set[view] for view in views_of(image_set))
+
+        if get_store() is None:
+            # Read existing CSV content
+            existing_lines = []
+            if os.path.exists(app.config["OUT"]):
+                with open(app.config["OUT"], 'r') as f:
+                    existing_lines = f.readlines()
+
+            # Write back CSV with header and non-current-folder annotations, plus new current folder annotations
+            with atomic_write(app.config["OUT"]) as f:
+                # Write header
+                f.write("image,id,name,centerX,centerY,width,height\n")
+
+                # Write existing annotations that are NOT from current folder
+                existing_count = 0
+                for line in existing_lines[1:]:  # Skip header
+                    line = line.strip()
+                    if line:
+                        image_name = line.split(',')[0]
+                        if image_name not in current_folder_images:
+                            f.write(line + "\n")
+                            existing_count += 1
+                print(f"DEBUG: Wrote {existing_count} existing annotations from other folders")
+
+                # Write ALL labeled annotations from current session (not just current folder)
+                rows = box_array.csv_rows(app.config["LABELS"])
+                for row in rows:
+                    f.write(row + "\n")
+                print(f"DEBUG: Wrote {len(rows)} labeled annotations from all folders")
+
+        # Move current folder annotations out of the working set. They are saved, so the set, search
+        # and stats indexes keep them; only boxes this save replaces leave those
+        if get_store() is None:
+            # The folder's out.csv rows were just rewritten from the working set, replacing earlier saves
+            drop_saved(current_folder_images)
+        saved = saved_labels()
+        kept_labels = []
+        for label in app.config["LABELS"]:
+            if label["image"] not in current_folder_images:
+                kept_labels.append(label)
+                continue
+            get_box_index().discard(label)
+            if is_labelled(label):
+                saved.setdefault(label["image"], []).append(label)
+        app.config["LABELS"] = kept_labels
+        for image_set in current_folder_set['image_sets']:
+            refresh_labelled(image_set[views_of(image_set)[0]])
 
         print(f"Saved annotations for folder: {current_folder_set['folder']}")
 
@@ -648,6 +775,7 @@ def save_and_next():
         app.config["HEAD"] = 0  # Loop back to first folder
         app.config["IMAGE_SET_INDEX"] = 0  # Reset image set index
         print("Reached end of folders, looping back to first folder")
+    skip_invalid_sets()
 
     return redirect(url_for('tagger'))
 
@@ -662,6 +790,7 @@ def next_folder():
         app.config["HEAD"] = 0  # Loop back to first folder
         print("Reached end of folders, looping back to first folder")
     app.config["IMAGE_SET_INDEX"] = 0  # Reset to first image set
+    skip_invalid_sets()
     
     # Preserve auto-play parameters if present
     autoplay = request.args.get('autoplay')
@@ -678,6 +807,7 @@ def prev_folder():
         app.config["HEAD"] = len(app.config["FOLDER_SETS"]) - 1  # Loop to last folder
         print("Reached beginning of folders, looping to last folder")
     app.config["IMAGE_SET_INDEX"] = 0  # Reset to first image set
+    skip_invalid_sets()
     
     # Preserve auto-play parameters if present
     autoplay = request.args.get('autoplay')
@@ -709,6 +839,7 @@ def next_set():
             app.config["HEAD"] = 0
             app.config["IMAGE_SET_INDEX"] = 0
             print("DEBUG: Auto-looped back to first folder for continuous play")
+    skip_invalid_sets()
     
     # Preserve auto-play parameters if present
     autoplay = request.args.get('autoplay')
@@ -723,6 +854,7 @@ def prev_set():
     current_index = app.config.get("IMAGE_SET_INDEX", 0)
     if current_index > 0:
         app.config["IMAGE_SET_INDEX"] = current_index - 1
+        skip_invalid_sets(-1)
     
     # Preserve auto-play parameters if present
     autoplay = request.args.get('autoplay')
@@ -737,9 +869,11 @@ def reset_annotations():
 
     if scope == 'all':
         # Reset all annotations from all folders
-        app.config["LABELS"] = []
-        app.config["CLASS_TO_ID"] = {}
-        app.config["NEXT_CLASS_ID"] = 1
+        # Class IDs live in the class registry and stay stable across resets
+        drop_saved(list(saved_labels()))
+        set_labels([])
+        if get_store() is not None:
+            get_store().clear()
         print("DEBUG: Reset ALL annotations from ALL folders")
     elif scope == 'folder':
         # Reset annotations only for current folder
@@ -748,11 +882,14 @@ def reset_annotations():
 
         # Remove annotations that belong to the current folder
         original_count = len(app.config["LABELS"])
-        app.config["LABELS"] = [
+        drop_saved([image for image in saved_labels() if image.startswith(f"{folder_name}/")])
+        set_labels([
             label for label in app.config["LABELS"]
             if not any(label["image"].startswith(f"{folder_name}/") for folder_name in [folder_name])
-        ]
+        ])
         removed_count = original_count - len(app.config["LABELS"])
+        if get_store() is not None:
+            get_store().remove_folder(folder_name)
         print(f"DEBUG: Reset {removed_count} annotations from folder '{folder_name}'")
 
     # Save the updated annotations to CSV
@@ -943,25 +1080,46 @@ def stats():
     
     return html
 
+def float_args(*names):
+    """Query parameters as finite floats, or None when any is missing or not a finite number"""
+    try:
+        values = [float(request.args[name]) for name in names]
+    except (KeyError, ValueError):
+        return None
+    return values if all(math.isfinite(value) for value in values) else None
+
 @app.route('/add/<temp_id>')
 def add(temp_id):
     image = request.args.get("image")
-    xMin = float(request.args.get("xMin"))
-    xMax = float(request.args.get("xMax"))
-    yMin = float(request.args.get("yMin"))
-    yMax = float(request.args.get("yMax"))
+    corners = float_args("xMin", "xMax", "yMin", "yMax")
+    if not image or corners is None:
+        return "image and finite xMin, xMax, yMin and yMax are required", 400
+    xMin, xMax, yMin, yMax = corners
 
     # Convert to center, width, height format
-    centerX = (xMin + xMax) / 2
-    centerY = (yMin + yMax) / 2
-    width = xMax - xMin
-    height = yMax - yMin
+    centerX, centerY, width, height = box_array.from_corners(xMin, xMax, yMin, yMax).tolist()
+
+    # Same checks as /qa_report; the bounds are only known once the image's size is cached
+    sizes, _ = known_image_sizes([image])
+    widths, heights = box_array.image_size_arrays([{"image": image}], sizes)
+    flags = int(box_array.validate([[centerX, centerY, width, height]], widths, heights)[0])
+    if flags & (box_array.NEGATIVE_SIZE | box_array.OUT_OF_BOUNDS):
+        return f"Box rejected ({', '.join(box_array.flag_names(flags))})", 400
 
     print(f"DEBUG: Coordinates - xMin:{xMin:.1f}, xMax:{xMax:.1f}, yMin:{yMin:.1f}, yMax:{yMax:.1f}")
     print(f"DEBUG: Calculated - centerX:{centerX:.1f}, centerY:{centerY:.1f}, width:{width:.1f}, height:{height:.1f}")
 
+    # Skip boxes that duplicate an existing box (e.g. re-sent from a stale canvas); an unaccepted
+    # proposal is only a suggestion, so drawing over one keeps the drawn box
+    duplicate = get_box_index().find_duplicate(image, centerX, centerY, width, height,
+                                               app.config.get("DUPLICATE_IOU", DEFAULT_DUPLICATE_IOU),
+                                               where=lambda label: not label.get("proposal"))
+    if duplicate is not None:
+        print(f"DEBUG: Ignoring duplicate box on {image} (matches {duplicate.get('name') or 'unlabelled'} box)")
+        return redirect(url_for('tagger'))
+
     # Use temporary ID until class is assigned
-    app.config["LABELS"].append({
+    new_label = {
         "image": image,
         "temp_id": temp_id,  # Temporary ID for tracking
         "id": "",  # Will be assigned when class is labeled
@@ -970,127 +1128,640 @@ def add(temp_id):
         "centerY": centerY,
         "width": width,
         "height": height
-    })
+    }
+    if get_store() is not None:
+        new_label["db_id"] = get_store().add(new_label)
+    app.config["LABELS"].append(new_label)
+    get_box_index().add(new_label)
+    return redirect(url_for('tagger'))
+
+def set_images(image_sets):
+    return {image_set[view] for image_set in image_sets for view in views_of(image_set)}
+
+def propagate_views(image_sets, labels=None, sizes=None):
+    """Project labelled boxes of the given image sets into their sibling views; returns the number created"""
+    images = set_images(image_sets)
+    if labels is None:
+        labels = [label for label in app.config["LABELS"] if label["image"] in images]
+    if not labels:
+        return 0
+    if sizes is None:
+        sizes = get_image_sizes(sorted(images))
+    registration = app.config.get("VIEW_REGISTRATION") or ViewRegistration()
+    new_labels = propagate_to_views(labels, image_sets, sizes, registration, get_box_index(),
+                                    app.config.get("DUPLICATE_IOU", DEFAULT_DUPLICATE_IOU))
+    for new_label in new_labels:
+        if get_store() is not None:
+            new_label["db_id"] = get_store().add(new_label)
+        app.config["LABELS"].append(new_label)
+        stats_add(new_label)
+    print(f"DEBUG: Projected {len(new_labels)} boxes into sibling views")
+    return len(new_labels)
+
+def propagate_pending():
+    """Project the boxes queued by auto-propagation whose view sizes are cached by now.
+
+    /label never reads image sizes itself; the rest stay queued while the
+    background reader fetches their sizes, and a later tagger visit finishes them.
+    """
+    waiting = []
+    for image_sets, label in app.config.get("PENDING_PROPAGATION", []):
+        sizes, pending = known_image_sizes(sorted(set_images(image_sets)))
+        if pending:
+            waiting.append((image_sets, label))
+        elif any(label is existing for existing in get_box_index().labels_on(label["image"])):
+            propagate_views(image_sets, [label], sizes)
+    app.config["PENDING_PROPAGATION"] = waiting
+
+@app.route('/propagate_views')
+def propagate_views_route():
+    """Batch-project every labelled box of the current folder (or all folders) into its sibling views"""
+    scope = request.args.get('scope', 'folder')
+    if scope == 'all':
+        folder_sets = app.config["FOLDER_SETS"]
+    else:
+        folder_sets = [app.config["FOLDER_SETS"][app.config["HEAD"]]]
+    for folder_set in folder_sets:
+        propagate_views(folder_set['image_sets'])
+    return redirect(url_for('tagger'))
+
+def add_proposals(proposals):
+    """Add proposal labels to memory only; they are saved once accepted via /label"""
+    for proposal in proposals:
+        app.config["LABELS"].append(proposal)
+        get_box_index().add(proposal)
+
+def upcoming_images(image_set_index, count, all_views=False):
+    """Image paths of the current set and the next count sets in navigation order: each set's first view
+    (sr_int_full with the default schema), or every view with all_views"""
+    folder_sets = app.config["FOLDER_SETS"]
+    total_sets = len(get_set_index())
+    upcoming = []
+    head, index = app.config["HEAD"], image_set_index
+    sets = 0
+    while sets <= count and sets < total_sets:
+        image_sets = folder_sets[head]['image_sets']
+        if index < len(image_sets):
+            views = views_of(image_sets[index])
+            upcoming.extend(image_sets[index][view] for view in (views if all_views else views[:1]))
+            index += 1
+            sets += 1
+        else:
+            head, index = (head + 1) % len(folder_sets), 0
+    return upcoming
+
+# Wakes the proposal prefetch worker; PROPOSAL_PREFETCH holds the latest lookahead it should work through
+PROPOSAL_WAKE = threading.Event()
+PROPOSAL_PREFETCH_LOCK = threading.Lock()
+
+def prefetch_proposals(image_set_index):
+    """Queue proposals for the sets ahead of the annotator (downloads happen off the request thread)"""
+    images = upcoming_images(image_set_index, app.config.get("PROPOSAL_LOOKAHEAD", 5))
+    with PROPOSAL_PREFETCH_LOCK:
+        # Only the newest lookahead matters: one the worker hasn't started on is replaced
+        app.config["PROPOSAL_PREFETCH"] = images
+        if app.config.get("PROPOSAL_WORKER") is None:
+            app.config["PROPOSAL_WORKER"] = threading.Thread(target=run_proposal_prefetch, name="proposal-prefetch",
+                                                             daemon=True)
+            app.config["PROPOSAL_WORKER"].start()
+    PROPOSAL_WAKE.set()
+
+def run_proposal_prefetch():
+    """The one thread resolving upcoming images and queueing their proposals, for every page view"""
+    while True:
+        PROPOSAL_WAKE.wait()
+        PROPOSAL_WAKE.clear()
+        with PROPOSAL_PREFETCH_LOCK:
+            images = app.config.pop("PROPOSAL_PREFETCH", [])
+        engine = app.config.get("PROPOSAL_ENGINE")
+        for image in images:
+            if engine is None or PROPOSAL_WAKE.is_set():
+                break  # The annotator moved on; start over from the newer lookahead
+            try:
+                engine.prefetch([resolve_image_path(image)])
+            except Overloaded:
+                break  # Leave download slots to the annotator's own image requests
+            except Exception as e:
+                print(f"Error prefetching proposals for {image}: {e}")
+
+def last_class_name():
+    """Most recently assigned class name, used as the one-click suggestion for detector proposals"""
+    for label in reversed(app.config["LABELS"]):
+        if label.get("name"):
+            return label["name"], label.get("id", "")
+    return "", ""
+
+def add_cached_proposals(image):
+    """Attach cached detector proposals to an image that has no boxes yet (once per image)"""
+    proposed = app.config.setdefault("PROPOSED_IMAGES", set())
+    if image in proposed or any(label["image"] == image for label in app.config["LABELS"]):
+        return
+    local_path = resolve_image_path(image)
+    boxes = app.config["PROPOSAL_ENGINE"].cached(local_path) if local_path else None
+    if boxes is None:
+        return  # Still being computed; the next visit picks it up
+    proposed.add(image)
+    name, class_id = last_class_name()
+    engine = app.config["PROPOSAL_ENGINE"]
+    add_proposals([
+        make_proposal(image, {"name": name, "id": class_id}, f"a{n}", *box[:4], source_name=engine.method)
+        for n, box in enumerate(boxes, start=1)
+    ])
+
+@app.route('/proposals')
+def proposals_route():
+    """Detector proposals for one image: {"status": "ready"|"pending"|"disabled", "boxes": [...]}"""
+    image = request.args.get("image")
+    if not image:
+        return {"status": "error", "error": "image is required", "boxes": []}, 400
+    engine = app.config.get("PROPOSAL_ENGINE")
+    if engine is None:
+        return {"status": "disabled", "boxes": []}
+    try:
+        local_path = resolve_image_path(image)
+    except Overloaded:
+        return {"status": "busy", "boxes": []}, 503
+    if local_path is None:
+        return {"status": "missing", "boxes": []}, 404
+    boxes = engine.cached(local_path)
+    if boxes is None:
+        engine.prefetch([local_path])
+        return {"status": "pending", "boxes": []}
+    return {"status": "ready", "boxes": [
+        {"centerX": b[0], "centerY": b[1], "width": b[2], "height": b[3], "score": b[4]} for b in boxes
+    ]}
+
+# Rendered sprite pages kept in memory: {(folder, page, labels digest): JPEG bytes}
+SPRITE_CACHE_SIZE = 16
+# Guards SPRITE_CACHE, which request threads read, reorder and trim concurrently
+SPRITE_LOCK = threading.Lock()
+
+def find_folder_set(folder):
+    """Return (HEAD position, folder set) for a folder name, or (None, None)"""
+    for position, folder_set in enumerate(app.config["FOLDER_SETS"]):
+        if folder_set['folder'] == folder:
+            return position, folder_set
+    return None, None
+
+def labels_by_image(images):
+    wanted = set(images)
+    grouped = {}
+    for label in app.config["LABELS"]:
+        if label["image"] in wanted:
+            grouped.setdefault(label["image"], []).append(label)
+    return grouped
+
+def overview_page(folder_set):
+    pages = thumbnails.page_count(len(folder_set['image_sets']))
+    page = request.args.get('page', 1, type=int)
+    return min(max(page, 1), pages), pages
+
+@app.route('/folder_overview/<path:folder>')
+def folder_overview(folder):
+    """Paginated thumbnail grid of a folder's image sets, backed by one sprite sheet per page"""
+    position, folder_set = find_folder_set(folder)
+    if folder_set is None:
+        return f"Folder '{folder}' not found", 404
+    page, pages = overview_page(folder_set)
+    image_sets = thumbnails.page_slice(folder_set['image_sets'], page - 1)
+    views = get_schema().views
+    grouped = labels_by_image([image_set[view] for image_set in image_sets for view in views])
+    side = thumbnails.THUMB_SIDE
+    cells = []
+    for n, image_set in enumerate(image_sets):
+        left, top = thumbnails.cell_origin(n, n_views=len(views))
+        cells.append({
+            "file_id": image_set['file_id'],
+            "boxes": sum(len(grouped.get(image_set[view], [])) for view in views),
+            "left": left, "top": top, "width": side * len(views), "height": side,
+            "href": url_for('folder_route', name=folder, set=(page - 1) * thumbnails.PAGE_SIZE + n)
+        })
+    sprite_width, sprite_height = thumbnails.sprite_size(len(image_sets), n_views=len(views))
+    return render_template(
+        'overview.html', folder=folder, page=page, pages=pages, n_sets=len(folder_set['image_sets']),
+        cells=cells, sprite_width=sprite_width, sprite_height=sprite_height,
+        folders=[fs['folder'] for fs in app.config["FOLDER_SETS"]]
+    )
+
+@app.route('/folder_sprite/<path:folder>')
+def folder_sprite(folder):
+    """JPEG sprite of one overview page with boxes drawn in"""
+    position, folder_set = find_folder_set(folder)
+    if folder_set is None:
+        return f"Folder '{folder}' not found", 404
+    page, _ = overview_page(folder_set)
+    image_sets = thumbnails.page_slice(folder_set['image_sets'], page - 1)
+    grouped = labels_by_image([image_set[view] for image_set in image_sets for view in get_schema().views])
+    digest = hashlib.sha1(json.dumps(
+        sorted((image, [(l.get("name"), l["centerX"], l["centerY"], l["width"], l["height"]) for l in boxes])
+               for image, boxes in grouped.items()), default=str).encode()).hexdigest()
+
+    key = (folder, page, digest)
+    with SPRITE_LOCK:
+        sprite_cache = app.config.setdefault("SPRITE_CACHE", OrderedDict())
+        data = sprite_cache.get(key)
+        if data is not None:
+            sprite_cache.move_to_end(key)
+    if data is None:
+        # Rendered outside the lock: other pages are served meanwhile
+        thumbnail_cache = app.config.get("THUMBNAIL_CACHE")
+        if thumbnail_cache is None:
+            thumbnail_cache = app.config["THUMBNAIL_CACHE"] = thumbnails.ThumbnailCache()
+        sprite = thumbnails.build_sprite(image_sets, resolve_image_path, grouped, thumbnail_cache)
+        data = thumbnails.encode_sprite(sprite)
+        with SPRITE_LOCK:
+            sprite_cache = app.config.setdefault("SPRITE_CACHE", OrderedDict())
+            sprite_cache[key] = data
+            while len(sprite_cache) > SPRITE_CACHE_SIZE:
+                sprite_cache.popitem(last=False)
+    return send_file(BytesIO(data), mimetype='image/jpeg')
+
+def go_to_set(global_index):
+    """Point HEAD / IMAGE_SET_INDEX at a global set number and show it"""
+    save_annotations_to_csv()
+    app.config["HEAD"], app.config["IMAGE_SET_INDEX"] = get_set_index().locate(global_index)
+    return redirect(url_for('tagger'))
+
+@app.route('/set/<int:global_index>')
+def set_route(global_index):
+    """Jump to a set by its 0-based number across all folders"""
+    if not 0 <= global_index < len(get_set_index()):
+        return f"Set {global_index} not found (0-{len(get_set_index()) - 1})", 404
+    return go_to_set(global_index)
+
+@app.route('/folder/<path:name>')
+def folder_route(name):
+    """Jump to a folder by name, optionally to its ?set=N (0-based) image set"""
+    start = get_set_index().folder_start(name)
+    if start is None:
+        return f"Folder '{name}' not found", 404
+    position = get_set_index().folder_positions[name]
+    max_sets = len(app.config["FOLDER_SETS"][position]['image_sets'])
+    if max_sets == 0:
+        return f"Folder '{name}' has no image sets", 404
+    return go_to_set(start + min(max(request.args.get('set', 0, type=int), 0), max_sets - 1))
+
+@app.route('/search')
+def search():
+    """Find image sets by file_id substring, folder:, class: and status: terms.
+
+    Returns JSON with matching set numbers (usable with /set/<n>); with go=next
+    it jumps to the first match after the current set instead.
+    """
+    query = request.args.get('q', '')
+    start = time.perf_counter()
+    matches = get_search_index().search(query)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    set_index = get_set_index()
+    if request.args.get('go') == 'next':
+        if not matches:
+            return redirect(url_for('tagger'))
+        current = set_index.global_index(app.config["HEAD"], app.config.get("IMAGE_SET_INDEX", 0))
+        position = bisect.bisect_right(matches, current)
+        return go_to_set(matches[position % len(matches)])
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 1000)
+    results = []
+    for global_index in matches[offset:offset + limit]:
+        head, image_set_index = set_index.locate(global_index)
+        results.append({
+            "set": global_index,
+            "folder": set_index.folders[head],
+            "file_id": set_index.image_sets[global_index]['file_id'],
+            "unlabelled": bool(set_index.unlabelled[global_index]),
+            "url": url_for('set_route', global_index=global_index)
+        })
+    return {"query": query, "total": len(matches), "offset": offset, "results": results,
+            "elapsed_ms": round(elapsed_ms, 3)}
+
+@app.route('/next_unlabelled')
+def next_unlabelled():
+    """Jump to the next set (after the current one, wrapping) with no labelled boxes, skipping flagged sets"""
+    set_index = get_set_index()
+    if len(set_index) == 0:
+        return redirect(url_for('tagger'))
+    current = set_index.global_index(app.config["HEAD"], app.config.get("IMAGE_SET_INDEX", 0))
+    found = set_index.next_unlabelled(current + 1)
+    for _ in range(len(set_index)):
+        if found is None or not is_flagged(set_index.image_sets[found]):
+            break
+        found = set_index.next_unlabelled(found + 1)
+    else:
+        found = None  # Every unlabelled set is flagged invalid
+    if found is None:
+        print("DEBUG: Every image set has labelled boxes")
+        return redirect(url_for('tagger'))
+    return go_to_set(found)
+
+@app.route('/propagate_temporal')
+def propagate_temporal():
+    """Seed every unlabelled set of the current folder with proposals from the previous labelled set.
+
+    Seeding resolves (and may download) the folder's images, so it runs in a
+    background thread; the proposals show up on the next tagger visit after it finishes.
+    """
+    current_folder_set = app.config["FOLDER_SETS"][app.config["HEAD"]]
+    refine = request.args.get('refine', '1') == '1'
+    start_temporal_seeding(current_folder_set, refine)
     return redirect(url_for('tagger'))
 
-@app.route('/remove/<temp_id>')
-def remove(temp_id):
+# Guards the running temporal seeding jobs and the proposals they finished
+TEMPORAL_LOCK = threading.Lock()
+
+def start_temporal_seeding(folder_set, refine):
+    """Seed one folder in a background thread, unless that folder is already being seeded"""
+    folder = folder_set['folder']
+    with TEMPORAL_LOCK:
+        running = app.config.setdefault("TEMPORAL_RUNNING", set())
+        if folder in running:
+            return False
+        running.add(folder)
+    labels = list(app.config["LABELS"])
+    threading.Thread(target=run_temporal_seeding, args=(folder_set, labels, refine),
+                     name="temporal-seeding", daemon=True).start()
+    return True
+
+def run_temporal_seeding(folder_set, labels, refine):
+    proposals = []
+    try:
+        proposals = seed_from_previous(folder_set['image_sets'], labels, resolve_path=resolve_image_path, refine=refine)
+    except Exception as e:
+        print(f"Error seeding folder '{folder_set['folder']}': {e}")
+    finally:
+        with TEMPORAL_LOCK:
+            app.config.setdefault("SEEDED_PROPOSALS", []).extend(proposals)
+            app.config["TEMPORAL_RUNNING"].discard(folder_set['folder'])
+    print(f"DEBUG: Seeded {len(proposals)} temporal proposals in folder '{folder_set['folder']}'")
+
+def add_seeded_proposals():
+    """Add finished temporal proposals, except on images that got boxes while they were computed"""
+    with TEMPORAL_LOCK:
+        proposals = app.config.get("SEEDED_PROPOSALS", [])
+        app.config["SEEDED_PROPOSALS"] = []
+    index = get_box_index()
+    occupied = {proposal["image"] for proposal in proposals if index.labels_on(proposal["image"])}
+    add_proposals([proposal for proposal in proposals if proposal["image"] not in occupied])
+
+@app.route('/boxes_near')
+def boxes_near():
+    """Hit-test: boxes on an image containing (x, y), grown by radius, closest first"""
+    image = request.args.get("image")
+    point = float_args("x", "y")
+    radius = float_args("radius") if "radius" in request.args else [0.0]
+    if not image or point is None or radius is None:
+        return {"error": "image and finite x and y (and radius, if given) are required"}, 400
+    x, y = point
+    radius = radius[0]
+    labels = get_box_index().near(image, x, y, radius)
+    return {"boxes": [
+        dict({key: label.get(key) for key in ("temp_id", "id", "name", "centerX", "centerY", "width", "height")},
+             box_ref=box_ref(label))
+        for label in labels
+    ]}
+
+@app.route('/remove/<ref>')
+def remove(ref):
+    """Delete the one box on ?image= whose box_ref is ref"""
     image = request.args.get("image")
-    print(f"DEBUG: Removing - Temp ID: {temp_id}, Image: {image}")
+    print(f"DEBUG: Removing - Box: {ref}, Image: {image}")
 
     original_count = len(app.config["LABELS"])
-    app.config["LABELS"] = [
-        label for label in app.config["LABELS"]
-        if not (label["image"] == image and
-                (label.get("temp_id") == temp_id or label.get("id") == temp_id))
-    ]
+    kept_labels = []
+    for label in app.config["LABELS"]:
+        if label["image"] == image and box_ref(label) == ref:
+            if get_store() is not None and "db_id" in label:
+                get_store().remove(label["db_id"])
+            get_box_index().discard(label)
+            stats_remove(label)
+            continue
+        kept_labels.append(label)
+    app.config["LABELS"] = kept_labels
+    refresh_labelled(image)
     new_count = len(app.config["LABELS"])
     print(f"DEBUG: Removed {original_count - new_count} labels")
 
     return redirect(url_for('tagger'))
 
-@app.route('/label/<temp_id>')
-def label(temp_id):
+@app.route('/label/<ref>')
+def label(ref):
+    """Assign the class ?name= to the box on ?image= whose box_ref is ref"""
     image = request.args.get("image")
     name = request.args.get("name").strip().lower()
-    print(f"DEBUG: Labeling - Temp ID: {temp_id}, Image: {image}, Name: {name}")
-
-    # Get or assign class ID
-    if name not in app.config["CLASS_TO_ID"]:
-        app.config["CLASS_TO_ID"][name] = app.config["NEXT_CLASS_ID"]
-        app.config["NEXT_CLASS_ID"] += 1
-        print(f"DEBUG: Assigned new class ID {app.config['CLASS_TO_ID'][name]} to class '{name}'")
+    print(f"DEBUG: Labeling - Box: {ref}, Image: {image}, Name: {name}")
 
-    class_id = app.config["CLASS_TO_ID"][name]
+    # Get or assign class ID (aliases and spelling variants resolve to the registered class)
+    registry = app.config["CLASS_REGISTRY"]
+    is_new = name not in registry
+    try:
+        class_id, name = registry.get_or_create(name)
+    except ValueError as e:
+        print(f"DEBUG: Ignoring label: {e}")
+        return redirect(url_for('tagger'))
+    if is_new:
+        if get_store() is not None:
+            get_store().set_class(name, class_id)
+        print(f"DEBUG: Assigned new class ID {class_id} to class '{name}'")
 
     found = False
     for label in app.config["LABELS"]:
-        # Check both temp_id and regular id for compatibility
-        label_temp_id = label.get("temp_id", label.get("id"))
-        print(f"DEBUG: Checking label - Temp ID: {label_temp_id}, Image: {label['image']}")
-        if label["image"] == image and label_temp_id == temp_id:
+        if label["image"] == image and box_ref(label) == ref:
+            stats_remove(label)  # No-op unless this relabels an already labelled box
             label["name"] = name
             label["id"] = str(class_id)  # Assign class-based ID
             if "temp_id" in label:
                 del label["temp_id"]  # Remove temp_id once class is assigned
-            print(f"DEBUG: Updated label temp_id {temp_id} with name '{name}' and class ID {class_id}")
+            # Accepting a proposal turns it into a regular annotation
+            for key in ("proposal", "suggested_name", "suggested_id"):
+                label.pop(key, None)
+            if get_store() is not None and "db_id" in label:
+                get_store().set_label(label["db_id"], class_id, name)
+            elif get_store() is not None:
+                label["db_id"] = get_store().add(label)
+            stats_add(label)
+            print(f"DEBUG: Updated box {ref} with name '{name}' and class ID {class_id}")
             found = True
             break
 
+    if found:
+        refresh_labelled(image)
     if not found:
-        print(f"DEBUG: Label not found for temp_id: {temp_id}, Image: {image}")
-
-    print(f"DEBUG: Current class mapping: {app.config['CLASS_TO_ID']}")
+        print(f"DEBUG: Label not found for box: {ref}, Image: {image}")
+    elif app.config.get("AUTO_PROPAGATE_VIEWS", False):
+        # Project the newly labelled box into the sibling views of its own image set, which need not
+        # be in the folder at HEAD (boxes are labelled from /set/<n>, /folder/<name> and /search too)
+        set_index = get_set_index()
+        global_index = set_index.image_to_set.get(image)
+        if global_index is not None:
+            app.config.setdefault("PENDING_PROPAGATION", []).append(([set_index.image_sets[global_index]], label))
+        propagate_pending()
+
+    print(f"DEBUG: Current class mapping: {app.config['CLASS_REGISTRY'].as_map()}")
     return redirect(url_for('tagger'))
 
-@app.route('/image/<path:f>')
-def images(f):
+def get_size_cache():
+    if "SIZE_CACHE" not in app.config:
+        app.config["SIZE_CACHE"] = ImageSizeCache()
+    return app.config["SIZE_CACHE"]
+
+def get_image_sizes(images):
+    """Return {image: (width, height)} from PNG headers, cached across calls"""
+    cache = get_size_cache()
+    if app.config.get("USE_HF_DATASET", False):
+        dataset_name = app.config.get("HF_DATASET_NAME", "0001AMA/multimodal_data_annotator_dataset")
+        endpoint = http_client.hf_endpoint()
+        headers = http_client.hf_headers()
+        revision = size_revision()
+        sizes = cache.remote_sizes(
+            images,
+            lambda image: f"{endpoint}/datasets/{dataset_name}/resolve/{revision}/{image}",
+            revision,
+            headers=headers
+        )
+    else:
+        sizes = cache.local_sizes(images, app.config.get('IMAGES', ''))
+    cache.save()
+    return sizes
+
+def size_revision(lookup=True):
+    """Commit hub image sizes are read at: the dataset's listed revision, else main's commit (looked up once)"""
+    revision = (app.config.get("DATASET_META") or {}).get("revision") or app.config.get("HF_SIZE_REVISION")
+    if revision is None and lookup:
+        revision = app.config["HF_SIZE_REVISION"] = hf_dataset_revision(
+            app.config.get("HF_DATASET_NAME", "0001AMA/multimodal_data_annotator_dataset"))
+    return revision
+
+# Guards the images queued for the background size reader
+SIZE_READ_LOCK = threading.Lock()
+
+def known_image_sizes(images):
+    """({image: (width, height)} already cached, number still unknown) without reading any image.
+
+    The unknown sizes are read by a background thread, so a later call has them;
+    images the reader could not size are not counted (or read) again.
+    """
+    if app.config.get("USE_HF_DATASET", False):
+        # Unknown until the reader thread has looked it up, in which case nothing is cached yet
+        sizes, misses = get_size_cache().cached_sizes(images, revision=size_revision(lookup=False))
+    else:
+        sizes, misses = get_size_cache().cached_sizes(images, app.config.get('IMAGES', ''))
+    unreadable = app.config.get("UNREADABLE_SIZES") or set()
+    misses = [image for image in misses if image not in unreadable]
+    if misses:
+        read_sizes_in_background(misses)
+    return sizes, len(misses)
+
+def read_sizes_in_background(images):
+    """Queue images for the size reader thread, starting it unless it is running"""
+    with SIZE_READ_LOCK:
+        stats = app.config.setdefault("SIZE_READ_STATS", {"status": "idle", "pending": 0, "read": 0, "errors": 0})
+        pending = app.config.setdefault("SIZE_READ_PENDING", set())
+        pending.update(images)
+        stats["pending"] = len(pending)
+        if stats["status"] == "running":
+            return
+        stats["status"] = "running"
+    threading.Thread(target=run_size_reads, name="size-reads", daemon=True).start()
+
+def run_size_reads():
+    stats = app.config["SIZE_READ_STATS"]
+    while True:
+        with SIZE_READ_LOCK:
+            pending = app.config["SIZE_READ_PENDING"]
+            if not pending:
+                stats["status"], stats["pending"] = "idle", 0
+                return
+            images = sorted(pending)
+            pending.clear()
+        try:
+            sizes = get_image_sizes(images)
+            stats["read"] += len(sizes)
+            app.config.setdefault("UNREADABLE_SIZES", set()).update(image for image in images if image not in sizes)
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"Error reading image sizes: {e}")
+
+@app.route('/dataset_stats')
+def dataset_stats():
+    """Annotation progress dashboard (HTML, or JSON with ?format=json)"""
+    report = get_dataset_stats().report()
+    if request.args.get('format') == 'json':
+        return report
+    return render_template('dataset_stats.html', report=report)
+
+@app.route('/qa_report')
+def qa_report():
+    """Validate all boxes in one pass: negative sizes, out-of-bounds, tr_int_full crop bands.
+
+    Only cached image sizes are used; boxes on images whose size is still being
+    read are flagged unknown_image_size, and pending_sizes counts those images.
+    """
+    labels = app.config["LABELS"]
+    sizes, pending = known_image_sizes(sorted({label["image"] for label in labels}))
+    return dict(box_array.qa_report(labels, sizes), pending_sizes=pending)
+
+@app.route('/export_csv')
+def export_csv():
+    """Write the current annotations to the out.csv schema and return the file"""
+    if get_store() is not None:
+        count = get_store().export_csv(app.config["OUT"])
+        print(f"DEBUG: Exported {count} annotations from {get_store().path} to {app.config['OUT']}")
+    else:
+        save_annotations_to_csv()
+    return send_file(os.path.abspath(app.config["OUT"]), mimetype='text/csv', as_attachment=True,
+                     download_name=os.path.basename(app.config["OUT"]))
+
+def resolve_image_path(f):
+    """Return a local file path for a dataset image, downloading it from the HF dataset if needed (None if not found)"""
     # Check if using HuggingFace dataset
     if app.config.get("USE_HF_DATASET", False):
         # Load image from HuggingFace dataset
         try:
-            from huggingface_hub import hf_hub_download
-            
             dataset_name = app.config.get("HF_DATASET_NAME", "0001AMA/multimodal_data_annotator_dataset")
-            cache_dir = app.config.get("CACHE_DIR", None)
-            
-            # Try to find the file path
-            file_path = f
-            dataset_files = app.config.get("HF_DATASET_FILES", {})
+            file_path = hf_dataset_path(f)
             
-            # Try exact match first
-            if f not in dataset_files:
-                # Try to find by matching path
-                for path in dataset_files:
-                    if path.endswith(f) or f in path:
-                        file_path = path
-                        break
+            # Serve from the content-addressed cache; on a miss download straight into it
+            cache = get_image_cache()
+            cached_path = cache.get(file_path)
+            if cached_path is not None:
+                return cached_path
             
-            # Get HF token for authenticated requests
-            hf_token = os.getenv("HF_TOKEN") or os.getenv("HUGGING_FACE_HUB_TOKEN")
-            if not hf_token:
-                try:
-                    from huggingface_hub import HfApi
-                    api = HfApi()
-                    hf_token = api.token
-                except:
-                    pass
+            # Get HF token for authenticated requests (resolved once at startup)
+            hf_token = http_client.hf_token()
             
-            # Download file from HuggingFace
-            try:
-                local_path = hf_hub_download(
-                    repo_id=dataset_name,
-                    filename=file_path,
-                    repo_type="dataset",
-                    cache_dir=cache_dir,
-                    token=hf_token
-                )
-                
-                if os.path.exists(local_path):
-                    return send_file(local_path)
-            except Exception as download_error:
-                print(f"Error downloading file {file_path}: {download_error}")
-                # Try alternative: download to cache and serve
-                try:
-                    # Use cache_dir if available
-                    cache_file = os.path.join(cache_dir or tempfile.gettempdir(), file_path.replace('/', '_'))
-                    if not os.path.exists(cache_file):
+            def download():
+                # Another request may have finished this download while we queued for a slot
+                cached_path = cache.get(file_path)
+                if cached_path is not None:
+                    return cached_path
+                with get_download_limiter():
+                    # Same content already cached under another path: link it instead of downloading
+                    etag = hub_file_etag(dataset_name, file_path, hf_token)
+                    linked_path = cache.link_etag(file_path, etag) if etag else None
+                    if linked_path is not None:
+                        return linked_path
+                    with tempfile.TemporaryDirectory(dir=cache.root) as download_dir:
                         local_path = hf_hub_download(
                             repo_id=dataset_name,
                             filename=file_path,
                             repo_type="dataset",
-                            token=hf_token
+                            local_dir=download_dir,
+                            token=hf_token,
+                            endpoint=http_client.hf_endpoint()
                         )
-                        # Copy to cache
-                        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
-                        shutil.copy2(local_path, cache_file)
-                    else:
-                        local_path = cache_file
-                    
-                    return send_file(local_path)
-                except Exception as e2:
-                    print(f"Alternative download also failed: {e2}")
+                        return cache.put(file_path, local_path, move=True, etag=etag)
+
+            try:
+                # Concurrent requests for the same file share one download
+                return DOWNLOAD_FLIGHT.do(file_path, download, get_download_limiter())
+            except Overloaded:
+                raise
+            except Exception as download_error:
+                print(f"Error downloading file {file_path}: {download_error}")
                     
+        except Overloaded:
+            raise
         except Exception as e:
             print(f"Error loading image from dataset: {e}")
             import traceback
@@ -1098,35 +1769,185 @@ def images(f):
             # Fallback to local file if available
             pass
     
-    # Fallback to local file system
+    return local_image_path(f)
+
+def hub_file_etag(dataset_name, file_path, hf_token):
+    """The hub's etag for a dataset file (LFS sha256 or git blob id) from a HEAD request, or None"""
+    try:
+        url = hf_hub_url(dataset_name, file_path, repo_type="dataset", endpoint=http_client.hf_endpoint())
+        return get_hf_file_metadata(url, token=hf_token, endpoint=http_client.hf_endpoint()).etag
+    except Exception as e:
+        print(f"Could not look up the etag of {file_path}: {e}")
+        return None
+
+def hf_dataset_path(f):
+    """Path of an image inside the HF dataset repo (the requested path if no listed file matches)"""
+    dataset_files = app.config.get("HF_DATASET_FILES", {})
+    # Try exact match first
+    if f in dataset_files:
+        return f
+    # Try to find by matching path
+    for path in dataset_files:
+        if path.endswith(f) or f in path:
+            return path
+    return f
+
+def local_image_path(f):
+    """Path of an image under --dir, or None"""
     images_dir = app.config.get('IMAGES', '')
     if images_dir:
         file_path = os.path.join(images_dir, f)
         if os.path.exists(file_path):
-            return send_file(file_path)
+            return file_path
     
-    return "Image not found", 404
+    return None
+
+def get_image_cache():
+    """Content-addressed cache for downloaded dataset images, created on first use"""
+    cache = app.config.get("IMAGE_CACHE")
+    if cache is None:
+        cache_root = app.config.get("IMAGE_CACHE_DIR") or os.path.join(
+            app.config.get("CACHE_DIR") or os.path.join(tempfile.gettempdir(), "hf_dataset_cache"), "content")
+        cache = ContentCache(cache_root, app.config.get("IMAGE_CACHE_BYTES", DEFAULT_IMAGE_CACHE_BYTES))
+        app.config["IMAGE_CACHE"] = cache
+    return cache
+
+@app.route('/http_stats')
+def http_stats():
+    """Outbound HTTP counters: requests, new connections vs reuse, time spent connecting"""
+    return http_client.report()
+
+# Deduplicates concurrent downloads of the same dataset path
+DOWNLOAD_FLIGHT = SingleFlight()
+
+def get_download_limiter():
+    """Semaphore bounding concurrent hub downloads, with a bounded wait queue"""
+    limiter = app.config.get("DOWNLOAD_LIMITER")
+    if limiter is None:
+        limiter = app.config["DOWNLOAD_LIMITER"] = DownloadLimiter(
+            app.config.get("MAX_DOWNLOADS", 8), app.config.get("DOWNLOAD_QUEUE", 32))
+    return limiter
+
+@app.route('/cache_stats')
+def cache_stats():
+    """Hit/miss counters and size of the downloaded-image cache, plus download concurrency"""
+    if not app.config.get("USE_HF_DATASET", False):
+        return {"enabled": False}
+    return dict(get_image_cache().report(), enabled=True,
+                downloads=dict(get_download_limiter().report(), **DOWNLOAD_FLIGHT.stats,
+                               in_flight=DOWNLOAD_FLIGHT.in_flight()))
 
-def load_from_huggingface_dataset(dataset_name="0001AMA/multimodal_data_annotator_dataset"):
+@app.route('/image/<path:f>')
+def images(f):
+    try:
+        local_path = resolve_image_path(f)
+    except Overloaded as e:
+        print(f"Shedding image request for {f}: {e}")
+        return "Too many image downloads in progress, retry shortly", 503, {"Retry-After": "2"}
+    if local_path is None:
+        return "Image not found", 404
+    if 'tiles' in request.args or 'tile' in request.args:
+        status, payload = lookup_tiles(local_path, request.args)
+        if status != 200:
+            return payload, status
+        if isinstance(payload, dict):
+            return payload
+        local_path = payload
+    path, mimetype = negotiated_file(local_path, f, request.headers.get('Accept'), request.args.get('quality'))
+    response = send_file(path, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+def get_tile_cache():
+    """Deep-zoom tile pyramids of displayed images, created on first use"""
+    cache = app.config.get("TILE_CACHE")
+    if cache is None:
+        cache = app.config["TILE_CACHE"] = tiles.TileCache(
+            app.config.get("TILE_CACHE_DIR") or tiles.DEFAULT_CACHE_DIR,
+            app.config.get("TILE_CACHE_BYTES", tiles.DEFAULT_MAX_BYTES))
+    return cache
+
+def lookup_tiles(local_path, args):
+    """Serve ?tiles=info (pyramid layout) or ?tile=level/col/row for a local image.
+
+    Returns (200, info dict or tile file path) or (error status, message); the
+    first call for an image builds its pyramid, so this blocks on Pillow.
+    """
+    try:
+        if 'tile' in args:
+            try:
+                level, col, row = (int(part) for part in args['tile'].split('/'))
+            except ValueError:
+                return 400, "tile must be level/col/row"
+            tile_path = get_tile_cache().tile(local_path, level, col, row)
+            if tile_path is None:
+                return 404, "Tile outside the pyramid"
+            return 200, tile_path
+        return 200, get_tile_cache().info(local_path)
+    except (OSError, Image.DecompressionBombError) as e:
+        print(f"Error tiling {local_path}: {e}")
+        return 415, "Image can't be tiled"
+
+@app.route('/tile_stats')
+def tile_stats():
+    """Pyramids built, cache hits and bytes held by the deep-zoom tile cache"""
+    return get_tile_cache().report()
+
+def get_transcode_cache():
+    """WebP/AVIF variants of served images, created on first use"""
+    cache = app.config.get("TRANSCODE_CACHE")
+    if cache is None:
+        cache = app.config["TRANSCODE_CACHE"] = transcode.TranscodeCache(
+            app.config.get("TRANSCODE_CACHE_DIR") or transcode.DEFAULT_CACHE_DIR,
+            app.config.get("TRANSCODE_CACHE_BYTES", transcode.DEFAULT_MAX_BYTES))
+    return cache
+
+def negotiated_file(local_path, f, accept, quality=None):
+    """(file, mimetype) to send for image f: a WebP/AVIF variant the Accept header allows, or the PNG.
+
+    Views in LOSSLESS_VIEWS only get lossless variants; ?quality= picks another
+    lossy quality level. The first request for a variant encodes it, so this
+    blocks on Pillow. A None mimetype means the original file.
+    """
+    formats = app.config.get("IMAGE_FORMATS")
+    if formats is None:
+        formats = app.config["IMAGE_FORMATS"] = transcode.available_formats()
+    if not formats:
+        return local_path, None
+    lossless = get_schema().view_of(f) in app.config.get("LOSSLESS_VIEWS", transcode.DEFAULT_LOSSLESS_VIEWS)
+    mime = transcode.negotiate(accept, formats, lossless)
+    variant = None
+    if mime is not None:
+        try:
+            quality = transcode.clamp_quality(quality) if quality else app.config.get("IMAGE_QUALITY", transcode.DEFAULT_QUALITY)
+        except ValueError:
+            quality = app.config.get("IMAGE_QUALITY", transcode.DEFAULT_QUALITY)
+        try:
+            variant = get_transcode_cache().variant(local_path, mime, quality, lossless)
+        except (OSError, Image.DecompressionBombError) as e:
+            print(f"Error transcoding {local_path}: {e}")
+    get_transcode_cache().record_served(local_path, variant)
+    return (variant, mime) if variant else (local_path, None)
+
+@app.route('/transcode_stats')
+def transcode_stats():
+    """Variants encoded, cache hits and the share of image bytes saved by transcoding"""
+    return dict(get_transcode_cache().report(), formats=app.config.get("IMAGE_FORMATS"))
+
+def load_from_huggingface_dataset(dataset_name="0001AMA/multimodal_data_annotator_dataset", revision=None, schema=None):
     """Load and process images from HuggingFace dataset"""
     print(f"Loading dataset from HuggingFace: {dataset_name}")
     
     try:
-        from huggingface_hub import list_repo_files, hf_hub_download
+        from huggingface_hub import HfApi
         
-        # Get HF token for authenticated requests
-        hf_token = os.getenv("HF_TOKEN") or os.getenv("HUGGING_FACE_HUB_TOKEN")
-        if not hf_token:
-            try:
-                from huggingface_hub import HfApi
-                api = HfApi()
-                hf_token = api.token
-            except:
-                pass
+        # Get HF token for authenticated requests (resolved once at startup)
+        hf_token = http_client.hf_token()
         
         # List all files in the dataset repository
-        print("Listing files in dataset repository...")
-        repo_files = list_repo_files(repo_id=dataset_name, repo_type="dataset", token=hf_token)
+        print(f"Listing files in dataset repository at {http_client.hf_endpoint()}...")
+        repo_files = HfApi(endpoint=http_client.hf_endpoint()).list_repo_files(
+            repo_id=dataset_name, repo_type="dataset", revision=revision, token=hf_token)
         print(f"Found {len(repo_files)} files in repository")
         
         # Filter PNG files only
@@ -1138,70 +1959,9 @@ def load_from_huggingface_dataset(dataset_name="0001AMA/multimodal_data_annotato
         os.makedirs(cache_dir, exist_ok=True)
         app.config["CACHE_DIR"] = cache_dir
         
-        # Process files to group by folder and file ID
-        folder_sets = []
-        required_suffixes = ['sr_int_full.png', '-tr_line.png', '-tr_int_full.png']
+        folder_sets = group_hf_files(png_files, schema)
 
-        # Group files by folder and file ID
-        folder_files = {}  # {folder_name: {file_id: {suffix: file_path}}}
-        
-        for file_path in png_files:
-            # Extract folder name and filename
-            path_parts = file_path.split('/')
-            if len(path_parts) < 2:
-                continue
-            
-            folder_name = path_parts[0]
-            filename = path_parts[-1]
-            
-            # Check if file matches required suffixes
-            matched_suffix = None
-            for suffix in required_suffixes:
-                if filename.endswith(suffix):
-                    matched_suffix = suffix
-                    break
-            
-            if not matched_suffix:
-                continue
-            
-            # Extract file ID prefix (everything before the first '-')
-            if '-' in filename:
-                file_id = filename.split('-')[0]
-            else:
-                continue
-            
-            # Initialize folder structure
-            if folder_name not in folder_files:
-                folder_files[folder_name] = {}
-            if file_id not in folder_files[folder_name]:
-                folder_files[folder_name][file_id] = {}
-            
-            # Store file path
-            folder_files[folder_name][file_id][matched_suffix] = file_path
-        
-        # Create folder sets with valid image sets
-        for folder_name, file_ids in folder_files.items():
-            valid_image_sets = []
-            for file_id, images in file_ids.items():
-                # Check if all three required suffixes are present
-                if all(suffix in images for suffix in required_suffixes):
-                    valid_image_sets.append({
-                        'file_id': file_id,
-                        'sr_int_full': images['sr_int_full.png'],
-                        'tr_line': images['-tr_line.png'],
-                        'tr_int_full': images['-tr_int_full.png']
-                    })
-                    print(f"DEBUG: Created valid image set for file_id '{file_id}' in folder '{folder_name}'")
-            
-            if valid_image_sets:
-                folder_sets.append({
-                    'folder': folder_name,
-                    'image_sets': valid_image_sets
-                })
-                print(f"DEBUG: Added folder '{folder_name}' with {len(valid_image_sets)} image sets")
-        
-        # Store file list for image serving
-        app.config["HF_DATASET_FILES"] = {f: f for f in png_files}
+        # Image serving looks paths up in the manifest built from these sets (HF_DATASET_FILES)
         app.config["HF_DATASET_NAME"] = dataset_name
         
         print(f"Successfully processed {len(folder_sets)} folders with valid image sets")
@@ -1213,92 +1973,466 @@ def load_from_huggingface_dataset(dataset_name="0001AMA/multimodal_data_annotato
         traceback.print_exc()
         return []
 
-def load_from_local_directory(directory):
-    """Load and process images from local directory (original method)"""
+def group_hf_files(png_files, schema=None):
+    """Folder sets of the complete image sets among the dataset repo's PNG paths"""
+    schema = schema or get_schema()
     folder_sets = []
-    required_suffixes = ['sr_int_full.png', '-tr_line.png', '-tr_int_full.png']
 
-    for (dirpath, dirnames, filenames) in walk(directory):
-        if dirpath == directory:  # Skip root directory
-            continue
-
-        # Find ALL images with required suffixes in this folder and group by file ID prefix
-        found_images = {'sr_int_full.png': [], '-tr_line.png': [], '-tr_int_full.png': []}
-        for filename in filenames:
-            for suffix in required_suffixes:
-                if filename.endswith(suffix):
-                    relative_path = os.path.relpath(os.path.join(dirpath, filename), directory)
-                    found_images[suffix].append(relative_path)
-
-        # Group images by their file ID prefix (everything before the first '-')
-        image_groups = {}
-        for suffix in required_suffixes:
-            for image_path in found_images[suffix]:
-                filename = os.path.basename(image_path)
-                # Extract file ID prefix (everything before the first '-')
-                if '-' in filename:
-                    file_id = filename.split('-')[0]
-                    if file_id not in image_groups:
-                        image_groups[file_id] = {}
-                    image_groups[file_id][suffix] = image_path
-                    print(f"DEBUG: Grouped {filename} with file_id '{file_id}' for suffix '{suffix}'")
-
-        # Create image sets only for file IDs that have all three image types
-        valid_image_sets = []
-        for file_id, images in image_groups.items():
-            print(f"DEBUG: Checking file_id '{file_id}' - has suffixes: {list(images.keys())}")
-            if all(suffix in images for suffix in required_suffixes):
-                valid_image_sets.append({
-                    'file_id': file_id,
-                    'sr_int_full': images['sr_int_full.png'],
-                    'tr_line': images['-tr_line.png'],
-                    'tr_int_full': images['-tr_int_full.png']
-                })
-                print(f"DEBUG: Created valid image set for file_id '{file_id}'")
-            else:
-                print(f"DEBUG: Skipped file_id '{file_id}' - missing suffixes: {[s for s in required_suffixes if s not in images]}")
-
-        # Only include folders that have at least one complete image set
+    # Group files by top-level folder, then by file ID within each folder
+    folder_files = {}  # {folder_name: [file_path, ...]}
+    for file_path in png_files:
+        folder_name, separator, _ = file_path.partition('/')
+        if separator:
+            folder_files.setdefault(folder_name, []).append(file_path)
+
+    # Create folder sets with valid image sets
+    for folder_name, paths in folder_files.items():
+        valid_image_sets, incomplete = schema.image_sets(paths)
+        for file_id, missing in incomplete.items():
+            print(f"DEBUG: Skipped file_id '{file_id}' in folder '{folder_name}' - missing views: {missing}")
         if valid_image_sets:
-            folder_name = os.path.basename(dirpath)
             folder_sets.append({
                 'folder': folder_name,
                 'image_sets': valid_image_sets
             })
+            print(f"DEBUG: Added folder '{folder_name}' with {len(valid_image_sets)} image sets")
+    return folder_sets
+
+def hf_dataset_revision(dataset_name="0001AMA/multimodal_data_annotator_dataset"):
+    """Commit sha the dataset repo's main branch points at"""
+    from huggingface_hub import HfApi
+    return HfApi(endpoint=http_client.hf_endpoint()).dataset_info(dataset_name, token=http_client.hf_token()).sha
+
+def load_from_local_directory(directory, schema=None):
+    """Load and process images from local directory (original method)"""
+    schema = schema or get_schema()
+    folder_sets = []
+    for (dirpath, dirnames, filenames) in walk(directory):
+        if dirpath == directory:  # Skip root directory
+            continue
+        folder_set = scan_local_folder(directory, dirpath, filenames, schema)
+        # Only include folders that have at least one complete image set
+        if folder_set is not None:
+            folder_sets.append(folder_set)
 
     return folder_sets
 
-if __name__ == "__main__":
+def scan_local_folder(directory, dirpath, filenames, schema=None):
+    """Folder set of the complete image sets among one directory's filenames, or None if it has none"""
+    schema = schema or get_schema()
+    # Paths are relative to the dataset directory; the folder prefix is the same for every file
+    prefix = os.path.relpath(dirpath, directory)
+    prefix = "" if prefix == "." else prefix + "/"
+    valid_image_sets, incomplete = schema.image_sets([prefix + filename for filename in filenames])
+    for file_id, missing in incomplete.items():
+        print(f"DEBUG: Skipped file_id '{file_id}' in {dirpath} - missing views: {missing}")
+
+    if not valid_image_sets:
+        return None
+    print(f"DEBUG: Found {len(valid_image_sets)} image sets in {dirpath}")
+    return {
+        'folder': os.path.basename(dirpath),
+        'image_sets': valid_image_sets
+    }
+
+def load_manifest(path, source, schema=DEFAULT_SCHEMA, fingerprint=None):
+    """Memory-map a manifest saved for this dataset source and schema by an earlier start, or None.
+
+    With a fingerprint (directory mtimes, or the hub commit), a manifest built
+    from other dataset contents is rescanned too.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        manifest = Manifest.load(path)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring manifest {path}: {e}")
+        return None
+    if manifest.meta.get("source") != source:
+        print(f"Manifest {path} was built for {manifest.meta.get('source')}; rescanning")
+        return None
+    if manifest.schema != schema:
+        print(f"Manifest {path} was built for other views ({manifest.schema.describe()}); rescanning")
+        return None
+    if fingerprint is not None and manifest.meta.get("fingerprint") != fingerprint:
+        print(f"Dataset changed since manifest {path} was built; rescanning")
+        return None
+    print(f"Loaded manifest {path}: {len(manifest)} folders, {manifest.set_count} image sets")
+    return manifest
+
+def save_manifest(manifest, path):
+    """Write the manifest to path (if given) and return it memory-mapped from there, for other workers to share"""
+    if not path or not len(manifest):
+        return manifest
+    manifest.save(path)
+    return Manifest.load(path)
+
+# Serializes dataset updates from the watcher threads
+DATASET_LOCK = threading.Lock()
+
+def current_manifest():
+    folder_sets = app.config.get("FOLDER_SETS")
+    if isinstance(folder_sets, Manifest):
+        return folder_sets
+    return Manifest.from_folder_sets(folder_sets or [], app.config.get("DATASET_META"), get_schema())
+
+def merge_image_sets(old_sets, new_sets):
+    """A folder's rescanned sets, ordered so the sets it already had keep their order and new ones follow"""
+    by_file_id = {image_set['file_id']: image_set for image_set in new_sets}
+    kept = [by_file_id.pop(image_set['file_id']) for image_set in old_sets if image_set['file_id'] in by_file_id]
+    return kept + list(by_file_id.values())
+
+def follow_position(old, new, folder_map, set_map):
+    """(HEAD, IMAGE_SET_INDEX) in new of the set they point at in old, or of its nearest surviving neighbour"""
+    head, image_set_index = app.config.get("HEAD", 0), app.config.get("IMAGE_SET_INDEX", 0)
+    if not 0 <= head < len(old):
+        return 0, 0
+    old_offsets, new_offsets = old.offsets(), new.offsets()
+    new_head = int(folder_map[head])
+    if new_head >= 0:
+        if image_set_index < old_offsets[head + 1] - old_offsets[head]:
+            global_index = int(set_map[old_offsets[head] + image_set_index])
+            if global_index >= 0:
+                return new_head, global_index - new_offsets[new_head]
+        # The set is gone but its folder isn't: stay at the same place in the folder
+        return new_head, min(image_set_index, new_offsets[new_head + 1] - new_offsets[new_head] - 1)
+    for position in range(head + 1, len(old)):
+        if folder_map[position] >= 0:
+            return int(folder_map[position]), 0
+    return 0, 0
+
+def update_dataset(changes, added=(), **meta):
+    """Splice rescanned folders into FOLDER_SETS (see Manifest.replace_folders) without moving HEAD / IMAGE_SET_INDEX off their set"""
+    with DATASET_LOCK:
+        old = current_manifest()
+        manifest, folder_map, set_map = old.replace_folders(changes, added, dict(old.meta, **meta))
+        manifest = save_manifest(manifest, app.config.get("MANIFEST_PATH"))
+        head, image_set_index = follow_position(old, manifest, folder_map, set_map)
+
+        if app.config.get("USE_HF_DATASET"):
+            app.config["HF_DATASET_FILES"] = manifest.image_to_set
+        app.config["DATASET_META"] = manifest.meta
+        if len(manifest):
+            app.config["FOLDER_SETS"] = manifest
+            app.config["DATASET_ERROR"] = None
+        else:
+            app.config["FOLDER_SETS"] = []
+        app.config["HEAD"], app.config["IMAGE_SET_INDEX"] = head, image_set_index
+        # Indexes over the old numbering are rebuilt on next use
+        app.config["SET_INDEX"] = app.config["SEARCH_INDEX"] = app.config["DATASET_STATS"] = None
+        with SPRITE_LOCK:
+            app.config.get("SPRITE_CACHE", {}).clear()
+
+        kept = int((set_map >= 0).sum())
+        stats = app.config.setdefault("DATASET_UPDATES", {"updates": 0, "sets_added": 0, "sets_removed": 0,
+                                                          "folders_added": 0, "folders_removed": 0})
+        stats["updates"] += 1
+        stats["sets_added"] += manifest.set_count - kept
+        stats["sets_removed"] += old.set_count - kept
+        stats["folders_added"] += len(manifest) - int((folder_map >= 0).sum())
+        stats["folders_removed"] += int((folder_map < 0).sum())
+        print(f"Dataset updated: {manifest.set_count - kept} image sets added, {old.set_count - kept} removed "
+              f"({len(manifest)} folders, {manifest.set_count} sets)")
+
+def rescan_local_folders(dirpaths, observed_ns):
+    """Apply the directory changes reported by the dataset watcher to FOLDER_SETS"""
+    directory = app.config["IMAGES"]
+    manifest = current_manifest()
+    positions = {}
+    for position in range(len(manifest)):
+        positions.setdefault(manifest.folder_dir(position), position)
+    changes, added = {}, []
+    for dirpath in dirpaths:
+        relative = os.path.relpath(dirpath, directory).replace(os.sep, '/')
+        if relative == '.':  # Skip root directory
+            continue
+        try:
+            filenames = [entry.name for entry in os.scandir(dirpath) if entry.is_file()]
+        except (FileNotFoundError, NotADirectoryError):
+            filenames = []
+        folder_set = scan_local_folder(directory, dirpath, filenames)
+        image_sets = folder_set['image_sets'] if folder_set else []
+        position = positions.get(relative + '/')
+        if position is None:
+            if image_sets:
+                added.append(folder_set)
+            continue
+        old_sets = manifest[position]['image_sets']
+        merged = merge_image_sets(old_sets, image_sets)
+        if merged != list(old_sets):
+            changes[position] = merged
+    if changes or added:
+        update_dataset(changes, added, scanned_at=observed_ns)
+    if app.config.get("INTEGRITY_CHECK", "none") != "none":
+        # Rewritten files keep their sets but may have been repaired (or broken)
+        start_integrity_check()
+
+def refresh_hf_dataset(revision):
+    """Re-list the dataset repo at a new revision and apply the folders that changed to FOLDER_SETS"""
+    from huggingface_hub import HfApi
+    dataset_name = app.config.get("HF_DATASET_NAME", "0001AMA/multimodal_data_annotator_dataset")
+    repo_files = HfApi(endpoint=http_client.hf_endpoint()).list_repo_files(
+        repo_id=dataset_name, repo_type="dataset", revision=revision, token=http_client.hf_token())
+    listed = {}
+    for folder_set in group_hf_files([f for f in repo_files if f.endswith('.png')]):
+        listed.setdefault(folder_set['folder'], folder_set)
+    manifest = current_manifest()
+    changes = {}
+    for position in range(len(manifest)):
+        folder_set = manifest[position]
+        old_sets = folder_set['image_sets']
+        new_sets = listed.pop(folder_set['folder'], {'image_sets': []})['image_sets']
+        merged = merge_image_sets(old_sets, new_sets)
+        if merged != list(old_sets):
+            changes[position] = merged
+    update_dataset(changes, list(listed.values()), revision=revision, fingerprint=revision)
+
+def start_dataset_watcher(interval=None):
+    """Keep FOLDER_SETS in step with the dataset: watch the local directory, or poll the hub revision"""
+    meta = current_manifest().meta
+    if app.config.get("USE_HF_DATASET"):
+        watcher = RevisionWatcher(lambda: hf_dataset_revision(app.config.get("HF_DATASET_NAME", "0001AMA/multimodal_data_annotator_dataset")),
+                                  refresh_hf_dataset, revision=meta.get("revision"),
+                                  interval=interval or DEFAULT_REVISION_INTERVAL)
+    else:
+        watcher = DirectoryWatcher(app.config["IMAGES"], rescan_local_folders,
+                                   interval=interval or DEFAULT_WATCH_INTERVAL, since_ns=meta.get("scanned_at"))
+    print(f"Watching the dataset for changes ({watcher.stats['backend']})")
+    app.config["DATASET_WATCHER"] = watcher.start()
+    return watcher
+
+@app.route('/watch_stats')
+def watch_stats():
+    """Dataset watcher backend and counters, and the image sets added / removed since startup"""
+    watcher = app.config.get("DATASET_WATCHER")
+    return {"watcher": dict(watcher.stats) if watcher else None,
+            "dataset": dict(app.config.get("DATASET_UPDATES", {})),
+            "meta": current_manifest().meta}
+
+# Serializes starting the integrity check thread
+INTEGRITY_LOCK = threading.Lock()
+
+def get_integrity_cache():
+    if app.config.get("INTEGRITY_CACHE") is None:
+        app.config["INTEGRITY_CACHE"] = integrity.IntegrityCache(app.config.get("INTEGRITY_CACHE_PATH", integrity.DEFAULT_INTEGRITY_CACHE))
+    return app.config["INTEGRITY_CACHE"]
+
+def start_integrity_check():
+    """Check the dataset's images in a background thread; asked again while one runs, it runs once more after"""
+    with INTEGRITY_LOCK:
+        stats = app.config.setdefault("INTEGRITY_STATS", {"status": "idle", "runs": 0, "errors": 0})
+        if stats["status"] == "running":
+            app.config["INTEGRITY_RERUN"] = True
+            return
+        stats["status"] = "running"
+    threading.Thread(target=run_integrity_checks, name="integrity-check", daemon=True).start()
+
+def run_integrity_checks():
+    stats = app.config["INTEGRITY_STATS"]
+    while True:
+        app.config["INTEGRITY_RERUN"] = False
+        try:
+            check_dataset_integrity()
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"Error checking dataset integrity: {e}")
+            import traceback
+            traceback.print_exc()
+        with INTEGRITY_LOCK:
+            if not app.config.get("INTEGRITY_RERUN"):
+                stats["status"] = "done"
+                return
+
+def check_dataset_integrity():
+    """Check every image of the local dataset (see integrity.py) and flag the invalid sets in INVALID_SETS"""
+    root = os.path.abspath(app.config["IMAGES"])
+    image_sets = current_manifest().image_sets
+    stats = app.config["INTEGRITY_STATS"]
+
+    def progress(done, total):
+        stats["progress"] = f"{done}/{total}"
+
+    invalid, mismatched, run = integrity.check_sets(
+        image_sets, lambda image: os.path.join(root, image), get_integrity_cache(),
+        decode=app.config.get("INTEGRITY_CHECK") == "decode",
+        workers=app.config.get("INTEGRITY_WORKERS"), progress=progress)
+
+    def by_image(sets):
+        # Keyed by image path rather than set number, so flags survive dataset updates
+        flagged, examples = {}, []
+        for position, problems in sets.items():
+            image_set = image_sets[position]
+            for view in views_of(image_set):
+                flagged[image_set[view]] = problems
+            if len(examples) < 100:
+                examples.append({"file_id": image_set['file_id'], "image": image_set[views_of(image_set)[0]],
+                                 "problems": problems})
+        return flagged, examples
+
+    app.config["INVALID_SETS"], invalid_examples = by_image(invalid)
+    app.config["MISMATCHED_SETS"], mismatched_examples = by_image(mismatched)
+    stats.update(run, runs=stats["runs"] + 1, last_run=time.time(), invalid=invalid_examples,
+                 mismatched=mismatched_examples)
+    stats.pop("progress", None)
+    print(f"Integrity check: {run['invalid_sets']} of {run['sets']} image sets invalid, "
+          f"{run['mismatched_sets']} with mismatched sizes "
+          f"({run['checked']} images checked, {run['cached']} cached, {run['seconds']:.1f}s)")
+
+def is_flagged(image_set):
+    """True for an image set the integrity check found missing, truncated or corrupt images in"""
+    flagged = app.config.get("INVALID_SETS")
+    return bool(flagged) and image_set[views_of(image_set)[0]] in flagged
+
+def skip_invalid_sets(step=1):
+    """Move HEAD / IMAGE_SET_INDEX off a flagged set, to the next (step 1) or previous (step -1) valid one"""
+    if not app.config.get("INVALID_SETS"):
+        return
+    set_index = get_set_index()
+    if len(set_index) == 0:
+        return
+    current = set_index.global_index(app.config["HEAD"], app.config.get("IMAGE_SET_INDEX", 0))
+    for _ in range(len(set_index)):
+        if not is_flagged(set_index.image_sets[current]):
+            app.config["HEAD"], app.config["IMAGE_SET_INDEX"] = set_index.locate(current)
+            return
+        current = (current + step) % len(set_index)
+
+@app.route('/integrity_stats')
+def integrity_stats():
+    """Integrity check progress and results, with up to 100 of the invalid and of the mismatched image sets"""
+    return {"mode": app.config.get("INTEGRITY_CHECK", "none"), "stats": dict(app.config.get("INTEGRITY_STATS", {})),
+            "flagged_images": len(app.config.get("INVALID_SETS") or {}),
+            "mismatched_images": len(app.config.get("MISMATCHED_SETS") or {})}
+
+def build_parser():
+    """Command-line options shared by the Flask server and the async server (asgi_app.py)"""
     parser = argparse.ArgumentParser()
     parser.add_argument('--dir', type=str, default=None, help='specify the images directory (optional, uses HF dataset if not provided)')
     parser.add_argument("--out")
-    args = parser.parse_args()
-    
+    parser.add_argument('--db', type=str, default=None, help='optional SQLite annotation store (WAL mode); out.csv is then written on /export_csv')
+    parser.add_argument('--duplicate-iou', type=float, default=DEFAULT_DUPLICATE_IOU, help='IoU at or above which a new box is ignored as a duplicate')
+    parser.add_argument('--view-registration', type=str, default=None, help='JSON file with per-view affine overrides for label propagation')
+    parser.add_argument('--auto-propagate-views', action='store_true', help='project each labelled box into the sibling views of its image set')
+    parser.add_argument('--proposals', choices=sorted(PROPOSERS) + ['none'], default='none', help='CPU box proposer run ahead of the annotator on sr_int_full images')
+    parser.add_argument('--proposal-workers', type=int, default=2, help='background processes computing proposals')
+    parser.add_argument('--proposal-lookahead', type=int, default=5, help='number of upcoming sets to compute proposals for')
+    parser.add_argument('--image-cache-dir', default=None, help='content-addressed cache for downloaded HF images (default: <tmp>/hf_dataset_cache/content)')
+    parser.add_argument('--image-cache-bytes', type=int, default=int(os.getenv("IMAGE_CACHE_BYTES", DEFAULT_IMAGE_CACHE_BYTES)), help='byte budget of the image cache; least recently used images are evicted beyond it')
+    parser.add_argument('--tile-cache-dir', default=None, help='deep-zoom tile pyramids of tr_line / tr_int_full images (default: <tmp>/tile_cache)')
+    parser.add_argument('--tile-cache-bytes', type=int, default=tiles.DEFAULT_MAX_BYTES, help='byte budget of the tile cache; least recently used pyramids are evicted beyond it')
+    parser.add_argument('--image-formats', nargs='*', choices=['avif', 'webp'], default=['avif', 'webp'], help='formats /image may transcode to when the Accept header allows, in order of preference (none: always send PNGs)')
+    parser.add_argument('--image-quality', type=int, default=transcode.DEFAULT_QUALITY, help='lossy WebP/AVIF quality; ?quality= picks another level per request')
+    parser.add_argument('--lossless-views', nargs='*', default=list(transcode.DEFAULT_LOSSLESS_VIEWS), help='views only ever sent lossless (PNG or lossless WebP)')
+    parser.add_argument('--transcode-cache-dir', default=None, help='transcoded image variants (default: <tmp>/transcode_cache)')
+    parser.add_argument('--transcode-cache-bytes', type=int, default=transcode.DEFAULT_MAX_BYTES, help='byte budget of the transcode cache')
+    parser.add_argument('--manifest', default=None, help='file holding the scanned dataset as a memory-mapped manifest; reused (and shared by worker processes) while the dataset source is unchanged, rescanned otherwise')
+    parser.add_argument('--schema', default=None, help='JSON file describing the views of an image set: their names, filename suffixes and the file ID rule (default: sr_int_full, tr_line, tr_int_full; see dataset_schema.py)')
+    parser.add_argument('--watch', action='store_true', help='pick up added and deleted image sets while running: inotify (or polling) on --dir, periodic revision checks on the HF dataset')
+    parser.add_argument('--watch-interval', type=float, default=None, help=f'seconds between directory polls (default {DEFAULT_WATCH_INTERVAL:g}) or hub revision checks (default {DEFAULT_REVISION_INTERVAL:g})')
+    parser.add_argument('--integrity-check', choices=['none', 'crc', 'decode'], default='none', help='check every PNG of a --dir dataset in the background (chunk CRCs, or a full decode too) and skip invalid sets while navigating')
+    parser.add_argument('--integrity-workers', type=int, default=2, help='processes checking images')
+    parser.add_argument('--integrity-cache', default=integrity.DEFAULT_INTEGRITY_CACHE, help='integrity results reused while a file keeps its size and mtime')
+    parser.add_argument('--max-downloads', type=int, default=8, help='concurrent hub downloads')
+    parser.add_argument('--download-queue', type=int, default=32, help='requests allowed to wait for a download slot; beyond this /image answers 503')
+    parser.add_argument('--class-registry', default=DEFAULT_REGISTRY, help='JSON file with persisted class IDs and aliases')
+    parser.add_argument('--hf-endpoint', default=None, help='hub URL for dataset listing, downloads and metrics, e.g. a local fake_hub.py (default: HF_ENDPOINT or https://huggingface.co)')
+    parser.add_argument('--host', default=None, help='interface to listen on (default: 0.0.0.0 on HF Spaces, else 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=None, help='port to listen on (default: 7860 on HF Spaces, else 7620)')
+    return parser
+
+def listen_address(args):
+    """(host, port) from --host/--port, falling back to the HF Spaces or local defaults"""
+    # For HuggingFace Spaces, use 0.0.0.0 and port 7860
+    # For local development, you can use 127.0.0.1 and port 7620
+    if os.getenv("SPACE_ID"):  # Running on HuggingFace
+        host, port = "0.0.0.0", 7860
+    else:  # Running locally
+        host, port = "127.0.0.1", 7620
+    return args.host or host, args.port or port
+
+def configure_app(args):
+    """Load the dataset and annotations into app.config according to parsed command-line options"""
+    app.config["IMAGE_CACHE_DIR"] = args.image_cache_dir
+    app.config["IMAGE_CACHE_BYTES"] = args.image_cache_bytes
+    app.config["TILE_CACHE_DIR"] = args.tile_cache_dir
+    app.config["TILE_CACHE_BYTES"] = args.tile_cache_bytes
+    app.config["IMAGE_FORMATS"] = transcode.available_formats(args.image_formats)
+    app.config["IMAGE_QUALITY"] = transcode.clamp_quality(args.image_quality)
+    app.config["LOSSLESS_VIEWS"] = tuple(args.lossless_views)
+    app.config["TRANSCODE_CACHE_DIR"] = args.transcode_cache_dir
+    app.config["TRANSCODE_CACHE_BYTES"] = args.transcode_cache_bytes
+    app.config["MAX_DOWNLOADS"] = args.max_downloads
+    app.config["DOWNLOAD_QUEUE"] = args.download_queue
+    app.config["DUPLICATE_IOU"] = args.duplicate_iou
+    if args.proposals != 'none':
+        app.config["PROPOSAL_ENGINE"] = ProposalEngine(args.proposals, workers=args.proposal_workers)
+        app.config["PROPOSAL_LOOKAHEAD"] = args.proposal_lookahead
+    app.config["AUTO_PROPAGATE_VIEWS"] = args.auto_propagate_views
+    app.config["VIEW_REGISTRATION"] = ViewRegistration.load(args.view_registration) if args.view_registration else ViewRegistration()
     app.config["LABELS"] = []
-    app.config["CLASS_TO_ID"] = {}  # Maps class names to IDs
-    app.config["NEXT_CLASS_ID"] = 1  # Next available class ID
+    app.config["CLASS_REGISTRY"] = ClassRegistry(args.class_registry)
+    print(f"Loaded {len(app.config['CLASS_REGISTRY'])} classes from {args.class_registry}")
     
     # Check if running on HuggingFace Spaces or if no local directory specified
     is_hf_space = os.getenv("SPACE_ID") is not None
+    http_client.set_hf_endpoint(args.hf_endpoint)
+    # Resolve the HF token once and give huggingface_hub a pooled client
+    if http_client.hf_token():
+        print("Using HF token for authenticated requests")
+    http_client.share_with_hf_hub()
     use_hf_dataset = args.dir is None or is_hf_space
     
     if use_hf_dataset:
         print("===== Application Startup at " + str(os.popen('date').read().strip()) + " =====")
-        print("Loading from HuggingFace dataset...")
         app.config["USE_HF_DATASET"] = True
-        folder_sets = load_from_huggingface_dataset("0001AMA/multimodal_data_annotator_dataset")
         app.config["IMAGES"] = ""  # Not using local directory
+        source = f"hf:{http_client.hf_endpoint()}/datasets/0001AMA/multimodal_data_annotator_dataset"
     else:
-        print("Loading from local directory...")
         app.config["USE_HF_DATASET"] = False
         directory = args.dir
         if directory[-1] != "/":
             directory += "/"
         app.config["IMAGES"] = directory
-        folder_sets = load_from_local_directory(directory)
+        source = f"dir:{os.path.abspath(directory)}"
+
+    schema = DatasetSchema.load(args.schema) if args.schema else DEFAULT_SCHEMA
+    app.config["SCHEMA"] = schema
+    app.config["MANIFEST_PATH"] = args.manifest
+    # What the dataset looks like now: the hub commit, or the directory mtimes (taken before a scan, so
+    # changes made during it show up as a mismatch next time)
+    fingerprint = None
+    if use_hf_dataset:
+        if args.manifest or args.watch:
+            try:
+                fingerprint = hf_dataset_revision("0001AMA/multimodal_data_annotator_dataset")
+            except Exception as e:
+                print(f"Could not read the dataset revision: {e}")
+    elif args.manifest:
+        fingerprint = dataset_fingerprint(directory)
+    # A watcher catches up on changes made while the server was stopped, so it keeps the saved manifest
+    folder_sets = load_manifest(args.manifest, source, schema, None if args.watch else fingerprint)
+    if folder_sets is None:
+        meta = {"source": source}
+        if fingerprint is not None:
+            meta["fingerprint"] = fingerprint
+            if use_hf_dataset:
+                # List at a known commit, so the watcher can tell when the repo moves past it
+                meta["revision"] = fingerprint
+        if use_hf_dataset:
+            print("Loading from HuggingFace dataset...")
+            folder_sets = load_from_huggingface_dataset("0001AMA/multimodal_data_annotator_dataset", meta.get("revision"), schema)
+        else:
+            # Directories modified after this are rescanned when a watcher starts on the saved manifest
+            meta["scanned_at"] = time.time_ns()
+            print("Loading from local directory...")
+            folder_sets = load_from_local_directory(directory, schema)
+        folder_sets = save_manifest(Manifest.from_folder_sets(folder_sets, meta, schema), args.manifest)
+    app.config["DATASET_META"] = folder_sets.meta
+    if use_hf_dataset:
+        app.config["HF_DATASET_FILES"] = folder_sets.image_to_set
 
     if not folder_sets:
-        error_msg = "No folders found with all three required image types (sr_int_full.png, -tr_line.png, -tr_int_full.png)"
+        error_msg = f"No folders found with a complete image set ({schema.describe()})"
         print(error_msg)
         if use_hf_dataset:
             print("This may be due to:")
@@ -1316,9 +2450,8 @@ if __name__ == "__main__":
     app.config["OUT"] = args.out if args.out else "out.csv"
 
     # Check if CSV file exists, create header only if it doesn't exist
-    import os
     if not os.path.exists(app.config["OUT"]):
-        with open(app.config["OUT"], 'w') as f:
+        with atomic_write(app.config["OUT"]) as f:
             f.write("image,id,name,centerX,centerY,width,height\n")
         print(f"Created new CSV file: {app.config['OUT']}")
     else:
@@ -1334,12 +2467,32 @@ if __name__ == "__main__":
                 backup_name = app.config["OUT"].replace('.csv', '_backup.csv')
                 os.rename(app.config["OUT"], backup_name)
                 print(f"Backed up old file to: {backup_name}")
-                with open(app.config["OUT"], 'w') as f:
+                with atomic_write(app.config["OUT"]) as f:
                     f.write("image,id,name,centerX,centerY,width,height\n")
                 print(f"Created new CSV file with correct header")
 
+    # Open the SQLite store if requested, seeding it from the CSV on first use
+    if args.db:
+        store = AnnotationStore(args.db)
+        app.config["STORE"] = store
+        if store.count() == 0 and os.path.exists(app.config["OUT"]):
+            print(f"Imported {store.import_csv(app.config['OUT'], app.config['CLASS_REGISTRY'])} annotations from {app.config['OUT']} into {args.db}")
+        app.config["LABELS"] = store.labels()
+        # Older stores may hold IDs assigned before the registry existed
+        registry = app.config["CLASS_REGISTRY"]
+        for name, class_id in store.class_map().items():
+            registry.get_or_create(name, class_id)
+        for label in app.config["LABELS"]:
+            if label.get("name"):
+                before = (label.get("id"), label["name"])
+                registry.canonicalize(label)
+                if (label["id"], label["name"]) != before:
+                    store.set_label(label["db_id"], int(label["id"]), label["name"])
+                    store.set_class(label["name"], int(label["id"]))
+        print(f"Loaded {len(app.config['LABELS'])} annotations from SQLite store: {args.db}")
+
     # Load existing annotations from CSV if file exists and has content
-    if os.path.exists(app.config["OUT"]):
+    elif os.path.exists(app.config["OUT"]):
         try:
             with open(app.config["OUT"], 'r') as f:
                 lines = f.readlines()[1:]  # Skip header
@@ -1348,17 +2501,8 @@ if __name__ == "__main__":
                     if line:  # Skip empty lines
                         parts = line.split(',')
                         if len(parts) >= 7:  # Ensure we have all required fields
-                            class_name = parts[2].lower() if parts[2] else ""
                             class_id = parts[1] if parts[1] else ""
 
-                            # Rebuild class mapping for labeled annotations
-                            if class_name and class_id and class_id.isdigit():
-                                class_id_int = int(class_id)
-                                if class_name not in app.config["CLASS_TO_ID"]:
-                                    app.config["CLASS_TO_ID"][class_name] = class_id_int
-                                    if class_id_int >= app.config["NEXT_CLASS_ID"]:
-                                        app.config["NEXT_CLASS_ID"] = class_id_int + 1
-
                             # For unlabeled annotations, assign a temp_id
                             annotation_data = {
                                 "image": parts[0],
@@ -1371,6 +2515,9 @@ if __name__ == "__main__":
 
                             if class_id:
                                 annotation_data["id"] = class_id
+                                # Map the CSV's class to its registered ID and canonical name
+                                if annotation_data["name"]:
+                                    app.config["CLASS_REGISTRY"].canonicalize(annotation_data)
                             else:
                                 # Assign temp_id for unlabeled annotations
                                 annotation_data["temp_id"] = str(len(app.config["LABELS"]) + 1)
@@ -1378,13 +2525,32 @@ if __name__ == "__main__":
                             app.config["LABELS"].append(annotation_data)
             if len(app.config["LABELS"]) > 0:
                 print(f"Loaded {len(app.config['LABELS'])} existing annotations from CSV")
+                # Geometry checks that need no image sizes (negative or degenerate boxes)
+                flags = box_array.validate(box_array.from_labels(app.config["LABELS"]),
+                                           [float('nan')] * len(app.config["LABELS"]),
+                                           [float('nan')] * len(app.config["LABELS"]))
+                invalid = int(((flags & (box_array.NEGATIVE_SIZE | box_array.TOO_SMALL)) != 0).sum())
+                if invalid:
+                    print(f"Warning: {invalid} imported annotations have negative or too-small boxes (see /qa_report)")
         except Exception as e:
             print(f"Error loading existing annotations: {e}")
             # Don't clear LABELS here, keep them empty if loading fails
     print(f"Found {len(folder_sets)} valid folder sets")
-    # For HuggingFace Spaces, use 0.0.0.0 and port 7860
-    # For local development, you can use 127.0.0.1 and port 7620
-    if os.getenv("SPACE_ID"):  # Running on HuggingFace
-        app.run(host="0.0.0.0", port=7860, debug=False)
-    else:  # Running locally
-        app.run(host="127.0.0.1", port=7620, debug=False)
\ No newline at end of file
+    if args.watch:
+        start_dataset_watcher(args.watch_interval)
+    app.config["INTEGRITY_CHECK"] = args.integrity_check
+    app.config["INVALID_SETS"] = None
+    app.config["MISMATCHED_SETS"] = None
+    app.config["INTEGRITY_WORKERS"] = args.integrity_workers
+    app.config["INTEGRITY_CACHE_PATH"] = args.integrity_cache
+    if args.integrity_check != 'none':
+        if use_hf_dataset:
+            print("--integrity-check needs a local --dir dataset; skipped")
+        elif folder_sets:
+            start_integrity_check()
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    configure_app(args)
+    host, port = listen_address(args)
+    app.run(host=host, port=port, debug=False)
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""Async serving mode: the Flask app behind an ASGI server, with non-blocking image I/O.
+
+/image, /prefetch and visit analytics run on one asyncio event loop:
+  - cached and local images are streamed with FileResponse (file reads go
+    through a worker thread, never the loop), as are deep-zoom tiles and
+    WebP/AVIF variants, which Pillow builds in the executor;
+  - cache misses are downloaded from the hub with httpx, coalesced per path and
+    bounded by a semaphore with a wait queue (503 beyond it), so hundreds of
+    slow fetches cost a few sockets and coroutines instead of a thread each;
+  - visits to / and /tagger are geolocated and recorded in a background task
+    after the page is served.
+Every other route is the unchanged Flask app, run on a bounded WSGI thread
+pool, so blocking work there (Pillow thumbnails and sprites, CSV writes) never
+stalls the loop. State is shared with app.py through app.config.
+
+    python asgi_app.py [app.py options] [--wsgi-threads 16] [--prefetch-sets 2]
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import ssl
+import tempfile
+import time
+from urllib.parse import quote
+
+import httpx
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse
+from starlette.routing import Mount, Route
+
+import app as app_module
+import http_client
+from single_flight import Overloaded
+
+flask_app = app_module.app
+
+DOWNLOAD_CHUNK = 1 << 16
+# httpcore scans every pooled connection on each request and release, which gets
+# quadratic with hundreds of them, so downloads are spread over small pools
+CONNECTIONS_PER_POOL = 32
+VISIT_PATHS = ("/", "/tagger")
+
+
+def remove_if_exists(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class AsyncFetcher:
+    """Hub downloads into the content cache, one per path at a time, with a bounded wait queue"""
+
+    def __init__(self, cache, repo_id, max_concurrent=256, max_queue=1024, wait_timeout=30.0):
+        self.cache = cache
+        self.repo_id = repo_id
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.wait_timeout = wait_timeout
+        # Created inside the running loop (asyncio primitives bind to it on Python 3.9)
+        self._slots = asyncio.Semaphore(max_concurrent)
+        pool_size = min(max_concurrent, CONNECTIONS_PER_POOL)
+        context = ssl.create_default_context()  # Loaded once rather than per client
+        self._clients = [
+            httpx.AsyncClient(
+                follow_redirects=True,
+                verify=context,
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+            for _ in range(-(-max_concurrent // pool_size))
+        ]
+        self._next_client = 0
+        self._flights = {}  # {dataset path: asyncio.Task}
+        self.active = 0
+        self.waiting = 0
+        self.stats = {"leaders": 0, "coalesced": 0, "admitted": 0, "shed": 0, "timed_out": 0,
+                      "bytes": 0, "download_seconds": 0.0}
+
+    async def fetch(self, path):
+        """Local cached file for a dataset path, downloading it if needed"""
+        task = self._flights.get(path)
+        if task is None:
+            self.stats["leaders"] += 1
+            # A task of its own, so a client hanging up doesn't cancel the download for everyone else
+            task = self._flights[path] = asyncio.ensure_future(self._download(path))
+            task.add_done_callback(lambda done: self._finished(path, done))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, path, task):
+        if self._flights.get(path) is task:
+            del self._flights[path]
+        if not task.cancelled():
+            task.exception()  # Retrieved here so an unwatched failure isn't logged as lost
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self.stats["shed"] += 1
+                raise Overloaded(f"{self.active} downloads running and {self.waiting} queued")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.stats["timed_out"] += 1
+                raise Overloaded(f"No download slot within {self.wait_timeout:.0f}s")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.active += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    async def _download(self, path):
+        loop = asyncio.get_running_loop()
+        async with self._slot():
+            # Another request may have finished this download while we queued for a slot
+            # (a lookup can flush the cache index, so like every cache call it runs off the loop)
+            cached_path = await loop.run_in_executor(None, self.cache.get, path)
+            if cached_path is not None:
+                return cached_path
+            url = f"{http_client.hf_endpoint()}/datasets/{self.repo_id}/resolve/main/{quote(path)}"
+            client = self._clients[self._next_client]
+            self._next_client = (self._next_client + 1) % len(self._clients)
+            # The etag is on the hub's own response (the LFS redirect), so it is read before following it
+            head = await client.head(url, headers=http_client.hf_headers(), follow_redirects=False)
+            etag = (head.headers.get("x-linked-etag") or head.headers.get("etag") or "").strip('"') or None
+            if etag:
+                # Same content already cached under another path: link it instead of downloading
+                linked_path = await loop.run_in_executor(None, self.cache.link_etag, path, etag)
+                if linked_path is not None:
+                    return linked_path
+            fd, part_path = await loop.run_in_executor(
+                None, lambda: tempfile.mkstemp(dir=self.cache.root, suffix=".part"))
+            start = time.perf_counter()
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    async with client.stream("GET", url, headers=http_client.hf_headers()) as response:
+                        if response.status_code == 404:
+                            raise FileNotFoundError(path)
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK):
+                            await loop.run_in_executor(None, f.write, chunk)
+                            self.stats["bytes"] += len(chunk)
+                # Hashing and the rename into the cache touch the disk, so they run off the loop too
+                return await loop.run_in_executor(None, lambda: self.cache.put(path, part_path, move=True, etag=etag))
+            finally:
+                self.stats["download_seconds"] += time.perf_counter() - start
+                await loop.run_in_executor(None, remove_if_exists, part_path)
+
+    def report(self):
+        return dict(self.stats, active=self.active, waiting=self.waiting, in_flight=len(self._flights),
+                    max_concurrent=self.max_concurrent, max_queue=self.max_queue)
+
+    async def aclose(self):
+        for client in self._clients:
+            await client.aclose()
+
+
+def get_fetcher():
+    """The AsyncFetcher, or None when images come from --dir"""
+    return flask_app.config.get("ASYNC_FETCHER")
+
+
+async def resolve_image(f):
+    """Local file for an image path, or None; same lookup order as app.resolve_image_path"""
+    if flask_app.config.get("USE_HF_DATASET", False):
+        path = app_module.hf_dataset_path(f)
+        cached_path = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: app_module.get_image_cache().get(path))
+        if cached_path is not None:
+            return cached_path
+        try:
+            return await get_fetcher().fetch(path)
+        except Overloaded:
+            raise
+        except Exception as e:
+            print(f"Error downloading file {path}: {e}")
+    return app_module.local_image_path(f)
+
+
+async def image(request):
+    f = request.path_params["f"]
+    try:
+        local_path = await resolve_image(f)
+    except Overloaded as e:
+        print(f"Shedding image request for {f}: {e}")
+        return PlainTextResponse("Too many image downloads in progress, retry shortly", 503, {"Retry-After": "2"})
+    if local_path is None:
+        return PlainTextResponse("Image not found", 404)
+    query = request.query_params
+    loop = asyncio.get_running_loop()
+    if 'tiles' in query or 'tile' in query:
+        # Building a pyramid decodes the whole image with Pillow
+        status, payload = await loop.run_in_executor(None, app_module.lookup_tiles, local_path, query)
+        if status != 200:
+            return PlainTextResponse(payload, status)
+        if isinstance(payload, dict):
+            return JSONResponse(payload)
+        local_path = payload
+    # So is encoding a WebP/AVIF variant on first request
+    path, media_type = await loop.run_in_executor(
+        None, app_module.negotiated_file, local_path, f, request.headers.get('Accept'), query.get('quality'))
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": "no-cache", "Vary": "Accept"})
+
+
+def prefetch_upcoming(sets_ahead):
+    """Start downloads for every view of the next sets_ahead sets; returns the number of images queued"""
+    fetcher = get_fetcher()
+    if fetcher is None or not flask_app.config.get("FOLDER_SETS"):
+        return 0
+    if fetcher.waiting:
+        return 0  # Downloads are already queuing; leave the slots to images being viewed
+    images = app_module.upcoming_images(flask_app.config["IMAGE_SET_INDEX"], sets_ahead, all_views=True)
+    for f in images:
+        schedule(resolve_image(f))
+    return len(images)
+
+
+async def prefetch(request):
+    """Warm the image cache for the sets ahead of the annotator: /prefetch?sets=N"""
+    try:
+        sets_ahead = int(request.query_params.get("sets", flask_app.config["PREFETCH_SETS"]))
+    except ValueError:
+        return JSONResponse({"error": "sets must be an integer"}, 400)
+    return JSONResponse({"queued": prefetch_upcoming(max(sets_ahead, 0))})
+
+
+async def async_stats(request):
+    fetcher = get_fetcher()
+    return JSONResponse({"downloads": fetcher.report() if fetcher else None, "tasks": len(BACKGROUND_TASKS)})
+
+
+BACKGROUND_TASKS = set()
+
+
+def schedule(coroutine):
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.ensure_future(coroutine)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    return task
+
+
+async def country_of(ip):
+    """Async version of app.get_country_from_ip"""
+    try:
+        response = await GEO_CLIENT.get(f'http://ip-api.com/json/{ip}', timeout=2)
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('status') == 'success':
+                return data.get('country', 'Unknown')
+    except Exception as e:
+        print(f"Error getting country for IP {ip}: {e}")
+    return 'Unknown'
+
+
+async def track_visit(request):
+    headers = request.headers
+    if headers.get('X-Forwarded-For'):
+        ip = headers['X-Forwarded-For'].split(',')[0].strip()
+    else:
+        ip = headers.get('X-Real-IP') or (request.client.host if request.client else None) or '127.0.0.1'
+    ua = headers.get('User-Agent', '')
+    ua_hash = hashlib.md5(ua.encode()).hexdigest()[:8]
+    country = await country_of(ip)
+    # The stats file update holds a lock and writes to disk
+    await asyncio.get_running_loop().run_in_executor(
+        None, app_module.record_visit, ip, ua_hash, country, ua or 'Unknown')
+
+
+class PageHooks:
+    """Records visits and prefetches upcoming images after tagger pages, without delaying the response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        if scope["type"] == "http" and scope["method"] == "GET" and scope["path"] in VISIT_PATHS:
+            schedule(track_visit(Request(scope)))
+            if scope["path"] == "/tagger":
+                prefetch_upcoming(flask_app.config["PREFETCH_SETS"])
+
+
+GEO_CLIENT = None
+
+
+@contextlib.asynccontextmanager
+async def lifespan(starlette_app):
+    global GEO_CLIENT
+    GEO_CLIENT = httpx.AsyncClient()
+    config = flask_app.config
+    if config.get("USE_HF_DATASET", False):
+        config["ASYNC_FETCHER"] = AsyncFetcher(
+            app_module.get_image_cache(), config.get("HF_DATASET_NAME", "0001AMA/multimodal_data_annotator_dataset"),
+            config.get("MAX_DOWNLOADS", 8), config.get("DOWNLOAD_QUEUE", 32))
+    try:
+        yield
+    finally:
+        await GEO_CLIENT.aclose()
+        fetcher = config.pop("ASYNC_FETCHER", None)
+        if fetcher is not None:
+            await fetcher.aclose()
+            fetcher.cache.flush()
+
+
+def build_app(wsgi_threads=16):
+    flask_app.config["ASYNC_ANALYTICS"] = True
+    flask_app.config.setdefault("PREFETCH_SETS", 2)
+    routes = [
+        Route('/image/{f:path}', image),
+        Route('/prefetch', prefetch, methods=["GET", "POST"]),
+        Route('/async_stats', async_stats),
+        Mount('/', WSGIMiddleware(flask_app, workers=wsgi_threads))
+    ]
+    return PageHooks(Starlette(routes=routes, lifespan=lifespan))
+
+
+if __name__ == "__main__":
+    parser = app_module.build_parser()
+    parser.description = "Serve the annotator from an asyncio event loop (uvicorn)"
+    parser.add_argument('--wsgi-threads', type=int, default=16, help='threads running the Flask routes')
+    parser.add_argument('--prefetch-sets', type=int, default=2, help='sets ahead whose images are downloaded after each tagger page')
+    parser.set_defaults(max_downloads=256, download_queue=1024)
+    args = parser.parse_args()
+    app_module.configure_app(args)
+    flask_app.config["PREFETCH_SETS"] = args.prefetch_sets
+    host, port = app_module.listen_address(args)
+    uvicorn.run(build_app(args.wsgi_threads), host=host, port=port, log_level="warning")
@@ -0,0 +1,73 @@
+"""Crash-safe file writes: write to a temp file, fsync, then rename into place."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+_BACKUP_LOCK = threading.Lock()
+_LAST_BACKUP = {}  # {backup path: time.time() of the last rotation}
+
+
+def _fsync_directory(directory):
+    """Persist a rename by syncing its directory entry (no-op where unsupported)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding=None):
+    """Open a temp file next to path; on success it is fsynced and renamed over path.
+
+    Readers see either the old file or the complete new file, never a truncated one.
+    If the block raises, the temp file is removed and path is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+        _fsync_directory(directory)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_copy(src, dst):
+    """Copy src to dst atomically"""
+    with open(src, 'rb') as fsrc, atomic_write(dst, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst)
+    shutil.copystat(src, dst)
+
+
+def rotate_backup(src, dst, min_interval):
+    """Copy src to dst at most once every min_interval seconds, returns True if a copy was made"""
+    now = time.time()
+    with _BACKUP_LOCK:
+        last = _LAST_BACKUP.get(dst)
+        if last is None and os.path.exists(dst):
+            # After a restart, fall back to the age of the existing backup
+            last = os.path.getmtime(dst)
+        if last is not None and now - last < min_interval:
+            return False
+        _LAST_BACKUP[dst] = now
+    atomic_copy(src, dst)
+    return True
@@ -0,0 +1,179 @@
+"""NumPy box arrays: conversion, clipping, rounding and validation for many boxes at once.
+
+Boxes are float64 arrays of shape (N, 4) in the out.csv layout
+[centerX, centerY, width, height], in original image pixels.
+"""
+
+import numpy as np
+
+# setupCanvas hides this many rows at the top and bottom of every tr_int_full image
+TR_INT_FULL_CROP = 150
+# The tagger rejects boxes smaller than this (in original image pixels)
+MIN_BOX_SIZE = 10
+
+# Validation flags (bitmask per box)
+NEGATIVE_SIZE = 1
+OUT_OF_BOUNDS = 2
+IN_CROP_BAND = 4
+TOO_SMALL = 8
+UNKNOWN_SIZE = 16
+
+FLAG_NAMES = {
+    NEGATIVE_SIZE: "negative_size",
+    OUT_OF_BOUNDS: "out_of_bounds",
+    IN_CROP_BAND: "in_crop_band",
+    TOO_SMALL: "too_small",
+    UNKNOWN_SIZE: "unknown_image_size"
+}
+
+
+def from_labels(labels):
+    """Return the (N, 4) box array for a list of label dicts"""
+    if not labels:
+        return np.zeros((0, 4), dtype=np.float64)
+    return np.array(
+        [(label["centerX"], label["centerY"], label["width"], label["height"]) for label in labels],
+        dtype=np.float64
+    )
+
+
+def from_corners(x_min, x_max, y_min, y_max):
+    """Build center/size boxes from corner coordinates (scalars or arrays)"""
+    x_min, x_max, y_min, y_max = (np.asarray(v, dtype=np.float64) for v in (x_min, x_max, y_min, y_max))
+    return np.stack([(x_min + x_max) / 2, (y_min + y_max) / 2, x_max - x_min, y_max - y_min], axis=-1)
+
+
+def to_corners(boxes):
+    """Return (N, 4) [xMin, yMin, xMax, yMax]"""
+    boxes = np.asarray(boxes, dtype=np.float64)
+    half = boxes[:, 2:] / 2
+    return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+
+def to_xywh(boxes):
+    """Return (N, 4) [xMin, yMin, width, height] (COCO layout)"""
+    boxes = np.asarray(boxes, dtype=np.float64)
+    return np.concatenate([boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, 2:]], axis=1)
+
+
+def normalize(boxes, image_widths, image_heights):
+    """Divide x/width by the image width and y/height by the image height (YOLO layout)"""
+    scale = np.stack([image_widths, image_heights, image_widths, image_heights], axis=1).astype(np.float64)
+    return np.asarray(boxes, dtype=np.float64) / scale
+
+
+def clip(boxes, image_widths, image_heights):
+    """Clip boxes to their image bounds, keeping the center/size layout"""
+    corners = to_corners(boxes)
+    corners[:, 0] = np.clip(corners[:, 0], 0, image_widths)
+    corners[:, 2] = np.clip(corners[:, 2], 0, image_widths)
+    corners[:, 1] = np.clip(corners[:, 1], 0, image_heights)
+    corners[:, 3] = np.clip(corners[:, 3], 0, image_heights)
+    return from_corners(corners[:, 0], corners[:, 2], corners[:, 1], corners[:, 3])
+
+
+def round_boxes(boxes):
+    """Round to whole pixels exactly like round(float(v)) in the CSV writer (half to even)"""
+    return np.rint(np.asarray(boxes, dtype=np.float64)).astype(np.int64)
+
+
+def csv_rows(labels):
+    """Format labelled annotations as out.csv lines (without the header)"""
+    labelled = [label for label in labels if label.get("id") and label.get("name")]
+    rounded = round_boxes(from_labels(labelled))
+    return [
+        f"{label['image']},{label['id']},{label['name']},{row[0]},{row[1]},{row[2]},{row[3]}"
+        for label, row in zip(labelled, rounded.tolist())
+    ]
+
+
+def validate(boxes, image_widths, image_heights, crop_band_mask=None):
+    """Return a per-box bitmask of validation flags.
+
+    image_widths/image_heights may contain NaN for images whose size is unknown;
+    crop_band_mask marks boxes on tr_int_full views, which hide TR_INT_FULL_CROP
+    rows at the top and bottom.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    image_widths = np.asarray(image_widths, dtype=np.float64)
+    image_heights = np.asarray(image_heights, dtype=np.float64)
+    flags = np.zeros(len(boxes), dtype=np.int64)
+    if len(boxes) == 0:
+        return flags
+
+    corners = to_corners(boxes)
+    flags[(boxes[:, 2] < 0) | (boxes[:, 3] < 0)] |= NEGATIVE_SIZE
+    flags[(np.abs(boxes[:, 2]) < MIN_BOX_SIZE) | (np.abs(boxes[:, 3]) < MIN_BOX_SIZE)] |= TOO_SMALL
+
+    unknown = np.isnan(image_widths) | np.isnan(image_heights)
+    flags[unknown] |= UNKNOWN_SIZE
+    with np.errstate(invalid='ignore'):
+        outside = ((corners[:, 0] < 0) | (corners[:, 1] < 0) |
+                   (corners[:, 2] > image_widths) | (corners[:, 3] > image_heights))
+        flags[outside & ~unknown] |= OUT_OF_BOUNDS
+        if crop_band_mask is not None:
+            in_band = ((corners[:, 1] < TR_INT_FULL_CROP) |
+                       (corners[:, 3] > image_heights - TR_INT_FULL_CROP))
+            flags[np.asarray(crop_band_mask, dtype=bool) & in_band & ~unknown] |= IN_CROP_BAND
+    return flags
+
+
+def flag_names(flag):
+    return [name for bit, name in FLAG_NAMES.items() if flag & bit]
+
+
+def image_size_arrays(labels, sizes):
+    """Return per-box image width/height arrays (NaN where the size is unknown)"""
+    widths = np.full(len(labels), np.nan)
+    heights = np.full(len(labels), np.nan)
+    for i, label in enumerate(labels):
+        size = sizes.get(label["image"])
+        if size is not None:
+            widths[i], heights[i] = size
+    return widths, heights
+
+
+def qa_report(labels, sizes):
+    """Validate every box at once and summarise the problems found"""
+    boxes = from_labels(labels)
+    widths, heights = image_size_arrays(labels, sizes)
+    crop_band_mask = np.array([label["image"].endswith('-tr_int_full.png') for label in labels], dtype=bool)
+    flags = validate(boxes, widths, heights, crop_band_mask)
+
+    counts = {name: int(np.count_nonzero(flags & bit)) for bit, name in FLAG_NAMES.items()}
+    problems = [
+        {"image": labels[i]["image"], "id": labels[i].get("id", ""), "name": labels[i].get("name", ""),
+         "box": boxes[i].tolist(), "flags": flag_names(int(flags[i]))}
+        for i in np.flatnonzero(flags)
+    ]
+    return {
+        "total_boxes": len(labels),
+        "invalid_boxes": len(problems),
+        "counts": counts,
+        "problems": problems
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from exporters import ImageSizeCache, read_annotations
+
+    parser = argparse.ArgumentParser(description="Dataset QA report over all boxes in an annotation CSV")
+    parser.add_argument('--csv', default="out.csv")
+    parser.add_argument('--dir', required=True, help='local images directory (for image sizes)')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    labels = read_annotations(args.csv)
+    cache = ImageSizeCache()
+    sizes = cache.local_sizes(sorted({label["image"] for label in labels}), args.dir)
+    cache.save()
+    report = qa_report(labels, sizes)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['invalid_boxes']} of {report['total_boxes']} boxes have problems")
+        for name, count in report["counts"].items():
+            print(f"  {name}: {count}")
@@ -0,0 +1,152 @@
+"""Persisted class registry: stable class IDs, aliases and name normalization.
+
+The registry is a small JSON file loaded once at startup:
+    {"next_id": 4, "classes": {"cup": {"id": 3, "aliases": ["mug"]}, ...}}
+Every spelling of a class (canonical name or alias, after normalize()) maps to
+one entry in a dict, so resolving a typed or imported name is O(1). IDs are
+never reused or reassigned, so out.csv, exports and the SQLite store agree
+across runs and resets.
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from atomic_io import atomic_write
+
+DEFAULT_REGISTRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "classes.json")
+_SEPARATORS = re.compile(r'[\s_\-,]+')
+
+
+def normalize(name):
+    """Canonical spelling: NFKC, case-folded, runs of spaces/underscores/hyphens/commas collapsed to one space"""
+    name = unicodedata.normalize('NFKC', name or "").casefold()
+    return _SEPARATORS.sub(' ', name).strip()
+
+
+class ClassRegistry:
+    """{class name: ID} with aliases, persisted to a JSON file on every change"""
+
+    def __init__(self, path=DEFAULT_REGISTRY):
+        self.path = path
+        self._lock = threading.Lock()
+        self.classes = {}   # {canonical name: {"id": int, "aliases": [...]}}
+        self.lookup = {}    # {normalized spelling: canonical name}
+        self.by_id = {}     # {id: canonical name}
+        self.next_id = 1
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            for name, entry in data.get("classes", {}).items():
+                self._index(name, int(entry["id"]), entry.get("aliases", []))
+            self.next_id = max(int(data.get("next_id", 1)), max(self.by_id, default=0) + 1)
+
+    def _index(self, name, class_id, aliases=()):
+        self.classes[name] = {"id": class_id, "aliases": list(aliases)}
+        self.by_id[class_id] = name
+        self.lookup[normalize(name)] = name
+        for alias in aliases:
+            self.lookup[normalize(alias)] = name
+
+    def save(self):
+        if not self.path:
+            return
+        with atomic_write(self.path) as f:
+            json.dump({"next_id": self.next_id, "classes": self.classes}, f, indent=2, sort_keys=True)
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __contains__(self, name):
+        return normalize(name) in self.lookup
+
+    def resolve(self, name):
+        """Canonical class name for a spelling or alias, or None"""
+        return self.lookup.get(normalize(name))
+
+    def id_of(self, name):
+        canonical = self.resolve(name)
+        return None if canonical is None else self.classes[canonical]["id"]
+
+    def name_of(self, class_id):
+        return self.by_id.get(int(class_id))
+
+    def get_or_create(self, name, preferred_id=None):
+        """Return (class ID, canonical name), registering a new class if needed.
+
+        preferred_id (e.g. the ID found in an imported CSV) is used for a new
+        class when it is still free; otherwise the next unused ID is assigned.
+        """
+        canonical = self.resolve(name)
+        if canonical is not None:
+            return self.classes[canonical]["id"], canonical
+        with self._lock:
+            canonical = normalize(name)
+            if not canonical:
+                raise ValueError("Class name is empty after normalization")
+            if canonical in self.lookup:
+                canonical = self.lookup[canonical]
+                return self.classes[canonical]["id"], canonical
+            if preferred_id is not None and int(preferred_id) > 0 and int(preferred_id) not in self.by_id:
+                class_id = int(preferred_id)
+            else:
+                class_id = self.next_id
+            self._index(canonical, class_id)
+            self.next_id = max(self.next_id, class_id + 1)
+            self.save()
+            return class_id, canonical
+
+    def add_alias(self, alias, name):
+        """Make alias resolve to the class name (which must exist)"""
+        with self._lock:
+            canonical = self.lookup.get(normalize(name))
+            if canonical is None:
+                raise KeyError(f"Unknown class '{name}'")
+            existing = self.lookup.get(normalize(alias))
+            if existing is not None and existing != canonical:
+                raise ValueError(f"'{alias}' already refers to class '{existing}'")
+            if existing is None:
+                self.classes[canonical]["aliases"].append(alias)
+                self.lookup[normalize(alias)] = canonical
+                self.save()
+
+    def as_map(self):
+        """{canonical name: ID}, the old CLASS_TO_ID shape"""
+        return {name: entry["id"] for name, entry in self.classes.items()}
+
+    def canonicalize(self, label):
+        """Rewrite a labelled dict's id and name to the registry's (registering the class if new)"""
+        if not label.get("name"):
+            return label
+        class_id, canonical = self.get_or_create(label["name"], label.get("id") or None)
+        label["id"] = str(class_id)
+        label["name"] = canonical
+        return label
+
+
+if __name__ == "__main__":
+    from exporters import read_annotations
+
+    parser = argparse.ArgumentParser(description="Inspect and edit the class registry")
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='print every class with its ID and aliases')
+    alias_parser = subparsers.add_parser('alias', help='add an alias for an existing class')
+    alias_parser.add_argument('alias')
+    alias_parser.add_argument('name')
+    import_parser = subparsers.add_parser('import', help='register the classes found in an out.csv file')
+    import_parser.add_argument('csv')
+    args = parser.parse_args()
+
+    registry = ClassRegistry(args.registry)
+    if args.command == 'alias':
+        registry.add_alias(args.alias, args.name)
+    elif args.command == 'import':
+        for annotation in read_annotations(args.csv):
+            registry.get_or_create(annotation["name"], annotation["id"])
+    for name, entry in sorted(registry.classes.items(), key=lambda item: item[1]["id"]):
+        aliases = f" (aliases: {', '.join(entry['aliases'])})" if entry["aliases"] else ""
+        print(f"{entry['id']:>4}  {name}{aliases}")
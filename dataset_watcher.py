@@ -0,0 +1,329 @@
+"""Notice dataset changes while the server runs.
+
+DirectoryWatcher reports which directories under the dataset root changed:
+through inotify (Linux, called via ctypes) when it is available, otherwise by
+polling directory mtimes, which change whenever an entry is added, removed or
+renamed. Changes are reported once a directory has been quiet for `settle`
+seconds, so a capture whose three views are still being written is picked up
+as one complete set. RevisionWatcher polls a revision id (the hub dataset's
+commit sha) and reports when it moves. Either calls back from its own daemon
+thread; rescanning and applying the change is left to the callback.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import os
+import select
+import struct
+import threading
+import time
+
+DEFAULT_INTERVAL = 2.0            # seconds between directory polls / inotify wake-ups
+DEFAULT_SETTLE = 1.0              # seconds a changed directory must stay quiet before it is reported
+DEFAULT_REVISION_INTERVAL = 60.0  # seconds between hub revision checks
+# Filesystem timestamps are coarser than time.time_ns() (jiffies, or 2s on FAT): compare with this much slack
+MTIME_SLACK_NS = 2 * 10 ** 9
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+
+def directories(root):
+    """Every directory under root, root included"""
+    return [dirpath for dirpath, _, _ in os.walk(root)]
+
+
+def changed_since(root, since_ns):
+    """Directories under root modified at or after since_ns (time.time_ns()), give or take MTIME_SLACK_NS"""
+    changed = set()
+    for dirpath in directories(root):
+        try:
+            if os.stat(dirpath).st_mtime_ns >= since_ns - MTIME_SLACK_NS:
+                changed.add(dirpath)
+        except OSError:
+            pass
+    return changed
+
+
+def fingerprint(root):
+    """Digest of every directory's path and mtime under root; it moves whenever an entry is added, removed or renamed.
+
+    Root's own mtime is left out: top-level files belong to no folder, and
+    out.csv or the manifest are often written there.
+    """
+    digest = hashlib.sha1()
+    for dirpath in sorted(directories(root)):
+        if dirpath == root:
+            continue  # New or removed folders still change the digest through their paths
+        try:
+            mtime_ns = os.stat(dirpath).st_mtime_ns
+        except OSError:
+            continue
+        digest.update(f"{os.path.relpath(dirpath, root)}\0{mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+
+class Inotify:
+    """Recursive inotify watch on a directory tree; raises OSError where inotify is unavailable"""
+
+    name = "inotify"
+
+    def __init__(self, root):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, "libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.root = root
+        self.paths = {}  # {watch descriptor: directory}
+        try:
+            self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def add(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code in (errno.ENOENT, errno.ENOTDIR):
+                return  # Gone again before it could be watched
+            # ENOSPC: fs.inotify.max_user_watches is exhausted
+            raise OSError(code, f"inotify_add_watch({path}) failed: {os.strerror(code)}")
+        self.paths[wd] = path
+
+    def add_tree(self, path):
+        found = directories(path)
+        for dirpath in found:
+            self.add(dirpath)
+        return found
+
+    def changes(self, timeout):
+        """Directories with entries created, written, moved or deleted, waiting up to timeout seconds"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped: treat every directory as changed
+                    changed.update(self.paths.values())
+                    changed.update(self.add_tree(self.root))
+                    continue
+                path = self.paths.get(wd)
+                if path is None:
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    changed.add(path)
+                    if mask & IN_IGNORED:
+                        del self.paths[wd]
+                    continue
+                changed.add(path)
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    # A new or moved-in directory may already hold files (and subdirectories)
+                    changed.update(self.add_tree(os.path.join(path, os.fsdecode(name))))
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Poller:
+    """Directory mtime polling, for platforms or filesystems without inotify"""
+
+    name = "poll"
+    # A directory read this soon after its mtime may change again within the same timestamp tick;
+    # it is rescanned on the next poll too (the "racy git" problem)
+    RACY_NS = 100 * 10 ** 6
+
+    def __init__(self, root):
+        self.root = root
+        self.mtimes = {}
+        self.racy = set()
+        self._scan(root)
+
+    def _record(self, dirpath, mtime):
+        self.mtimes[dirpath] = mtime
+        if time.time_ns() - mtime < self.RACY_NS:
+            self.racy.add(dirpath)
+
+    def _scan(self, path):
+        found = []
+        for dirpath in directories(path):
+            try:
+                self._record(dirpath, os.stat(dirpath).st_mtime_ns)
+                found.append(dirpath)
+            except OSError:
+                pass
+        return found
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        changed, racy, self.racy = set(), self.racy, set()
+        for dirpath, mtime in list(self.mtimes.items()):
+            try:
+                current = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                del self.mtimes[dirpath]
+                changed.add(dirpath)
+                continue
+            if current != mtime or dirpath in racy:
+                self._record(dirpath, current)
+                changed.add(dirpath)
+                # Subdirectories created since the last poll
+                try:
+                    entries = list(os.scandir(dirpath))
+                except OSError:
+                    continue
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and entry.path not in self.mtimes:
+                        changed.update(self._scan(entry.path))
+        return changed
+
+    def close(self):
+        pass
+
+
+class DirectoryWatcher:
+    """Call on_change(sorted directories, observed_ns) from a background thread as directories under root change.
+
+    Every change made before time.time_ns() == observed_ns is among the
+    reported directories; since_ns catches up with changes made before the
+    watcher started (directories modified since then are reported first).
+    """
+
+    def __init__(self, root, on_change, interval=DEFAULT_INTERVAL, settle=DEFAULT_SETTLE, since_ns=None,
+                 backend="auto"):
+        self.root = root.rstrip("/") or "/"
+        self.on_change = on_change
+        self.interval = interval
+        self.settle = settle
+        self.backend = None
+        if backend in ("auto", "inotify"):
+            try:
+                self.backend = Inotify(self.root)
+            except OSError as e:
+                if backend == "inotify":
+                    raise
+                print(f"inotify unavailable ({e}); polling {self.root} every {interval}s")
+        if self.backend is None:
+            self.backend = Poller(self.root)
+        # Directories touched while no watcher ran (since the manifest was scanned)
+        self.pending = changed_since(self.root, since_ns) if since_ns is not None else set()
+        self.last_change = 0.0
+        self.stats = {"backend": self.backend.name, "events": 0, "updates": 0, "errors": 0, "last_update": None}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="dataset-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def poll(self, timeout):
+        """Collect changes for up to timeout seconds and report the directories that have settled"""
+        started_ns = time.time_ns()
+        changed = self.backend.changes(timeout)
+        if changed:
+            self.stats["events"] += len(changed)
+            self.pending.update(changed)
+            self.last_change = time.monotonic()
+        if self.pending and time.monotonic() - self.last_change >= self.settle:
+            ready, self.pending = sorted(self.pending), set()
+            try:
+                # Every change made before this poll started is among the reported directories
+                self.on_change(ready, started_ns)
+                self.stats["updates"] += 1
+                self.stats["last_update"] = time.time()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error applying dataset changes in {self.root}: {e}")
+                import traceback
+                traceback.print_exc()
+
+    def run(self):
+        while not self._stop.is_set():
+            # Wake up early while changes are settling, so they are applied within ~settle seconds
+            self.poll(min(self.interval, self.settle) if self.pending else self.interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.backend.close()
+
+
+class RevisionWatcher:
+    """Call on_change(revision) from a background thread whenever get_revision() returns a new value"""
+
+    def __init__(self, get_revision, on_change, revision=None, interval=DEFAULT_REVISION_INTERVAL):
+        self.get_revision = get_revision
+        self.on_change = on_change
+        self.revision = revision
+        self.interval = interval
+        self.stats = {"backend": "revision", "checks": 0, "updates": 0, "errors": 0, "last_update": None,
+                      "revision": revision}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="dataset-revision-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def check(self):
+        """Compare the current revision with the last applied one; True when an update was applied"""
+        self.stats["checks"] += 1
+        try:
+            revision = self.get_revision()
+            if revision == self.revision:
+                return False
+            self.on_change(revision)
+        except Exception as e:
+            # Retried on the next check
+            self.stats["errors"] += 1
+            print(f"Error checking the dataset revision: {e}")
+            return False
+        self.revision = self.stats["revision"] = revision
+        self.stats["updates"] += 1
+        self.stats["last_update"] = time.time()
+        return True
+
+    def run(self):
+        self.check()
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
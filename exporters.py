@@ -0,0 +1,345 @@
+"""Export out.csv annotations to COCO JSON, YOLO txt and Pascal VOC XML.
+
+Image sizes are read from the PNG IHDR chunk only (the first 24 bytes), in a
+process pool for local files, and cached in a JSON file keyed by size/mtime
+(local files) or by the commit they were read at (hub files).
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from xml.etree import ElementTree
+
+import box_array
+from atomic_io import atomic_write
+from class_registry import ClassRegistry
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+DEFAULT_SIZE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_sizes.json")
+
+
+def parse_png_header(header):
+    """Return (width, height) from the first 24 bytes of a PNG, or None if it is not a PNG"""
+    if len(header) < 24 or header[:8] != PNG_SIGNATURE or header[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', header[16:24])
+
+
+def read_png_size(path):
+    """Read image dimensions from the file header without decoding pixels"""
+    with open(path, 'rb') as f:
+        size = parse_png_header(f.read(24))
+    if size is None:
+        # Not a PNG: Pillow's open() is lazy and only parses the header too
+        from PIL import Image
+        with Image.open(path) as img:
+            size = img.size
+    return size
+
+
+def _stat_and_size(path):
+    """Worker: return (path, file size, mtime_ns, width, height) or (path, None...) on error"""
+    try:
+        st = os.stat(path)
+        width, height = read_png_size(path)
+        return path, st.st_size, st.st_mtime_ns, width, height
+    except Exception as e:
+        print(f"Error reading image size for {path}: {e}")
+        return path, None, None, None, None
+
+
+def read_remote_png_size(url, headers=None):
+    """Fetch only the PNG header of a remote file with an HTTP range request"""
+    import http_client
+    request_headers = dict(headers or {})
+    request_headers['Range'] = 'bytes=0-23'
+    response = http_client.get(url, headers=request_headers, timeout=10)
+    response.raise_for_status()
+    return parse_png_header(response.content[:24])
+
+
+class ImageSizeCache:
+    """Persistent {image path: (width, height)} cache, invalidated by file size and mtime"""
+
+    def __init__(self, cache_path=DEFAULT_SIZE_CACHE):
+        self.cache_path = cache_path
+        self.entries = {}  # {image: [file size, mtime_ns, width, height]}, hub files: [None, None, width, height, commit]
+        self.dirty = False
+        self._lock = threading.Lock()  # Sizes may be read in a background thread while requests look them up
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"Error loading image size cache {cache_path}: {e}")
+
+    def save(self):
+        with self._lock:
+            if not (self.cache_path and self.dirty):
+                return
+            entries = dict(self.entries)
+            self.dirty = False
+        with atomic_write(self.cache_path) as f:
+            json.dump(entries, f)
+
+    def _store(self, image, entry):
+        with self._lock:
+            self.entries[image] = entry
+            self.dirty = True
+
+    def cached_sizes(self, images, images_dir=None, revision=None):
+        """({image: (width, height)}, [images not cached]) without reading any image.
+
+        Local entries (images_dir given) only count while the file keeps its size
+        and mtime; hub entries only for the commit they were read at (revision).
+        """
+        sizes = {}
+        misses = []
+        for image in images:
+            entry = self.entries.get(image)
+            if images_dir is None:
+                if entry is not None and (revision is None or entry[4:5] != [revision]):
+                    entry = None
+            elif entry is not None:
+                try:
+                    st = os.stat(os.path.join(images_dir, image))
+                    if entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+                        entry = None
+                except OSError:
+                    entry = None
+            if entry is not None:
+                sizes[image] = (entry[2], entry[3])
+            else:
+                misses.append(image)
+        return sizes, misses
+
+    def local_sizes(self, images, images_dir, workers=None):
+        """Return {image: (width, height)} for local images, reading only uncached headers"""
+        sizes, misses = self.cached_sizes(images, images_dir)
+
+        if misses:
+            print(f"Reading PNG headers for {len(misses)} images ({len(sizes)} cached)")
+            paths = [os.path.join(images_dir, image) for image in misses]
+            chunksize = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 8))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for image, result in zip(misses, pool.map(_stat_and_size, paths, chunksize=chunksize)):
+                    _, file_size, mtime_ns, width, height = result
+                    if width is None:
+                        continue
+                    sizes[image] = (width, height)
+                    self._store(image, [file_size, mtime_ns, width, height])
+        return sizes
+
+    def remote_sizes(self, images, url_for_image, revision, headers=None, workers=16):
+        """Return {image: (width, height)} for hub files at commit revision, using range requests.
+
+        url_for_image must resolve the file at that same commit: a path can be
+        rewritten by a later commit, so sizes are only reused for their commit.
+        """
+        sizes, misses = self.cached_sizes(images, revision=revision)
+
+        def fetch(image):
+            try:
+                return image, read_remote_png_size(url_for_image(image), headers)
+            except Exception as e:
+                print(f"Error reading remote image size for {image}: {e}")
+                return image, None
+
+        if misses:
+            print(f"Fetching PNG headers for {len(misses)} hub images ({len(sizes)} cached)")
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for image, size in pool.map(fetch, misses):
+                    if size is None:
+                        continue
+                    sizes[image] = size
+                    self._store(image, [None, None, size[0], size[1], revision])
+        return sizes
+
+
+def read_annotations(csv_path, registry=None):
+    """Read labelled rows from an out.csv file, mapped to registry IDs when a ClassRegistry is given"""
+    annotations = []
+    with open(csv_path, 'r') as f:
+        for line in f.readlines()[1:]:  # Skip header
+            parts = line.strip().split(',')
+            if len(parts) < 7 or not parts[1] or not parts[2]:
+                continue
+            annotations.append({
+                "image": parts[0],
+                "id": parts[1],
+                "name": parts[2],
+                "centerX": float(parts[3]),
+                "centerY": float(parts[4]),
+                "width": float(parts[5]),
+                "height": float(parts[6])
+            })
+            if registry is not None:
+                registry.canonicalize(annotations[-1])
+    return annotations
+
+
+def group_by_image(annotations):
+    grouped = {}
+    for annotation in annotations:
+        grouped.setdefault(annotation["image"], []).append(annotation)
+    return grouped
+
+
+def class_list(annotations):
+    """Return [(class ID, name)] sorted by ID; the first name seen for an ID wins"""
+    classes = {}
+    for annotation in annotations:
+        class_id = int(annotation["id"])
+        if class_id not in classes:
+            classes[class_id] = annotation["name"]
+    return sorted(classes.items())
+
+
+def _sized_boxes(annotations, sizes):
+    """Drop boxes on images of unknown size; return (annotations, boxes, widths, heights) as arrays"""
+    kept = [annotation for annotation in annotations if annotation["image"] in sizes]
+    widths, heights = box_array.image_size_arrays(kept, sizes)
+    return kept, box_array.from_labels(kept), widths, heights
+
+
+def write_coco(annotations, sizes, out_path):
+    """Write a single COCO detection JSON file"""
+    annotations, boxes, _, _ = _sized_boxes(annotations, sizes)
+    xywh = box_array.to_xywh(boxes).tolist()
+    areas = (boxes[:, 2] * boxes[:, 3]).tolist()
+    coco = {
+        "images": [],
+        "annotations": [],
+        "categories": [{"id": class_id, "name": name} for class_id, name in class_list(annotations)]
+    }
+    image_ids = {}
+    for i, annotation in enumerate(annotations):
+        image = annotation["image"]
+        if image not in image_ids:
+            image_ids[image] = len(image_ids) + 1
+            width, height = sizes[image]
+            coco["images"].append({"id": image_ids[image], "file_name": image, "width": width, "height": height})
+        coco["annotations"].append({
+            "id": i + 1,
+            "image_id": image_ids[image],
+            "category_id": int(annotation["id"]),
+            "bbox": xywh[i],
+            "area": areas[i],
+            "iscrowd": 0
+        })
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with atomic_write(out_path) as f:
+        json.dump(coco, f)
+    return len(coco["annotations"])
+
+
+def write_yolo(annotations, sizes, out_dir):
+    """Write one YOLO txt per image (class index, normalized cx cy w h) plus classes.txt"""
+    annotations, boxes, widths, heights = _sized_boxes(annotations, sizes)
+    normalized = box_array.normalize(boxes, widths, heights).tolist()
+    classes = class_list(annotations)
+    class_index = {class_id: index for index, (class_id, _) in enumerate(classes)}
+    os.makedirs(out_dir, exist_ok=True)
+    with atomic_write(os.path.join(out_dir, "classes.txt")) as f:
+        for _, name in classes:
+            f.write(name + "\n")
+
+    rows_by_image = {}
+    for annotation, row in zip(annotations, normalized):
+        rows_by_image.setdefault(annotation["image"], []).append(
+            "%d %.6f %.6f %.6f %.6f\n" % ((class_index[int(annotation["id"])],) + tuple(row))
+        )
+    for image, rows in rows_by_image.items():
+        txt_path = os.path.join(out_dir, os.path.splitext(image)[0] + ".txt")
+        os.makedirs(os.path.dirname(txt_path), exist_ok=True)
+        with atomic_write(txt_path) as f:
+            f.writelines(rows)
+    return len(annotations)
+
+
+def write_voc(annotations, sizes, out_dir):
+    """Write one Pascal VOC XML file per image"""
+    annotations, boxes, _, _ = _sized_boxes(annotations, sizes)
+    corners = box_array.round_boxes(box_array.to_corners(boxes)).tolist()
+    grouped = {}
+    for annotation, corner in zip(annotations, corners):
+        grouped.setdefault(annotation["image"], []).append((annotation, corner))
+
+    for image, boxes_on_image in grouped.items():
+        width, height = sizes[image]
+        root = ElementTree.Element("annotation")
+        ElementTree.SubElement(root, "folder").text = os.path.dirname(image)
+        ElementTree.SubElement(root, "filename").text = os.path.basename(image)
+        size = ElementTree.SubElement(root, "size")
+        ElementTree.SubElement(size, "width").text = str(width)
+        ElementTree.SubElement(size, "height").text = str(height)
+        ElementTree.SubElement(size, "depth").text = "3"
+        for annotation, (x_min, y_min, x_max, y_max) in boxes_on_image:
+            obj = ElementTree.SubElement(root, "object")
+            ElementTree.SubElement(obj, "name").text = annotation["name"]
+            ElementTree.SubElement(obj, "difficult").text = "0"
+            bndbox = ElementTree.SubElement(obj, "bndbox")
+            ElementTree.SubElement(bndbox, "xmin").text = str(x_min)
+            ElementTree.SubElement(bndbox, "ymin").text = str(y_min)
+            ElementTree.SubElement(bndbox, "xmax").text = str(x_max)
+            ElementTree.SubElement(bndbox, "ymax").text = str(y_max)
+        xml_path = os.path.join(out_dir, os.path.splitext(image)[0] + ".xml")
+        os.makedirs(os.path.dirname(xml_path), exist_ok=True)
+        with atomic_write(xml_path, 'wb') as f:
+            ElementTree.ElementTree(root).write(f, encoding="utf-8", xml_declaration=True)
+    return len(annotations)
+
+
+WRITERS = {
+    "coco": write_coco,
+    "yolo": write_yolo,
+    "voc": write_voc
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export out.csv to COCO, YOLO or Pascal VOC")
+    parser.add_argument('--csv', default="out.csv", help='annotation CSV to export')
+    parser.add_argument('--format', choices=sorted(WRITERS), required=True)
+    parser.add_argument('--out', required=True, help='output JSON file (coco) or directory (yolo, voc)')
+    parser.add_argument('--dir', default=None, help='local images directory')
+    parser.add_argument('--hf-dataset', default=None, help='read image headers from this HF dataset instead of --dir')
+    parser.add_argument('--workers', type=int, default=None, help='processes used to read image headers')
+    parser.add_argument('--size-cache', default=DEFAULT_SIZE_CACHE, help='image size cache file')
+    parser.add_argument('--classes', default=None, help='class registry JSON; class IDs are taken from it')
+    args = parser.parse_args()
+
+    if not args.dir and not args.hf_dataset:
+        print("Either --dir or --hf-dataset is required to read image sizes")
+        sys.exit(1)
+
+    annotations = read_annotations(args.csv, ClassRegistry(args.classes) if args.classes else None)
+    images = sorted({annotation["image"] for annotation in annotations})
+    print(f"Exporting {len(annotations)} annotations on {len(images)} images to {args.format}")
+
+    cache = ImageSizeCache(args.size_cache)
+    if args.dir:
+        sizes = cache.local_sizes(images, args.dir, workers=args.workers)
+    else:
+        import http_client
+        from huggingface_hub import HfApi
+        endpoint = http_client.hf_endpoint()
+        headers = http_client.hf_headers()
+        revision = HfApi(endpoint=endpoint).dataset_info(args.hf_dataset, token=http_client.hf_token()).sha
+        sizes = cache.remote_sizes(
+            images,
+            lambda image: f"{endpoint}/datasets/{args.hf_dataset}/resolve/{revision}/{image}",
+            revision,
+            headers=headers
+        )
+    cache.save()
+
+    missing = len(images) - len(sizes)
+    if missing:
+        print(f"Warning: skipping {missing} images whose size could not be read")
+    count = WRITERS[args.format](annotations, sizes, args.out)
+    print(f"Wrote {count} boxes to {args.out}")
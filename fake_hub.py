@@ -0,0 +1,407 @@
+"""Local stand-in for the parts of the HuggingFace Hub this app uses.
+
+Serves one dataset repo, either from a directory tree or from synthetic image
+sets, under any repo ID:
+    GET      /api/datasets/<repo>/tree/<rev>[/<path>]   list_repo_files / list_repo_tree (Link-header pagination)
+    GET      /api/datasets/<repo>[/revision/<rev>]      repo info with siblings and sha (changed by set_files())
+    HEAD/GET /datasets/<repo>/resolve/<rev>/<path>     hf_hub_download and Range requests (206)
+    GET      /api/spaces/<space>/metrics               all-time visit count
+    GET      /_fake_hub/stats                          request, byte and injected-failure counters
+Resolves can be slowed down (latency before the first byte, bandwidth cap per
+response) and made to fail (HTTP status, dropped connection or truncated body)
+with a seeded random generator, so a run is reproducible.
+
+    python fake_hub.py --root ./dataset --port 8765 --latency 0.2 --fail-rate 0.05
+    python app.py --hf-endpoint http://127.0.0.1:8765
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageOps
+
+from dataset_schema import DEFAULT_SCHEMA
+
+VIEW_SUFFIXES = tuple(DEFAULT_SCHEMA.suffixes.values())
+COMMIT = "0" * 40
+DEFAULT_PAGE_SIZE = 1000
+FAIL_MODES = ("500", "503", "429", "reset", "truncate")
+THROTTLE_CHUNK = 16 * 1024
+SCENE_SIZES = {"sr_int_full.png": (640, 480), "-tr_line.png": (1600, 600), "-tr_int_full.png": (1600, 900)}
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def noise_png(seed, size):
+    """A valid RGB PNG of roughly size bytes, filled with pixels from a seeded generator (so it barely compresses)"""
+    side = max(int((size / 3) ** 0.5), 1)
+    pixels = random.Random(seed).getrandbits(8 * side * side * 3).to_bytes(side * side * 3, "little")
+    raw = b"".join(b"\x00" + pixels[row * side * 3:(row + 1) * side * 3] for row in range(side))
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0))
+            + _png_chunk(b"IDAT", zlib.compress(raw, 1))
+            + _png_chunk(b"IEND", b""))
+
+
+def scene_png(seed, suffix):
+    """A PNG that compresses like its view: a blurred scene with sensor noise
+    (sr_int_full), line plots on white (tr_line) or a smooth colour-mapped
+    intensity map (tr_int_full); sizes are fixed per view (SCENE_SIZES)"""
+    rng = random.Random(seed)
+    width, height = SCENE_SIZES[suffix]
+    if suffix == "-tr_line.png":
+        img = Image.new('RGB', (width, height), 'white')
+        draw = ImageDraw.Draw(img)
+        draw.line([(40, 20), (40, height - 40), (width - 20, height - 40)], fill='black', width=2)
+        for _ in range(3):
+            y, points = height / 2, []
+            for x in range(42, width - 20, 4):
+                y = min(max(y + rng.gauss(0, 6), 20), height - 42)
+                points.append((x, y))
+            draw.line(points, fill=tuple(rng.randrange(200) for _ in range(3)), width=2)
+    elif suffix == "-tr_int_full.png":
+        coarse = Image.frombytes('L', (64, 36), bytes(rng.randrange(256) for _ in range(64 * 36)))
+        img = ImageOps.colorize(coarse.resize((width, height), Image.BICUBIC), black='#000040', mid='#c02020', white='#ffff60')
+    else:
+        img = Image.frombytes('RGB', (4, 3), bytes(rng.randrange(256) for _ in range(4 * 3 * 3))).resize((width, height), Image.BICUBIC)
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(width), rng.randrange(height)
+            box = (x, y, x + rng.randrange(20, 200), y + rng.randrange(20, 200))
+            color = tuple(rng.randrange(256) for _ in range(3))
+            (draw.ellipse if rng.random() < 0.5 else draw.rectangle)(box, fill=color)
+        img = img.filter(ImageFilter.GaussianBlur(2))
+        noise = Image.frombytes('L', (width, height), rng.getrandbits(8 * width * height).to_bytes(width * height, "little"))
+        img = ImageChops.add(img, Image.merge('RGB', [noise.point(lambda v: v // 16)] * 3))
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def synthetic_files(sets, size=64 * 1024, folders=5, content="noise"):
+    """{dataset path: PNG bytes} for sets image sets (three views each) spread over a few folders.
+
+    content "noise" gives incompressible files of about size bytes (transfer
+    benchmarks); "scene" gives view-like images (encoding benchmarks).
+    """
+    files = {}
+    for n in range(sets):
+        folder = f"folder{n % folders}"
+        for suffix in VIEW_SUFFIXES:
+            # The file ID is everything before the first '-'
+            name = f"{folder}/set{n:05d}-{suffix.lstrip('-')}"
+            files[name] = scene_png(name, suffix) if content == "scene" else noise_png(name, size)
+    return files
+
+
+def scan_directory(root):
+    """{dataset path: absolute file path} for every file under root (hidden files skipped)"""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for filename in sorted(filenames):
+            if not filename.startswith('.'):
+                full_path = os.path.join(dirpath, filename)
+                files[os.path.relpath(full_path, root).replace(os.sep, '/')] = full_path
+    return files
+
+
+class FakeHub(ThreadingHTTPServer):
+    """Threaded HTTP server answering hub API calls for one dataset.
+
+    files maps dataset paths to bytes or to local file paths. latency is
+    seconds slept before each resolve answers, bandwidth caps each resolve
+    body in bytes per second (0 = unlimited) and fail_rate is the fraction of
+    resolves answered with fail_mode instead.
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024  # The default listen backlog of 5 would stall bursts of connects
+
+    def __init__(self, files, address=("127.0.0.1", 0), latency=0.0, bandwidth=0, fail_rate=0.0,
+                 fail_mode="503", page_size=DEFAULT_PAGE_SIZE, visits=1000, seed=0):
+        if fail_mode not in FAIL_MODES:
+            raise ValueError(f"fail_mode must be one of {', '.join(FAIL_MODES)}")
+        self.files = files
+        self.paths = sorted(files)
+        self.commit = COMMIT
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.fail_mode = fail_mode
+        self.page_size = page_size
+        self.visits = visits
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._oids = {}
+        self.reset_stats()
+        super().__init__(address, _Handler)
+
+    def set_files(self, files):
+        """Replace the repo contents as a new commit (a new sha for revision checks)"""
+        with self._lock:
+            self.files = files
+            self.paths = sorted(files)
+            self._oids = {}
+            self.commit = hashlib.sha1(f"{self.commit}{self.paths}".encode()).hexdigest()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "listings": 0, "resolves": 0, "metrics": 0, "bytes_sent": 0,
+                          "failures_injected": 0, "in_flight": 0, "peak_in_flight": 0}
+            self.resolves_by_path = {}
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def data(self, path):
+        source = self.files[path]
+        if isinstance(source, bytes):
+            return source
+        with open(source, 'rb') as f:
+            return f.read()
+
+    def size(self, path):
+        source = self.files[path]
+        return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+    def oid(self, path):
+        with self._lock:
+            oid = self._oids.get(path)
+        if oid is None:
+            oid = hashlib.sha1(self.data(path)).hexdigest()
+            with self._lock:
+                self._oids[path] = oid
+        return oid
+
+    def should_fail(self):
+        with self._lock:
+            return self.fail_rate > 0 and self._random.random() < self.fail_rate
+
+    def tree(self, prefix, recursive):
+        """Tree entries under prefix, directories included, in path order"""
+        prefix = prefix.strip('/')
+        base = prefix + '/' if prefix else ''
+        entries, directories = [], set()
+        for path in self.paths:
+            if not path.startswith(base):
+                continue
+            rest = path[len(base):].split('/')
+            for depth in range(1, len(rest)):
+                if depth > 1 and not recursive:
+                    break
+                directories.add(base + '/'.join(rest[:depth]))
+            if recursive or len(rest) == 1:
+                entries.append({"type": "file", "path": path, "size": self.size(path), "oid": self.oid(path)})
+        entries.extend({"type": "directory", "path": d, "oid": hashlib.sha1(d.encode()).hexdigest()}
+                       for d in directories)
+        return sorted(entries, key=lambda entry: entry["path"])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeHub/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body, headers=None, head=False):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(payload)
+
+    def _send_error(self, status, message, error_code=None, head=False):
+        payload = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if error_code:
+            self.send_header("X-Error-Code", error_code)
+        if status in (429, 503):
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(payload)
+
+    def _handle(self, head):
+        hub = self.server
+        hub.count("requests")
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        query = parse_qs(url.query)
+
+        if path == "/_fake_hub/stats":
+            with hub._lock:
+                stats = dict(hub.stats, files=len(hub.paths))
+            return self._send_json(stats, head=head)
+        metrics = re.match(r"^/api/spaces/(.+)/metrics$", path)
+        if metrics:
+            hub.count("metrics")
+            return self._send_json({"all_time_visits": hub.visits}, head=head)
+        tree = re.match(r"^/api/datasets/([^/]+/[^/]+)/tree/([^/]+)(?:/(.*))?$", path)
+        if tree:
+            return self._tree(tree.group(1), tree.group(2), tree.group(3) or "", query, head)
+        info = re.match(r"^/api/datasets/([^/]+/[^/]+)(?:/revision/([^/]+))?$", path)
+        if info:
+            hub.count("listings")
+            return self._send_json({"id": info.group(1), "sha": hub.commit, "private": False,
+                                    "siblings": [{"rfilename": p} for p in hub.paths]}, head=head)
+        resolve = re.match(r"^/datasets/([^/]+/[^/]+)/resolve/([^/]+)/(.+)$", path)
+        if resolve:
+            return self._resolve(resolve.group(3), head)
+        self._send_error(404, f"Unknown endpoint {path}", head=head)
+
+    def _tree(self, repo_id, revision, prefix, query, head):
+        hub = self.server
+        hub.count("listings")
+        recursive = query.get("recursive", ["false"])[0].lower() == "true"
+        entries = hub.tree(prefix, recursive)
+        start = int(query.get("cursor", ["0"])[0] or 0)
+        page = entries[start:start + hub.page_size]
+        headers = {}
+        if start + hub.page_size < len(entries):
+            next_url = (f"{hub.url}/api/datasets/{repo_id}/tree/{revision}"
+                        f"{'/' + quote(prefix) if prefix else ''}"
+                        f"?recursive={str(recursive).lower()}&cursor={start + hub.page_size}")
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        self._send_json(page, headers, head)
+
+    def _resolve(self, path, head):
+        hub = self.server
+        if path not in hub.files:
+            return self._send_error(404, f"Entry not found: {path}", "EntryNotFound", head)
+        with hub._lock:
+            hub.stats["resolves"] += 1
+            hub.stats["in_flight"] += 1
+            hub.stats["peak_in_flight"] = max(hub.stats["peak_in_flight"], hub.stats["in_flight"])
+            hub.resolves_by_path[path] = hub.resolves_by_path.get(path, 0) + 1
+        try:
+            if hub.latency:
+                time.sleep(hub.latency)
+            failure = hub.fail_mode if hub.should_fail() else None
+            if failure:
+                hub.count("failures_injected")
+            if failure == "reset":
+                self.close_connection = True
+                self.connection.close()
+                return
+            if failure in ("500", "503", "429"):
+                return self._send_error(int(failure), "Injected failure", head=head)
+
+            data = hub.data(path)
+            status, body, headers = 200, data, {}
+            byte_range = re.match(r"^bytes=(\d*)-(\d*)$", self.headers.get("Range", ""))
+            if byte_range and (byte_range.group(1) or byte_range.group(2)):
+                if byte_range.group(1):
+                    first = int(byte_range.group(1))
+                    last = min(int(byte_range.group(2)) if byte_range.group(2) else len(data) - 1, len(data) - 1)
+                else:
+                    first, last = max(len(data) - int(byte_range.group(2)), 0), len(data) - 1
+                if first >= len(data):
+                    return self._send_error(416, "Range not satisfiable", head=head)
+                status, body = 206, data[first:last + 1]
+                headers["Content-Range"] = f"bytes {first}-{last}/{len(data)}"
+            self.send_response(status)
+            self.send_header("Content-Type", "image/png" if path.endswith(".png") else "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", f'"{hub.oid(path)}"')
+            self.send_header("X-Repo-Commit", hub.commit)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            if head:
+                return
+            if failure == "truncate":
+                body = body[:len(body) // 2]
+                self.close_connection = True
+            self._write_throttled(body)
+        finally:
+            hub.count("in_flight", -1)
+
+    def _write_throttled(self, body):
+        hub = self.server
+        if not hub.bandwidth:
+            self.wfile.write(body)
+            hub.count("bytes_sent", len(body))
+            return
+        start = time.perf_counter()
+        for offset in range(0, len(body), THROTTLE_CHUNK):
+            chunk = body[offset:offset + THROTTLE_CHUNK]
+            self.wfile.write(chunk)
+            hub.count("bytes_sent", len(chunk))
+            ahead = (offset + len(chunk)) / hub.bandwidth - (time.perf_counter() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def do_HEAD(self):
+        try:
+            self._handle(head=True)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        try:
+            self._handle(head=False)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def start(files, **kwargs):
+    """Start a FakeHub on a background thread and return it (call .shutdown() to stop)"""
+    hub = FakeHub(files, **kwargs)
+    threading.Thread(target=hub.serve_forever, daemon=True).start()
+    return hub
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local dataset through a HuggingFace Hub-compatible API")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--root', help='directory served as the dataset repo (e.g. folders of image sets)')
+    source.add_argument('--synthetic-sets', type=int, help='serve this many generated image sets instead')
+    parser.add_argument('--file-bytes', type=int, default=64 * 1024, help='size of each synthetic noise file')
+    parser.add_argument('--content', choices=['noise', 'scene'], default='noise', help='synthetic image content')
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before each file resolve answers')
+    parser.add_argument('--bandwidth', type=float, default=0, help='bytes per second per file download (0 = unlimited)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of file resolves that fail')
+    parser.add_argument('--fail-mode', choices=FAIL_MODES, default="503", help='how injected failures fail')
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE, help='tree entries per listing page')
+    parser.add_argument('--visits', type=int, default=1000, help='all-time visits reported by the metrics endpoint')
+    parser.add_argument('--seed', type=int, default=0, help='seed for failure injection')
+    args = parser.parse_args()
+
+    files = scan_directory(args.root) if args.root else synthetic_files(args.synthetic_sets, args.file_bytes, content=args.content)
+    hub = FakeHub(files, (args.host, args.port), latency=args.latency, bandwidth=args.bandwidth,
+                  fail_rate=args.fail_rate, fail_mode=args.fail_mode, page_size=args.page_size,
+                  visits=args.visits, seed=args.seed)
+    print(f"Serving {len(files)} files at {hub.url}; start the app with --hf-endpoint {hub.url}")
+    try:
+        hub.serve_forever()
+    except KeyboardInterrupt:
+        pass
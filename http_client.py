@@ -0,0 +1,260 @@
+"""Shared outbound HTTP: pooled keep-alive sessions, per-host limits, retries, timing.
+
+All outbound calls (IP geolocation, HF metrics, PNG header range requests) go
+through one requests.Session per process, and huggingface_hub's own downloads
+through a pooled client of its own (share_with_hf_hub). Connections are reused
+across requests; a semaphore per host caps concurrent requests; idempotent
+requests are retried with exponential backoff on connection errors and 429/5xx
+responses. Connection setup time is recorded by wrapping urllib3's connect(),
+so its cost on the request path shows up in report() (served at /http_stats).
+"""
+
+import importlib
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (3.05, 10)   # (connect, read) seconds
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.3          # Sleeps 0.3, 0.6, 1.2 s between retries
+DEFAULT_POOL_SIZE = 32         # Keep-alive connections per host
+DEFAULT_HOST_LIMIT = int(os.getenv("HTTP_HOST_LIMIT", "16"))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_STATS_LOCK = threading.Lock()
+_CONNECT_STATS = {"connections": 0, "connect_seconds": 0.0}
+_HUB_STATS = {"hub_requests": 0, "hub_errors": 0, "hub_header_seconds": 0.0}  # huggingface_hub's own client
+
+
+def _record_connect(seconds):
+    with _STATS_LOCK:
+        _CONNECT_STATS["connections"] += 1
+        _CONNECT_STATS["connect_seconds"] += seconds
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _record_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # Includes the TLS handshake
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _record_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+
+class HostBusy(requests.exceptions.ConnectionError):
+    """Raised when a host's concurrency limit stays saturated for the whole acquire timeout"""
+
+
+class HttpClient:
+    """One pooled session with retries, per-host concurrency limits and request timing"""
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, pool_size=DEFAULT_POOL_SIZE,
+                 host_limit=DEFAULT_HOST_LIMIT, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.host_limit = host_limit
+        retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=backoff,
+                      status_forcelist=RETRY_STATUSES, allowed_methods=frozenset(["GET", "HEAD"]),
+                      raise_on_status=False, respect_retry_after_header=True)
+        adapter = _TimedAdapter(pool_connections=16, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._host_slots = {}  # {host: BoundedSemaphore}
+        self.stats = {"requests": 0, "errors": 0, "request_seconds": 0.0, "wait_seconds": 0.0}
+
+    def _slot(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.host_limit)
+            return host, slot
+
+    def request(self, method, url, timeout=None, acquire_timeout=30.0, **kwargs):
+        """Send a request through the shared session, waiting for a free slot on the target host"""
+        host, slot = self._slot(url)
+        wait_start = time.perf_counter()
+        if not slot.acquire(timeout=acquire_timeout):
+            raise HostBusy(f"More than {self.host_limit} concurrent requests to {host}")
+        start = time.perf_counter()
+        try:
+            return self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            slot.release()
+            end = time.perf_counter()
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["request_seconds"] += end - start
+                self.stats["wait_seconds"] += start - wait_start
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def counters(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+_CLIENTS = {}  # {retries: HttpClient}
+_CLIENT_LOCK = threading.Lock()
+_HF_TOKEN = None
+_HF_TOKEN_RESOLVED = False
+_HF_ENDPOINT = None
+
+
+def get_client(retries=DEFAULT_RETRIES):
+    """Process-wide HttpClient for a retry budget"""
+    with _CLIENT_LOCK:
+        client = _CLIENTS.get(retries)
+        if client is None:
+            client = _CLIENTS[retries] = HttpClient(retries=retries)
+        return client
+
+
+def get(url, retries=DEFAULT_RETRIES, **kwargs):
+    """GET through the shared pool; pass retries=0 for best-effort calls on the page-load path"""
+    return get_client(retries).get(url, **kwargs)
+
+
+def report():
+    """Counters summed over every client plus connection setup time, for /http_stats"""
+    with _CLIENT_LOCK:
+        clients = list(_CLIENTS.values())
+    stats = {"requests": 0, "errors": 0, "request_seconds": 0.0, "wait_seconds": 0.0}
+    for client in clients:
+        for key, value in client.counters().items():
+            stats[key] += value
+    with _STATS_LOCK:
+        stats.update(_CONNECT_STATS)
+        stats.update(_HUB_STATS)
+    requests_made = stats["requests"]
+    # Retries and huggingface_hub downloads open connections too, so this is a lower bound
+    stats["connection_reuse"] = max(0.0, 1 - stats["connections"] / requests_made) if requests_made else 0.0
+    stats["avg_connect_ms"] = 1000 * stats["connect_seconds"] / stats["connections"] if stats["connections"] else 0.0
+    stats["avg_request_ms"] = 1000 * stats["request_seconds"] / requests_made if requests_made else 0.0
+    stats["host_limit"] = DEFAULT_HOST_LIMIT
+    return stats
+
+
+def hf_token():
+    """HF token from HF_TOKEN / HUGGING_FACE_HUB_TOKEN or the huggingface_hub login, resolved once"""
+    global _HF_TOKEN, _HF_TOKEN_RESOLVED
+    if not _HF_TOKEN_RESOLVED:
+        token = os.getenv("HF_TOKEN") or os.getenv("HUGGING_FACE_HUB_TOKEN")
+        if not token:
+            try:
+                from huggingface_hub import get_token
+                token = get_token()
+            except Exception:
+                token = None
+        _HF_TOKEN, _HF_TOKEN_RESOLVED = token, True
+    return _HF_TOKEN
+
+
+def set_hf_endpoint(url):
+    """Point every hub call at another server (e.g. fake_hub.py); None restores HF_ENDPOINT / huggingface.co"""
+    global _HF_ENDPOINT
+    _HF_ENDPOINT = url.rstrip('/') if url else None
+
+
+def hf_endpoint():
+    """Base URL of the hub: set_hf_endpoint(), else HF_ENDPOINT, else https://huggingface.co"""
+    return _HF_ENDPOINT or os.getenv("HF_ENDPOINT", "https://huggingface.co").rstrip('/')
+
+
+def hf_headers(extra=None):
+    """Request headers carrying the HF token, if there is one"""
+    headers = dict(extra or {})
+    token = hf_token()
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    return headers
+
+
+def _hub_request_started(request):
+    request.extensions["http_client_start"] = time.perf_counter()
+
+
+def _hub_response(response):
+    start = response.request.extensions.get("http_client_start")
+    with _STATS_LOCK:
+        _HUB_STATS["hub_requests"] += 1
+        _HUB_STATS["hub_errors"] += response.status_code >= 400
+        if start is not None:
+            _HUB_STATS["hub_header_seconds"] += time.perf_counter() - start
+
+
+def share_with_hf_hub():
+    """Give huggingface_hub's own requests pooled connections, connect retries and a place in report()
+
+    huggingface_hub >= 1.0 builds its client with set_client_factory; older
+    requests-based releases take a session through configure_http_backend.
+    """
+    try:
+        from huggingface_hub import get_session, set_client_factory
+    except ImportError:
+        try:
+            from huggingface_hub import configure_http_backend
+        except ImportError:
+            return False
+        configure_http_backend(backend_factory=lambda: get_client().session)
+        return True
+    # The library's client carries its own hooks (offline mode, request ids), which are kept, and
+    # its httpx flavour differs between releases, so the replacement is built from the same module
+    default_client = get_session()
+    hooks = default_client.event_hooks
+    httpx_module = importlib.import_module(type(default_client).__module__.split('.')[0])
+
+    def client_factory():
+        transport = httpx_module.HTTPTransport(
+            retries=DEFAULT_RETRIES,
+            limits=httpx_module.Limits(max_connections=DEFAULT_HOST_LIMIT, max_keepalive_connections=DEFAULT_POOL_SIZE))
+        return httpx_module.Client(
+            transport=transport, follow_redirects=True, timeout=None,
+            event_hooks={"request": list(hooks.get("request", [])) + [_hub_request_started],
+                         "response": list(hooks.get("response", [])) + [_hub_response]})
+
+    set_client_factory(client_factory)
+    return True
@@ -0,0 +1,303 @@
+"""Content-addressed local image cache with hard-linked duplicates and LRU eviction.
+
+Every cached file is stored once under objects/<sha1[:2]>/<sha1>. Each dataset
+path gets a hard link to its object under paths/, so captures with identical
+bytes take the disk space of one file. Once the object bytes go over max_bytes,
+the least recently used objects (and every path linked to them) are evicted.
+
+Objects can also be found by the hub's etag for a file (the LFS sha256, or the
+git blob id of a small file), so a path whose content is already cached under
+another name is linked to it before anything is downloaded.
+
+The index is a JSON snapshot plus an append-only journal of puts and drops;
+the snapshot is only rewritten once the journal outgrows it (or to record
+access order), so a put costs one appended line rather than a full rewrite.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from atomic_io import atomic_write
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "hf_dataset_cache", "content")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+INDEX_FILE = "index.json"
+JOURNAL_FILE = "index.log"
+# Access times are only flushed to the index this often (seconds); puts and evictions are journaled immediately
+INDEX_FLUSH_INTERVAL = 30
+# The journal is folded into the snapshot once it has more entries than this or than there are paths
+MIN_COMPACT_ENTRIES = 1000
+
+
+def file_sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class ContentCache:
+    """Map dataset paths to locally cached files, deduplicated by content hash"""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.paths = {}              # {dataset path: sha1}
+        self.objects = OrderedDict()  # {sha1: size}, least recently used first
+        self.etags = {}              # {hub etag: sha1}
+        self._links = {}             # {sha1: set of dataset paths}
+        self._tags = {}              # {sha1: set of hub etags}
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "dedup_hits": 0, "etag_hits": 0,
+                      "evictions": 0, "evicted_bytes": 0}
+        self._dirty_since = None
+        self._journal_entries = 0
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "paths"), exist_ok=True)
+        self._load_index()
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def _link_path(self, key):
+        # Flattened like the old hf_dataset_cache names, but escaped so 'a/b_c' and 'a_b/c' stay distinct
+        return os.path.join(self.root, "paths", key.replace('%', '%25').replace('/', '%2F'))
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.root, INDEX_FILE), 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        for digest, size in data.get("objects", []):
+            if os.path.exists(self._object_path(digest)):
+                self._add_object(digest, size)
+        for key, digest in data.get("paths", {}).items():
+            if digest in self.objects:
+                self._set_path(key, digest)
+        for etag, digest in data.get("etags", {}).items():
+            if digest in self.objects:
+                self._set_etag(etag, digest)
+        try:
+            with open(os.path.join(self.root, JOURNAL_FILE), 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by a crash
+                    self._replay(entry)
+                    self._journal_entries += 1
+        except OSError:
+            pass
+
+    def _replay(self, entry):
+        if entry[0] == "put":
+            _, key, digest, size, etag = entry
+            if not os.path.exists(self._object_path(digest)):
+                return
+            self._add_object(digest, size)
+            self._set_path(key, digest)
+            if etag:
+                self._set_etag(etag, digest)
+        elif entry[0] == "drop":
+            self._forget_object(entry[1])
+
+    def _journal(self, entry):
+        with open(os.path.join(self.root, JOURNAL_FILE), 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+        self._journal_entries += 1
+        if self._journal_entries > max(MIN_COMPACT_ENTRIES, len(self.paths)):
+            self._save_index()
+
+    def _save_index(self):
+        """Write the full snapshot and empty the journal it now contains"""
+        data = {"objects": list(self.objects.items()), "paths": self.paths, "etags": self.etags}
+        with atomic_write(os.path.join(self.root, INDEX_FILE)) as f:
+            json.dump(data, f)
+        with open(os.path.join(self.root, JOURNAL_FILE), 'w'):
+            pass
+        self._journal_entries = 0
+        self._dirty_since = None
+
+    def _add_object(self, digest, size):
+        self._bytes += size - self.objects.get(digest, 0)
+        self.objects[digest] = size
+        self.objects.move_to_end(digest)
+
+    def _set_path(self, key, digest):
+        """Point key at digest; returns the digest it pointed at before (None if it was new)"""
+        old_digest = self.paths.get(key)
+        if old_digest is not None:
+            self._links[old_digest].discard(key)
+        self.paths[key] = digest
+        self._links.setdefault(digest, set()).add(key)
+        return old_digest
+
+    def _set_etag(self, etag, digest):
+        old_digest = self.etags.get(etag)
+        if old_digest is not None:
+            self._tags[old_digest].discard(etag)
+        self.etags[etag] = digest
+        self._tags.setdefault(digest, set()).add(etag)
+
+    def _forget_object(self, digest):
+        """Drop an object and everything naming it from the index; returns its size"""
+        size = self.objects.pop(digest, 0)
+        self._bytes -= size
+        keys = self._links.pop(digest, ())
+        for key in keys:
+            del self.paths[key]
+        for etag in self._tags.pop(digest, ()):
+            del self.etags[etag]
+        return size, keys
+
+    @property
+    def total_bytes(self):
+        return self._bytes
+
+    def get(self, key):
+        """Return the cached local file for a dataset path (marking it recently used), or None"""
+        with self._lock:
+            digest = self.paths.get(key)
+            if digest is None or not os.path.exists(self._object_path(digest)):
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.objects.move_to_end(digest)
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            elif time.monotonic() - self._dirty_since > INDEX_FLUSH_INTERVAL:
+                self._save_index()
+            link = self._link_path(key)
+            return link if os.path.exists(link) else self._object_path(digest)
+
+    def put(self, key, src, move=False, etag=None):
+        """Add a local file under a dataset path and return its cached location.
+
+        With move=True the source is renamed into the cache instead of copied,
+        which keeps a download from ever taking up space outside the budget.
+        etag is the hub's etag for the file, remembered for link_etag().
+        """
+        digest = file_sha1(src)
+        size = os.path.getsize(src)
+        with self._lock:
+            object_path = self._object_path(digest)
+            if digest in self.objects and os.path.exists(object_path):
+                self.stats["dedup_hits"] += 1
+                if move:
+                    os.remove(src)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                if move:
+                    try:
+                        os.replace(src, object_path)
+                    except OSError:
+                        # Different filesystem
+                        shutil.move(src, object_path)
+                else:
+                    tmp_path = object_path + ".tmp"
+                    shutil.copyfile(src, tmp_path)
+                    os.replace(tmp_path, object_path)
+                self.stats["stores"] += 1
+            self._add_object(digest, size)
+            if etag:
+                self._set_etag(etag, digest)
+            return self._link(key, digest, etag)
+
+    def link_etag(self, key, etag):
+        """Link a dataset path to the cached object with this hub etag and return its location.
+
+        Returns None (nothing is changed) when no cached object has that etag,
+        in which case the file has to be downloaded and put().
+        """
+        with self._lock:
+            digest = self.etags.get(etag)
+            if digest is None or not os.path.exists(self._object_path(digest)):
+                return None
+            self.stats["etag_hits"] += 1
+            self.objects.move_to_end(digest)
+            return self._link(key, digest, etag)
+
+    def _link(self, key, digest, etag):
+        """Point key at a stored object, journal it, and evict down to the budget"""
+        object_path = self._object_path(digest)
+        old_digest = self._set_path(key, digest)
+        link = self._link_path(key)
+        if old_digest != digest or not os.path.exists(link):
+            try:
+                if os.path.lexists(link):
+                    os.remove(link)
+                os.link(object_path, link)
+            except OSError:
+                pass  # No hard links here; get() falls back to the object path
+        self._journal(["put", key, digest, self.objects[digest], etag])
+        if old_digest and old_digest != digest and not self._links.get(old_digest):
+            self._remove_object(old_digest)
+
+        self._evict(keep=digest)
+        return link if os.path.exists(link) else object_path
+
+    def _remove_object(self, digest):
+        size, keys = self._forget_object(digest)
+        for key in keys:
+            try:
+                os.remove(self._link_path(key))
+            except OSError:
+                pass
+        try:
+            os.remove(self._object_path(digest))
+        except OSError:
+            pass
+        self._journal(["drop", digest])
+        return size
+
+    def _evict(self, keep=None):
+        """Drop least recently used objects until the cache fits in max_bytes"""
+        while self._bytes > self.max_bytes and len(self.objects) > (1 if keep in self.objects else 0):
+            digest = next(iter(self.objects))
+            if digest == keep:
+                self.objects.move_to_end(digest)
+                continue
+            size = self._remove_object(digest)
+            self.stats["evictions"] += 1
+            self.stats["evicted_bytes"] += size
+
+    def report(self):
+        """Hit/miss counters plus current size, for the /cache_stats endpoint"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(
+                self.stats,
+                hit_rate=self.stats["hits"] / lookups if lookups else 0.0,
+                objects=len(self.objects),
+                paths=len(self.paths),
+                bytes=self.total_bytes,
+                max_bytes=self.max_bytes
+            )
+
+    def flush(self):
+        with self._lock:
+            self._save_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or trim the content-addressed image cache")
+    parser.add_argument('--dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--max-bytes', type=int, default=None, help='evict down to this many bytes')
+    args = parser.parse_args()
+
+    cache = ContentCache(args.dir, args.max_bytes if args.max_bytes is not None else DEFAULT_MAX_BYTES)
+    if args.max_bytes is not None:
+        with cache._lock:
+            cache._evict()
+            cache._save_index()
+    print(json.dumps(cache.report(), indent=2))
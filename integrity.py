@@ -0,0 +1,232 @@
+"""Find truncated or corrupt PNGs in the dataset before the tagger trips over them.
+
+Every image is read chunk by chunk: the PNG signature, an IHDR first, each
+chunk's CRC and a final IEND, so partial uploads and flipped bytes are caught
+without decoding pixels (decode=True also decodes them with Pillow). Checks
+run in a process pool and are cached in a JSON file keyed by file size and
+mtime, so a re-run only reads images that changed. An image set is invalid
+when one of its images is missing, truncated or corrupt. Sets whose images are
+intact but where a view's dimensions differ from those of that view in the rest
+of the dataset (the views of a set have different sizes of their own, e.g.
+640x480, 320x240 and 320x540) are reported separately, as mismatched.
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from atomic_io import atomic_write
+from dataset_schema import views_of
+from exporters import PNG_SIGNATURE
+
+DEFAULT_INTEGRITY_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "integrity_cache.json")
+READ_SIZE = 1 << 20  # Chunk data is CRC'd in pieces of at most this many bytes
+
+
+class PngError(ValueError):
+    """A file that is not a complete, uncorrupted PNG"""
+
+
+def check_png(path, decode=False):
+    """(width, height) of a PNG whose chunks are all present and CRC-clean; raises PngError otherwise"""
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise PngError("not a PNG (bad signature)")
+        size = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise PngError("truncated (no IEND chunk)")
+            length, kind = struct.unpack('>I4s', header)
+            name = kind.decode('latin-1')
+            if length > 0x7fffffff:
+                raise PngError(f"bad {name} chunk length")
+            # Checked before reading: only IHDR's 13 bytes are ever kept in memory
+            if size is None and (kind != b'IHDR' or length != 13):
+                raise PngError("first chunk is not IHDR")
+            crc = zlib.crc32(kind)
+            data = b''
+            remaining = length
+            while remaining:
+                piece = f.read(min(remaining, READ_SIZE))
+                if not piece:
+                    raise PngError(f"truncated in {name} chunk")
+                crc = zlib.crc32(piece, crc)
+                remaining -= len(piece)
+                if size is None:
+                    data += piece
+            stored = f.read(4)
+            if len(stored) < 4:
+                raise PngError(f"truncated in {name} chunk")
+            if crc != struct.unpack('>I', stored)[0]:
+                raise PngError(f"CRC mismatch in {name} chunk")
+            if size is None:
+                size = struct.unpack('>II', data[:8])
+            if kind == b'IEND':
+                break
+    if decode:
+        from PIL import Image
+        try:
+            with Image.open(path) as img:
+                img.load()
+        except Exception as e:
+            raise PngError(f"decode failed: {e}")
+    return size
+
+
+def _check_file(path, decode):
+    """Worker: (file size, mtime_ns, width, height, error) of one image"""
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        return None, None, None, None, f"missing: {e.strerror}"
+    try:
+        width, height = check_png(path, decode)
+        return st.st_size, st.st_mtime_ns, width, height, None
+    except PngError as e:
+        return st.st_size, st.st_mtime_ns, None, None, str(e)
+    except OSError as e:
+        return st.st_size, st.st_mtime_ns, None, None, f"unreadable: {e.strerror}"
+
+
+class IntegrityCache:
+    """Persistent {image path: check result} cache, invalidated by file size and mtime"""
+
+    def __init__(self, cache_path=DEFAULT_INTEGRITY_CACHE):
+        self.cache_path = cache_path
+        self.entries = {}  # {absolute path: [file size, mtime_ns, width, height, error, decoded]}
+        self.dirty = False
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"Error loading integrity cache {cache_path}: {e}")
+
+    def save(self):
+        if self.cache_path and self.dirty:
+            with atomic_write(self.cache_path) as f:
+                json.dump(self.entries, f)
+            self.dirty = False
+
+    def lookup(self, path, decode=False):
+        """The cached entry for path if the file is unchanged (and was decoded, when decode is asked for), else None"""
+        entry = self.entries.get(path)
+        if entry is None or (decode and not entry[5] and entry[4] is None):
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+            return None
+        return entry
+
+    def check(self, paths, decode=False, workers=None, progress=None):
+        """{path: entry} for every path, checking only the images not cached; progress(done, total) is called as they finish"""
+        results, misses = {}, []
+        for path in paths:
+            entry = self.lookup(path, decode)
+            if entry is not None:
+                results[path] = entry
+            else:
+                misses.append(path)
+        if misses:
+            chunksize = max(1, min(256, len(misses) // ((workers or os.cpu_count() or 1) * 8)))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for done, (path, result) in enumerate(
+                        zip(misses, pool.map(_check_file, misses, [decode] * len(misses), chunksize=chunksize)), 1):
+                    entry = list(result) + [decode]
+                    results[path] = entry
+                    if entry[0] is not None:
+                        self.entries[path] = entry
+                        self.dirty = True
+                    if progress is not None:
+                        progress(done, len(misses))
+        return results, len(paths) - len(misses)
+
+
+def view_sizes(image_sets, results, resolve):
+    """{view: most common (width, height)} among the images that passed the check"""
+    counts = {}
+    for image_set in image_sets:
+        for view in views_of(image_set):
+            entry = results.get(resolve(image_set[view]))
+            if entry is not None and entry[4] is None:
+                counts.setdefault(view, Counter())[(entry[2], entry[3])] += 1
+    return {view: counter.most_common(1)[0][0] for view, counter in counts.items()}
+
+
+def set_problems(image_set, results, resolve, expected_sizes):
+    """(errors, size mismatches) of an image set: missing or broken images, and intact ones of an unusual size"""
+    errors, mismatches = [], []
+    for view in views_of(image_set):
+        entry = results.get(resolve(image_set[view]))
+        if entry is None:
+            continue
+        if entry[4] is not None:
+            errors.append(f"{view}: {entry[4]}")
+        elif view in expected_sizes and (entry[2], entry[3]) != expected_sizes[view]:
+            expected = expected_sizes[view]
+            mismatches.append(f"{view}: {entry[2]}x{entry[3]}, other {view} images are {expected[0]}x{expected[1]}")
+    return errors, mismatches
+
+
+def check_sets(image_sets, resolve, cache, decode=False, workers=None, progress=None):
+    """Check every image of image_sets; returns the invalid and the mismatched sets and run statistics.
+
+    Both are {position in image_sets: problems}: invalid sets have a missing,
+    truncated or corrupt image, mismatched ones only images of an unusual size.
+    resolve maps an image path of a set to the local file to read.
+    """
+    start = time.perf_counter()
+    image_sets = list(image_sets)
+    paths = [resolve(image_set[view]) for image_set in image_sets for view in views_of(image_set)]
+    results, cached = cache.check(paths, decode, workers, progress)
+    cache.save()
+    expected_sizes = view_sizes(image_sets, results, resolve)
+    invalid, mismatched = {}, {}
+    for position, image_set in enumerate(image_sets):
+        errors, mismatches = set_problems(image_set, results, resolve, expected_sizes)
+        if errors:
+            invalid[position] = errors
+        if mismatches:
+            mismatched[position] = mismatches
+    stats = {"sets": len(image_sets), "images": len(paths), "checked": len(paths) - cached, "cached": cached,
+             "invalid_sets": len(invalid), "mismatched_sets": len(mismatched), "decode": decode,
+             "seconds": round(time.perf_counter() - start, 3)}
+    return invalid, mismatched, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check every image set of a local dataset for truncated or corrupt PNGs")
+    parser.add_argument('--dir', required=True, help='local images directory')
+    parser.add_argument('--decode', action='store_true', help='also decode every image with Pillow (slower)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--cache', default=DEFAULT_INTEGRITY_CACHE, help='check results reused while a file keeps its size and mtime')
+    parser.add_argument('--schema', default=None, help='dataset schema JSON (views, suffixes, file ID rule; default: the three built-in views)')
+    args = parser.parse_args()
+
+    from app import load_from_local_directory
+    from dataset_schema import DatasetSchema, DEFAULT_SCHEMA
+
+    schema = DatasetSchema.load(args.schema) if args.schema else DEFAULT_SCHEMA
+    directory = args.dir if args.dir.endswith('/') else args.dir + '/'
+    folder_sets = load_from_local_directory(directory, schema)
+    image_sets = [image_set for folder_set in folder_sets for image_set in folder_set['image_sets']]
+    invalid, mismatched, stats = check_sets(image_sets, lambda image: os.path.abspath(os.path.join(directory, image)),
+                                            IntegrityCache(args.cache), args.decode, args.workers)
+    for label, flagged in (("invalid", invalid), ("size mismatch", mismatched)):
+        for position, problems in flagged.items():
+            image_set = image_sets[position]
+            print(f"{label}: {image_set[views_of(image_set)[0]]}: {'; '.join(problems)}")
+    print(f"{stats['sets']} sets, {stats['images']} images ({stats['checked']} checked, {stats['cached']} cached) "
+          f"in {stats['seconds']:.2f}s: {stats['invalid_sets']} invalid sets, "
+          f"{stats['mismatched_sets']} with mismatched sizes")
+    sys.exit(1 if invalid else 0)
@@ -0,0 +1,211 @@
+"""Load test: thread-per-request Flask vs the asyncio server (asgi_app.py) on image fetches.
+
+A fake hub (fake_hub.py) serving synthetic image sets runs in this process,
+with configurable latency, bandwidth and failure injection. Each server mode
+is started as a subprocess with --hf-endpoint pointing at it and an empty image
+cache, then hit with concurrent /image requests: every file is requested
+--duplicates times at once (coalescing), over --passes passes (the first
+cold, the rest served from the cache). Reports throughput, latency
+percentiles, 503s/errors, how many downloads reached the hub, and the server's
+peak thread count and resident memory.
+
+    python load_test.py --sets 100 --concurrency 300 --hub-latency 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+import fake_hub
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_usage(pid):
+    """(threads, resident MiB) of a process from /proc, or (None, None) where /proc is unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(status["Threads"]), int(status["VmRSS"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def start_server(mode, hub_url, workdir, port, args):
+    script = "app.py" if mode == "thread" else "asgi_app.py"
+    env = dict(os.environ, HF_HUB_DISABLE_TELEMETRY="1", HF_HOME=os.path.join(workdir, "hf_home"), HF_TOKEN="")
+    env.pop("SPACE_ID", None)
+    command = [sys.executable, os.path.join(HERE, script), "--port", str(port), "--hf-endpoint", hub_url,
+               "--out", os.path.join(workdir, "out.csv"),
+               "--class-registry", os.path.join(workdir, "classes.json"),
+               "--image-cache-dir", os.path.join(workdir, "cache"),
+               "--max-downloads", str(args.max_downloads), "--download-queue", str(args.download_queue)]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited; see {log.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/cache_stats", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start within {args.startup_timeout}s; see {log.name}")
+
+
+async def fire(base_url, paths, concurrency, timeout):
+    """GET every path from concurrency clients in parallel; returns [(status or error name, seconds)]"""
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    results = []
+    # Shared so each client doesn't load the CA bundle again
+    context = ssl.create_default_context()
+
+    async def worker():
+        # One connection per client: httpx's pool scans all its connections per request,
+        # so a single shared pool would make the load generator the bottleneck
+        async with httpx.AsyncClient(base_url=base_url, timeout=timeout, verify=context) as client:
+            while not queue.empty():
+                path = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    response = await client.get(f"/image/{path}")
+                    outcome = response.status_code
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                results.append((outcome, time.perf_counter() - start))
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(paths)))))
+    return results
+
+
+def percentile(values, fraction):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def summarize(results, elapsed):
+    latencies = [seconds for outcome, seconds in results if outcome == 200]
+    return {
+        "requests": len(results),
+        "ok": len(latencies),
+        "shed_503": sum(1 for outcome, _ in results if outcome == 503),
+        "errors": sum(1 for outcome, _ in results if outcome not in (200, 503)),
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": 1000 * percentile(latencies, 0.50),
+        "p95_ms": 1000 * percentile(latencies, 0.95),
+        "max_ms": 1000 * max(latencies, default=float("nan"))
+    }
+
+
+def run_mode(mode, hub, requests, args):
+    workdir = tempfile.mkdtemp(prefix=f"load_test_{mode}_")
+    port = free_port()
+    process = start_server(mode, hub.url, workdir, port, args)
+    peak = {"threads": 0, "rss_mib": 0.0}
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.wait(0.05):
+            threads, rss = process_usage(process.pid)
+            if threads is not None:
+                peak["threads"] = max(peak["threads"], threads)
+                peak["rss_mib"] = max(peak["rss_mib"], rss)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    passes = []
+    try:
+        for number in range(args.passes):
+            hub.reset_stats()
+            start = time.perf_counter()
+            results = asyncio.run(fire(f"http://127.0.0.1:{port}", requests, args.concurrency, args.timeout))
+            summary = summarize(results, time.perf_counter() - start)
+            summary.update(mode=mode, run="cold" if number == 0 else f"warm{number}",
+                           hub_resolves=hub.stats["resolves"], hub_failures=hub.stats["failures_injected"])
+            passes.append(summary)
+    finally:
+        sampling.set()
+        sampler.join()
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    for summary in passes:
+        summary.update(peak_threads=peak["threads"] or None, peak_rss_mib=peak["rss_mib"] or None)
+    return passes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare thread-per-request and async image serving against a fake hub")
+    parser.add_argument('--sets', type=int, default=100, help='image sets in the synthetic dataset (three files each)')
+    parser.add_argument('--file-bytes', type=int, default=64 * 1024)
+    parser.add_argument('--hub-latency', type=float, default=1.0, help='seconds the fake hub waits before answering each file')
+    parser.add_argument('--hub-bandwidth', type=float, default=0, help='bytes per second per hub download (0 = unlimited)')
+    parser.add_argument('--hub-fail-rate', type=float, default=0.0, help='fraction of hub downloads that fail')
+    parser.add_argument('--hub-fail-mode', choices=fake_hub.FAIL_MODES, default="503")
+    parser.add_argument('--duplicates', type=int, default=1, help='concurrent requests per file (exercises coalescing)')
+    parser.add_argument('--passes', type=int, default=1, help='request every file this many times in sequence (later passes hit the cache)')
+    parser.add_argument('--concurrency', type=int, default=300, help='requests kept open at once')
+    parser.add_argument('--max-downloads', type=int, default=512, help='passed to both servers')
+    parser.add_argument('--download-queue', type=int, default=1024, help='passed to both servers')
+    parser.add_argument('--timeout', type=float, default=120.0, help='per-request client timeout (seconds)')
+    parser.add_argument('--startup-timeout', type=float, default=60.0)
+    parser.add_argument('--modes', nargs='+', choices=['thread', 'async'], default=['thread', 'async'])
+    parser.add_argument('--seed', type=int, default=0, help='seed for request order and failure injection')
+    parser.add_argument('--keep', action='store_true', help='keep each mode\'s work directory (server log, cache)')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    files = fake_hub.synthetic_files(args.sets, args.file_bytes)
+    requests = sorted(files) * args.duplicates
+    random.Random(args.seed).shuffle(requests)
+    results = []
+    for mode in args.modes:
+        # A fresh hub per mode, so both see the same injected-failure sequence
+        hub = fake_hub.start(files, latency=args.hub_latency, bandwidth=args.hub_bandwidth,
+                             fail_rate=args.hub_fail_rate, fail_mode=args.hub_fail_mode, seed=args.seed)
+        print(f"{mode}: fake hub at {hub.url}, {len(files)} files, {args.hub_latency:.2f}s latency; "
+              f"{len(requests)} requests, {args.concurrency} at once", file=sys.stderr)
+        try:
+            results.extend(run_mode(mode, hub, requests, args))
+        finally:
+            hub.shutdown()
+            hub.server_close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'mode':<7}{'pass':<7}{'ok':>6}{'503':>6}{'err':>6}{'hub':>6}{'req/s':>9}{'p50 ms':>9}"
+              f"{'p95 ms':>9}{'max ms':>9}{'threads':>9}{'RSS MiB':>9}")
+        for r in results:
+            print(f"{r['mode']:<7}{r['run']:<7}{r['ok']:>6}{r['shed_503']:>6}{r['errors']:>6}{r['hub_resolves']:>6}"
+                  f"{r['throughput']:>9.1f}{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['max_ms']:>9.0f}"
+                  f"{r['peak_threads'] or '-':>9}{(r['peak_rss_mib'] or 0):>9.0f}")
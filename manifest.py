@@ -0,0 +1,440 @@
+"""Compact columnar manifest of the dataset's folders and image sets.
+
+Stands in for the FOLDER_SETS list of dicts ({'folder', 'image_sets': [{'file_id',
+'sr_int_full', 'tr_line', 'tr_int_full'}]}) with the same indexing, len and
+iteration, but holds a few NumPy columns instead of four Python strings per
+set:
+  - every distinct string (folder name, directory prefix, file_id) is stored
+    once in a UTF-8 blob addressed by an offsets array;
+  - folders are (name, first set) rows, the first sets being prefix sums like
+    SetIndex.offsets;
+  - a set is its directory prefix and file_id; its paths come from the
+    schema's templates "{dir}{file_id}<template>" (dataset_schema), with the
+    rare path that doesn't follow them kept in a sorted exception table;
+  - paths are found through a sorted array of 64-bit path hashes.
+Image set dicts are built when accessed. save() writes the columns to one file
+that load() memory-maps read-only, so processes serving the same dataset share
+a single copy through the page cache.
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+from collections.abc import Sequence
+
+import numpy as np
+
+from atomic_io import atomic_write
+from dataset_schema import DEFAULT_SCHEMA, DatasetSchema
+
+MAGIC = b"IMGMANI1"
+ALIGN = 8
+
+
+def path_hash(path):
+    return int.from_bytes(hashlib.blake2b(path.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class StringTable:
+    """Interning string pool, frozen into a UTF-8 blob plus offsets"""
+
+    def __init__(self):
+        self.ids = {}
+        self.chunks = []
+
+    def add(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.chunks)
+            self.chunks.append(text.encode('utf-8'))
+        return string_id
+
+    def freeze(self):
+        offsets = np.zeros(len(self.chunks) + 1, dtype=np.uint64)
+        np.cumsum([len(chunk) for chunk in self.chunks], out=offsets[1:])
+        return np.frombuffer(b"".join(self.chunks), dtype=np.uint8), offsets
+
+
+class ImageSets(Sequence):
+    """Image set dicts of sets start..stop, built on access (a folder's 'image_sets', or all sets)"""
+
+    def __init__(self, manifest, start, stop):
+        self.manifest = manifest
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.manifest.image_set(self.start + i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("image set index out of range")
+        return self.manifest.image_set(self.start + index)
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+
+class PathIndex:
+    """{image path: global set number} lookups over the manifest's hash column"""
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+
+    def get(self, path, default=None):
+        found = self.manifest.find(path)
+        return default if found is None else found[0]
+
+    def __contains__(self, path):
+        return self.manifest.find(path) is not None
+
+    def __iter__(self):
+        return self.manifest.paths()
+
+    def __len__(self):
+        return len(self.manifest.path_hashes)
+
+
+class Manifest(Sequence):
+    """FOLDER_SETS as columns: manifest[h] is {'folder': name, 'image_sets': ImageSets}"""
+
+    COLUMNS = ('strings', 'string_offsets', 'folder_names', 'folder_offsets', 'set_dirs', 'set_file_ids',
+               'exception_keys', 'exception_paths', 'path_hashes', 'path_sets')
+
+    def __init__(self, columns, meta=None, schema=None):
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+        self.meta = meta or {}
+        self.schema = schema or DEFAULT_SCHEMA
+        self.views = self.schema.views
+        self._templates = [self.schema.template(view) for view in self.views]
+        self._view_numbers = {view: n for n, view in enumerate(self.views)}
+        self._offsets = [int(offset) for offset in self.folder_offsets]
+        self._exception_keys = self.exception_keys.tolist()
+
+    @classmethod
+    def from_folder_sets(cls, folder_sets, meta=None, schema=None):
+        schema = schema or DEFAULT_SCHEMA
+        views = schema.views
+        templates = [schema.template(view) for view in views]
+        strings = StringTable()
+        folder_names, folder_offsets, set_dirs, set_file_ids = [], [0], [], []
+        exceptions = {}
+        hashes = []
+        for folder_set in folder_sets:
+            folder_names.append(strings.add(folder_set['folder']))
+            for image_set in folder_set['image_sets']:
+                global_index = len(set_dirs)
+                file_id = image_set['file_id']
+                first_path = image_set[views[0]]
+                directory = first_path[:first_path.rfind('/') + 1]
+                set_dirs.append(strings.add(directory))
+                set_file_ids.append(strings.add(file_id))
+                for view_number, view in enumerate(views):
+                    path = image_set[view]
+                    if path != f"{directory}{file_id}{templates[view_number]}":
+                        exceptions[global_index * len(views) + view_number] = strings.add(path)
+                    hashes.append((path_hash(path), global_index))
+            folder_offsets.append(len(set_dirs))
+        blob, string_offsets = strings.freeze()
+        hashes.sort()
+        exception_keys = sorted(exceptions)
+        columns = {
+            'strings': blob,
+            'string_offsets': string_offsets,
+            'folder_names': np.array(folder_names, dtype=np.uint32),
+            'folder_offsets': np.array(folder_offsets, dtype=np.uint64),
+            'set_dirs': np.array(set_dirs, dtype=np.uint32),
+            'set_file_ids': np.array(set_file_ids, dtype=np.uint32),
+            'exception_keys': np.array(exception_keys, dtype=np.uint64),
+            'exception_paths': np.array([exceptions[key] for key in exception_keys], dtype=np.uint32),
+            'path_hashes': np.array([h for h, _ in hashes], dtype=np.uint64),
+            'path_sets': np.array([s for _, s in hashes], dtype=np.uint32),
+        }
+        return cls(columns, meta, schema)
+
+    def replace_folders(self, changes, added=(), meta=None):
+        """New manifest with some folders' image sets replaced, plus (folder_map, set_map).
+
+        changes maps folder positions to their new image set lists (an empty
+        list drops the folder); added folder sets are appended after the
+        existing ones. Untouched folders are copied column-wise, so the cost
+        is a few array operations plus the changed sets. folder_map / set_map
+        give the new folder position / global set number of each old one, -1
+        where dropped.
+        """
+        strings_base = len(self.string_offsets) - 1
+        new_strings, chunks = {}, []
+
+        def intern(text):
+            string_id = new_strings.get(text)
+            if string_id is None:
+                string_id = new_strings[text] = strings_base + len(chunks)
+                chunks.append(text.encode('utf-8'))
+            return string_id
+
+        folder_names, folder_offsets = [], [0]
+        dir_parts, file_id_parts = [], []
+        exceptions, hashes = {}, []
+        folder_map = np.full(len(self), -1, dtype=np.int64)
+        set_map = np.full(self.set_count, -1, dtype=np.int64)
+        copied = np.zeros(self.set_count, dtype=bool)
+
+        def add_sets(image_sets):
+            first = folder_offsets[-1]
+            dirs, file_ids = [], []
+            for image_set in image_sets:
+                global_index = first + len(dirs)
+                file_id = image_set['file_id']
+                first_path = image_set[self.views[0]]
+                directory = first_path[:first_path.rfind('/') + 1]
+                dirs.append(intern(directory))
+                file_ids.append(intern(file_id))
+                for view_number, view in enumerate(self.views):
+                    path = image_set[view]
+                    if path != f"{directory}{file_id}{self._templates[view_number]}":
+                        exceptions[global_index * len(self.views) + view_number] = intern(path)
+                    hashes.append((path_hash(path), global_index))
+            dir_parts.append(np.array(dirs, dtype=np.uint32))
+            file_id_parts.append(np.array(file_ids, dtype=np.uint32))
+            return len(dirs)
+
+        for position in range(len(self)):
+            start, stop = self._offsets[position], self._offsets[position + 1]
+            if position in changes:
+                if not changes[position]:
+                    continue
+                # A rescanned set keeps its identity (file_id within the folder) in set_map
+                new_positions = {image_set['file_id']: n for n, image_set in enumerate(changes[position])}
+                for global_index in range(start, stop):
+                    n = new_positions.get(self.string(self.set_file_ids[global_index]))
+                    if n is not None:
+                        set_map[global_index] = folder_offsets[-1] + n
+                count = add_sets(changes[position])
+            else:
+                count = stop - start
+                dir_parts.append(self.set_dirs[start:stop])
+                file_id_parts.append(self.set_file_ids[start:stop])
+                set_map[start:stop] = np.arange(folder_offsets[-1], folder_offsets[-1] + count)
+                copied[start:stop] = True
+            folder_map[position] = len(folder_names)
+            folder_names.append(int(self.folder_names[position]))
+            folder_offsets.append(folder_offsets[-1] + count)
+        for folder_set in added:
+            if folder_set['image_sets']:
+                name = intern(folder_set['folder'])
+                folder_offsets.append(folder_offsets[-1] + add_sets(folder_set['image_sets']))
+                folder_names.append(name)
+
+        # Carry over the exceptions and path hashes of the copied sets under their new numbers
+        old_keys = self.exception_keys.astype(np.int64)
+        mapped = set_map[old_keys // len(self.views)]
+        kept = copied[old_keys // len(self.views)]
+        exception_keys = np.concatenate([mapped[kept] * len(self.views) + old_keys[kept] % len(self.views),
+                                         np.array(list(exceptions), dtype=np.int64)])
+        exception_paths = np.concatenate([self.exception_paths[kept],
+                                          np.array(list(exceptions.values()), dtype=np.uint32)])
+        order = np.argsort(exception_keys, kind='stable')
+        mapped = set_map[self.path_sets.astype(np.int64)]
+        kept = copied[self.path_sets.astype(np.int64)]
+        path_hashes = np.concatenate([self.path_hashes[kept], np.array([h for h, _ in hashes], dtype=np.uint64)])
+        path_sets = np.concatenate([mapped[kept], np.array([s for _, s in hashes], dtype=np.int64)])
+        hash_order = np.argsort(path_hashes, kind='stable')
+
+        string_offsets = np.concatenate([self.string_offsets, np.zeros(len(chunks), dtype=np.uint64)])
+        if chunks:
+            np.cumsum([len(chunk) for chunk in chunks], out=string_offsets[strings_base + 1:])
+            string_offsets[strings_base + 1:] += self.string_offsets[-1]
+        columns = {
+            'strings': np.concatenate([self.strings, np.frombuffer(b"".join(chunks), dtype=np.uint8)]),
+            'string_offsets': string_offsets,
+            'folder_names': np.array(folder_names, dtype=np.uint32),
+            'folder_offsets': np.array(folder_offsets, dtype=np.uint64),
+            'set_dirs': np.concatenate(dir_parts or [np.zeros(0, dtype=np.uint32)]).astype(np.uint32),
+            'set_file_ids': np.concatenate(file_id_parts or [np.zeros(0, dtype=np.uint32)]).astype(np.uint32),
+            'exception_keys': exception_keys[order].astype(np.uint64),
+            'exception_paths': exception_paths[order].astype(np.uint32),
+            'path_hashes': path_hashes[hash_order],
+            'path_sets': path_sets[hash_order].astype(np.uint32),
+        }
+        manifest = type(self)(columns, self.meta if meta is None else meta, self.schema)
+        # Rescanned folders re-intern their strings; rebuild once the pool is mostly stale
+        if len(columns['string_offsets']) > 2 * (2 * manifest.set_count + len(manifest) + len(exception_keys)) + 1024:
+            manifest = type(self).from_folder_sets(manifest, manifest.meta, self.schema)
+        return manifest, folder_map, set_map
+
+    def save(self, path):
+        """Write the columns to one file: magic, header length, JSON header, then 8-byte aligned arrays"""
+        arrays = {}
+        offset = 0
+        for name in self.COLUMNS:
+            column = np.ascontiguousarray(getattr(self, name))
+            arrays[name] = {"dtype": column.dtype.str, "length": int(column.size), "offset": offset}
+            offset += -(-column.nbytes // ALIGN) * ALIGN
+        header = json.dumps({"meta": self.meta, "schema": self.schema.to_dict(), "arrays": arrays}).encode('utf-8')
+        header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+        with atomic_write(path, 'wb') as f:
+            f.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+            for name in self.COLUMNS:
+                column = np.ascontiguousarray(getattr(self, name))
+                f.write(column.tobytes())
+                f.write(b"\0" * (-column.nbytes % ALIGN))
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a saved manifest read-only"""
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a manifest file")
+        header_length = int.from_bytes(bytes(data[len(MAGIC):len(MAGIC) + 8]), 'little')
+        data_start = len(MAGIC) + 8 + header_length
+        header = json.loads(bytes(data[len(MAGIC) + 8:data_start]).decode('utf-8'))
+        columns = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = data_start + spec["offset"]
+            columns[name] = data[start:start + spec["length"] * dtype.itemsize].view(dtype)
+        schema = DatasetSchema.from_dict(header["schema"]) if "schema" in header else None
+        return cls(columns, header["meta"], schema)
+
+    def string(self, string_id):
+        return self.strings[self.string_offsets[string_id]:self.string_offsets[string_id + 1]].tobytes().decode('utf-8')
+
+    # FOLDER_SETS interface
+
+    def __len__(self):
+        return len(self.folder_names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("folder index out of range")
+        return {'folder': self.string(self.folder_names[index]),
+                'image_sets': ImageSets(self, self._offsets[index], self._offsets[index + 1])}
+
+    # Set-level access, numbered across folders like SetIndex
+
+    @property
+    def set_count(self):
+        return self._offsets[-1]
+
+    def offsets(self):
+        """Global number of each folder's first set, plus the total (SetIndex.offsets)"""
+        return list(self._offsets)
+
+    @property
+    def image_sets(self):
+        return ImageSets(self, 0, self.set_count)
+
+    @property
+    def image_to_set(self):
+        return PathIndex(self)
+
+    def path(self, global_index, view):
+        view_number = self._view_numbers[view]
+        key = global_index * len(self.views) + view_number
+        position = bisect.bisect_left(self._exception_keys, key)
+        if position < len(self._exception_keys) and self._exception_keys[position] == key:
+            return self.string(self.exception_paths[position])
+        return f"{self.string(self.set_dirs[global_index])}{self.string(self.set_file_ids[global_index])}{self._templates[view_number]}"
+
+    def image_set(self, global_index):
+        image_set = {'file_id': self.string(self.set_file_ids[global_index])}
+        for view in self.views:
+            image_set[view] = self.path(global_index, view)
+        return image_set
+
+    def folder_dir(self, position):
+        """Directory prefix of a folder's first set ("" for an empty folder)"""
+        start = self._offsets[position]
+        return self.string(self.set_dirs[start]) if start < self._offsets[position + 1] else ""
+
+    def find(self, path):
+        """(global set number, view) of an image path, or None"""
+        h = np.uint64(path_hash(path))
+        start = int(np.searchsorted(self.path_hashes, h, 'left'))
+        stop = int(np.searchsorted(self.path_hashes, h, 'right'))
+        for position in range(start, stop):
+            global_index = int(self.path_sets[position])
+            for view in self.views:
+                if self.path(global_index, view) == path:
+                    return global_index, view
+        return None
+
+    def __contains__(self, path):
+        """Whether an image path belongs to a set (HF_DATASET_FILES membership)"""
+        return isinstance(path, str) and self.find(path) is not None
+
+    def paths(self):
+        """Every image path, set by set"""
+        for global_index in range(self.set_count):
+            for view in self.views:
+                yield self.path(global_index, view)
+
+    def to_folder_sets(self):
+        return [{'folder': folder_set['folder'], 'image_sets': list(folder_set['image_sets'])} for folder_set in self]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+
+
+def synthetic_folder_sets(sets, folders=100):
+    """FOLDER_SETS shaped like the loaders' output, for measurements"""
+    per_folder = -(-sets // folders)
+    folder_sets = []
+    for folder in range(folders):
+        name = f"folder{folder:04d}"
+        image_sets = []
+        for n in range(folder * per_folder, min((folder + 1) * per_folder, sets)):
+            file_id = f"pu_pm15dtsn_av10_{n:07d}"
+            image_set = {'file_id': file_id}
+            for view in DEFAULT_SCHEMA.views:
+                image_set[view] = f"{name}/{file_id}{DEFAULT_SCHEMA.template(view)}"
+            image_sets.append(image_set)
+        if image_sets:
+            folder_sets.append({'folder': name, 'image_sets': image_sets})
+    return folder_sets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory of FOLDER_SETS as dicts and as a manifest")
+    parser.add_argument('--sets', type=int, default=1000000)
+    parser.add_argument('--out', default='manifest.bin')
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    folder_sets = synthetic_folder_sets(args.sets)
+    dataset_files = {image_set[view]: image_set[view] for folder_set in folder_sets
+                     for image_set in folder_set['image_sets'] for view in DEFAULT_SCHEMA.views}
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    manifest = Manifest.from_folder_sets(folder_sets)
+    build_seconds = time.perf_counter() - start
+    manifest.save(args.out)
+    del folder_sets, dataset_files
+    start = time.perf_counter()
+    loaded = Manifest.load(args.out)
+    load_seconds = time.perf_counter() - start
+    probe = loaded.image_sets[args.sets // 2]
+    start = time.perf_counter()
+    for _ in range(1000):
+        loaded.find(probe['tr_line'])
+    find_us = (time.perf_counter() - start) * 1000
+
+    print(f"{args.sets} sets: lists of dicts + HF_DATASET_FILES {dict_bytes / 2 ** 20:.0f} MiB, "
+          f"manifest {loaded.nbytes / 2 ** 20:.0f} MiB ({os.path.getsize(args.out) / 2 ** 20:.0f} MiB file, "
+          f"built in {build_seconds:.1f}s, mapped in {load_seconds * 1000:.1f}ms, path lookup {find_us:.0f}us)")
@@ -0,0 +1,246 @@
+"""CPU-only box proposals for sr_int_full images, computed ahead of the annotator.
+
+Proposers are plain functions registered by name; each takes a local image path
+and returns [(centerX, centerY, width, height, score)] in original pixels. The
+built-in ones are classical (spectral-residual saliency and edge contours) and
+only need Pillow and NumPy. Results are cached on disk keyed by the SHA-1 of the
+image bytes, and computed in a background process pool.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from atomic_io import atomic_write
+from spatial_index import iou
+
+PROPOSERS = {}
+WORK_SIDE = 128           # Longest side of the downsampled working image
+MIN_AREA_FRACTION = 0.005
+MAX_AREA_FRACTION = 0.9
+MAX_PROPOSALS = 5
+NMS_IOU = 0.5
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "proposal_cache")
+
+
+def register_proposer(name):
+    """Decorator adding a proposer function to PROPOSERS"""
+    def decorator(func):
+        PROPOSERS[name] = func
+        return func
+    return decorator
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _load_work_image(path):
+    """Grayscale float32 array with longest side WORK_SIDE, plus the scale back to original pixels"""
+    from PIL import Image
+    with Image.open(path) as img:
+        scale = max(img.size) / WORK_SIDE
+        gray = img.convert('L').resize((max(1, round(img.width / scale)), max(1, round(img.height / scale))))
+        return np.asarray(gray, dtype=np.float32) / 255.0, scale
+
+
+def _box_blur(a, radius):
+    """Separable box blur with edge padding"""
+    kernel = np.ones(2 * radius + 1, dtype=np.float32) / (2 * radius + 1)
+    padded = np.pad(a, radius, mode='edge')
+    rows = np.apply_along_axis(lambda r: np.convolve(r, kernel, mode='valid'), 1, padded)
+    return np.apply_along_axis(lambda c: np.convolve(c, kernel, mode='valid'), 0, rows)
+
+
+def _components(mask):
+    """4-connected components of a small boolean mask as (x0, y0, x1, y1, pixel count)"""
+    height, width = mask.shape
+    seen = np.zeros_like(mask, dtype=bool)
+    boxes = []
+    for y, x in zip(*np.nonzero(mask)):
+        if seen[y, x]:
+            continue
+        stack = [(y, x)]
+        seen[y, x] = True
+        x0 = x1 = x
+        y0 = y1 = y
+        count = 0
+        while stack:
+            cy, cx = stack.pop()
+            count += 1
+            x0, x1, y0, y1 = min(x0, cx), max(x1, cx), min(y0, cy), max(y1, cy)
+            for ny, nx in ((cy - 1, cx), (cy + 1, cx), (cy, cx - 1), (cy, cx + 1)):
+                if 0 <= ny < height and 0 <= nx < width and mask[ny, nx] and not seen[ny, nx]:
+                    seen[ny, nx] = True
+                    stack.append((ny, nx))
+        boxes.append((x0, y0, x1 + 1, y1 + 1, count))
+    return boxes
+
+
+def _boxes_from_map(score_map, mask, scale):
+    """Turn a thresholded score map into scored, NMS-filtered boxes in original pixels"""
+    height, width = mask.shape
+    candidates = []
+    for x0, y0, x1, y1, _ in _components(mask):
+        area = (x1 - x0) * (y1 - y0)
+        if not (MIN_AREA_FRACTION * width * height <= area <= MAX_AREA_FRACTION * width * height):
+            continue
+        score = float(score_map[y0:y1, x0:x1].mean())
+        candidates.append(((x0, y0, x1, y1), score))
+    candidates.sort(key=lambda c: c[1], reverse=True)
+
+    kept = []
+    for box, score in candidates:
+        if all(iou(box, other) < NMS_IOU for other, _ in kept):
+            kept.append((box, score))
+        if len(kept) >= MAX_PROPOSALS:
+            break
+    return [
+        ((x0 + x1) / 2 * scale, (y0 + y1) / 2 * scale, (x1 - x0) * scale, (y1 - y0) * scale, score)
+        for (x0, y0, x1, y1), score in kept
+    ]
+
+
+@register_proposer("saliency")
+def saliency_proposals(path):
+    """Spectral-residual saliency (Hou & Zhang 2007), thresholded at 3x the mean"""
+    gray, scale = _load_work_image(path)
+    spectrum = np.fft.fft2(gray)
+    log_amplitude = np.log(np.abs(spectrum) + 1e-9)
+    residual = log_amplitude - _box_blur(log_amplitude, 1)
+    saliency = np.abs(np.fft.ifft2(np.exp(residual + 1j * np.angle(spectrum)))) ** 2
+    saliency = _box_blur(saliency, 2)
+    saliency /= saliency.max() + 1e-9
+    return _boxes_from_map(saliency, saliency > 3 * saliency.mean(), scale)
+
+
+@register_proposer("contour")
+def contour_proposals(path):
+    """Edge magnitude, thresholded at its 90th percentile and dilated into blobs"""
+    gray, scale = _load_work_image(path)
+    gy, gx = np.gradient(_box_blur(gray, 1))
+    edges = np.hypot(gx, gy)
+    mask = edges > np.percentile(edges, 90)
+    mask = _box_blur(mask.astype(np.float32), 2) > 0
+    return _boxes_from_map(edges / (edges.max() + 1e-9), mask, scale)
+
+
+def _propose_worker(path, method):
+    """Process-pool entry point: returns (image hash, proposals, seconds)"""
+    start = time.perf_counter()
+    digest = file_hash(path)
+    boxes = PROPOSERS[method](path)
+    return digest, boxes, time.perf_counter() - start
+
+
+class ProposalEngine:
+    """Background proposal computation with an on-disk cache keyed by image hash"""
+
+    def __init__(self, method="saliency", cache_dir=DEFAULT_CACHE_DIR, workers=2):
+        if method not in PROPOSERS:
+            raise ValueError(f"Unknown proposer '{method}', available: {sorted(PROPOSERS)}")
+        self.method = method
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()  # Guards _hashes and _in_flight (updated from pool callback threads too)
+        self._hashes = {}     # {path: (file size, mtime_ns, hash)}
+        self._in_flight = {}  # {path: Future}
+
+    def _cache_file(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.{self.method}.json")
+
+    def _hash_for(self, path):
+        st = os.stat(path)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = file_hash(path)
+        with self._lock:
+            self._hashes[path] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def cached(self, path):
+        """Return cached proposals for a local image, or None if not computed yet"""
+        try:
+            with open(self._cache_file(self._hash_for(path)), 'r') as f:
+                return json.load(f)["boxes"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, path, future):
+        with self._lock:
+            self._in_flight.pop(path, None)
+        try:
+            digest, boxes, seconds = future.result()
+        except Exception as e:
+            print(f"Error computing proposals for {path}: {e}")
+            return
+        st = os.stat(path)
+        with self._lock:
+            self._hashes[path] = (st.st_size, st.st_mtime_ns, digest)
+        with atomic_write(self._cache_file(digest)) as f:
+            json.dump({"method": self.method, "seconds": seconds, "boxes": boxes}, f)
+
+    def prefetch(self, paths):
+        """Queue proposal computation for local images that are neither cached nor in flight"""
+        for path in paths:
+            if not path or self.cached(path) is not None:
+                continue
+            with self._lock:
+                if path in self._in_flight:
+                    continue
+                future = self._pool.submit(_propose_worker, path, self.method)
+                self._in_flight[path] = future
+            future.add_done_callback(lambda f, p=path: self._store(p, f))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def benchmark(paths, method, workers):
+    """Print per-image latency (single process) and pooled throughput for a list of images"""
+    latencies = []
+    for path in paths:
+        start = time.perf_counter()
+        PROPOSERS[method](path)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{method}: {len(paths)} images, latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(_propose_worker, paths, [method] * len(paths)))
+    elapsed = time.perf_counter() - start
+    print(f"{method}: {len(paths) / elapsed:.1f} images/s with {workers} worker processes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CPU box proposers on sr_int_full images")
+    parser.add_argument('--dir', required=True, help='local images directory')
+    parser.add_argument('--method', choices=sorted(PROPOSERS), default="saliency")
+    parser.add_argument('--limit', type=int, default=100, help='number of images to benchmark')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    paths = []
+    for dirpath, _, filenames in os.walk(args.dir):
+        paths.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith('sr_int_full.png'))
+    paths = paths[:args.limit]
+    if not paths:
+        print(f"No sr_int_full.png images found in {args.dir}")
+    else:
+        benchmark(paths, args.method, args.workers)
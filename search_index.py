@@ -0,0 +1,122 @@
+"""In-memory inverted index over image sets for /search.
+
+Every image set (numbered as in set_index.SetIndex) is indexed under its folder
+name, the tokens of its file_id (split on '_', e.g. pu, pm15dtsn, av10, 280cm,
+teddy) and the classes of its labelled boxes. Substring terms are matched
+against the token vocabulary through a trigram index, so a query never scans
+the file list.
+
+Query syntax: whitespace-separated terms, all of which must match.
+    teddy av1            file_id/folder tokens containing these substrings
+    folder:toy           exact folder name
+    class:cup            sets with a labelled 'cup' box (class:teddy_bear for 'teddy bear')
+    status:unlabelled    sets without labelled boxes (or status:labelled)
+"""
+
+import re
+from collections import Counter
+
+from class_registry import normalize
+from dataset_schema import views_of
+from set_index import is_labelled
+
+TOKEN_SPLIT = re.compile(r'[_\-\s./]+')
+FIELDS = ('folder', 'class', 'status')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_SPLIT.split(text.lower()) if token]
+
+
+def trigrams(token):
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Token and class postings over the sets of a SetIndex"""
+
+    def __init__(self, set_index, labels=()):
+        self.set_index = set_index
+        self.postings = {}     # {token: set of set numbers}
+        self.trigram_map = {}  # {trigram: set of tokens}
+        self.folder_postings = {}
+        for position, name in enumerate(set_index.folders):
+            self.folder_postings[name.lower()] = set(range(set_index.offsets[position], set_index.offsets[position + 1]))
+        for global_index, image_set in enumerate(set_index.image_sets):
+            folder = set_index.folders[set_index.locate(global_index)[0]]
+            for token in set(tokenize(image_set['file_id']) + tokenize(folder)):
+                self.postings.setdefault(token, set()).add(global_index)
+        for token in self.postings:
+            for gram in trigrams(token):
+                self.trigram_map.setdefault(gram, set()).add(token)
+        self.rebuild_classes(labels)
+
+    def rebuild_classes(self, labels):
+        self.class_counts = {}  # {class name: Counter({set number: labelled boxes})}
+        for label in labels:
+            global_index = self.set_index.image_to_set.get(label["image"])
+            if global_index is not None and is_labelled(label):
+                self.class_counts.setdefault(label["name"], Counter())[global_index] += 1
+
+    def refresh(self, image, labels_on):
+        """Recompute the class postings of the set containing image; labels_on(image) returns its labels"""
+        global_index = self.set_index.image_to_set.get(image)
+        if global_index is None:
+            return
+        for counts in self.class_counts.values():
+            counts.pop(global_index, None)
+        image_set = self.set_index.image_sets[global_index]
+        for view in views_of(image_set):
+            for label in labels_on(image_set[view]):
+                if is_labelled(label):
+                    self.class_counts.setdefault(label["name"], Counter())[global_index] += 1
+
+    def _substring(self, text):
+        """Sets having a token that contains text"""
+        grams = trigrams(text)
+        # Pad-free trigrams of the bare term: '^' and '$' only apply to whole-token matches
+        inner = {gram for gram in grams if '^' not in gram and '$' not in gram}
+        if inner:
+            candidates = set.intersection(*(self.trigram_map.get(gram, set()) for gram in inner))
+        else:
+            candidates = self.postings.keys()  # One- or two-character term
+        matched = set()
+        for token in candidates:
+            if text in token:
+                matched |= self.postings[token]
+        return matched
+
+    def _term(self, term, within=None):
+        """Sets matching one term; within (the sets matched so far) lets status filters skip a full scan"""
+        field, _, value = term.partition(':')
+        if field in FIELDS and value:
+            if field == 'folder':
+                return self.folder_postings.get(value, set())
+            if field == 'class':
+                # Same normalization as the class registry, so '_' stands in for spaces
+                return set(self.class_counts.get(normalize(value), ()))
+            unlabelled = self.set_index.unlabelled
+            wanted = 1 if value.startswith('un') else 0
+            candidates = within if within is not None else range(len(unlabelled))
+            return {global_index for global_index in candidates if unlabelled[global_index] == wanted}
+        # Terms like 'teddy_back' must match each part
+        parts = tokenize(term)
+        if not parts:
+            return set(range(len(self.set_index)))
+        return set.intersection(*(self._substring(part) for part in parts))
+
+    def search(self, query):
+        """Sorted set numbers matching every term of query"""
+        terms = query.lower().split()
+        if not terms:
+            return []
+        # Cheap field lookups first; stop as soon as the intersection is empty
+        terms.sort(key=lambda term: {'folder': 0, 'class': 0, 'status': 2}.get(term.partition(':')[0], 1))
+        result = None
+        for term in terms:
+            matched = self._term(term, result)
+            result = matched if result is None else result & matched
+            if not result:
+                return []
+        return sorted(result)
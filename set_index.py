@@ -0,0 +1,131 @@
+"""Flat index over every (folder, image set) pair for random-access navigation.
+
+Global set numbers run across folders in FOLDER_SETS order; per-folder prefix
+sums map them to (HEAD, IMAGE_SET_INDEX) and back. A Fenwick tree over an
+"unlabelled" bit per set finds the next set without labelled boxes in O(log n)
+and is updated in O(log n) as boxes are labelled or removed.
+"""
+
+from bisect import bisect_right
+
+from dataset_schema import views_of
+from manifest import Manifest
+
+
+def is_labelled(label):
+    return bool(label.get("id") and label.get("name"))
+
+
+class FenwickTree:
+    """Binary indexed tree of integer counts with prefix sums and rank search"""
+
+    def __init__(self, values):
+        self.size = len(values)
+        self.tree = [0] * (self.size + 1)
+        for i, value in enumerate(values, start=1):
+            self.tree[i] += value
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, count):
+        """Sum of the first count values"""
+        total = 0
+        i = count
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, rank):
+        """Smallest index whose prefix sum (inclusive) exceeds rank, or size if none"""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            following = position + step
+            if following <= self.size and self.tree[following] <= rank:
+                position = following
+                rank -= self.tree[following]
+            step >>= 1
+        return position
+
+
+class SetIndex:
+    """Global set numbering, folder lookup and the unlabelled-set bitmap"""
+
+    def __init__(self, folder_sets, labels=()):
+        self.folders = [folder_set['folder'] for folder_set in folder_sets]
+        self.folder_positions = {name: position for position, name in enumerate(self.folders)}
+        if isinstance(folder_sets, Manifest):
+            # Views over the manifest's columns rather than a second copy of every set and path
+            self.offsets = folder_sets.offsets()
+            self.image_sets = folder_sets.image_sets
+            self.image_to_set = folder_sets.image_to_set
+        else:
+            # offsets[h] is the global number of folder h's first set; offsets[-1] is the total
+            self.offsets = [0]
+            self.image_sets = []
+            for folder_set in folder_sets:
+                self.image_sets.extend(folder_set['image_sets'])
+                self.offsets.append(len(self.image_sets))
+            self.image_to_set = {}
+            for global_index, image_set in enumerate(self.image_sets):
+                for view in views_of(image_set):
+                    self.image_to_set[image_set[view]] = global_index
+        self.rebuild_labels(labels)
+
+    def __len__(self):
+        return len(self.image_sets)
+
+    def rebuild_labels(self, labels):
+        labelled_sets = {self.image_to_set.get(label["image"]) for label in labels if is_labelled(label)}
+        self.unlabelled = [0 if global_index in labelled_sets else 1 for global_index in range(len(self))]
+        self.tree = FenwickTree(self.unlabelled)
+
+    def locate(self, global_index):
+        """(HEAD, IMAGE_SET_INDEX) of a global set number"""
+        if not 0 <= global_index < len(self):
+            raise IndexError(f"Set {global_index} out of range (0-{len(self) - 1})")
+        head = bisect_right(self.offsets, global_index) - 1
+        return head, global_index - self.offsets[head]
+
+    def global_index(self, head, image_set_index):
+        return self.offsets[head] + image_set_index
+
+    def folder_start(self, name):
+        """Global number of a folder's first set, or None for an unknown folder"""
+        position = self.folder_positions.get(name)
+        return None if position is None else self.offsets[position]
+
+    def set_labelled(self, global_index, labelled):
+        value = 0 if labelled else 1
+        if self.unlabelled[global_index] != value:
+            self.tree.add(global_index, value - self.unlabelled[global_index])
+            self.unlabelled[global_index] = value
+
+    def refresh(self, image, labels_on):
+        """Recompute the bit of the set containing image; labels_on(image) returns that image's labels"""
+        global_index = self.image_to_set.get(image)
+        if global_index is None:
+            return
+        image_set = self.image_sets[global_index]
+        labelled = any(is_labelled(label) for view in views_of(image_set) for label in labels_on(image_set[view]))
+        self.set_labelled(global_index, labelled)
+
+    @property
+    def unlabelled_count(self):
+        return self.tree.prefix_sum(len(self))
+
+    def next_unlabelled(self, start):
+        """First unlabelled set at or after start, wrapping around; None when every set is labelled"""
+        if self.unlabelled_count == 0:
+            return None
+        start %= len(self)
+        found = self.tree.find(self.tree.prefix_sum(start))
+        return found if found < len(self) else self.tree.find(0)
@@ -0,0 +1,220 @@
+"""Stream image sets and their boxes into WebDataset-style tar shards for spatiotemporal training.
+
+Each sample bundles the RGB view, both transient views and a JSON record with the
+boxes of every view. Reads run in a small thread pool ahead of a single writer and
+are bounded by a queue, so memory stays constant regardless of dataset size.
+"""
+
+import argparse
+import io
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_io import atomic_write
+from class_registry import ClassRegistry
+from dataset_schema import DEFAULT_SCHEMA, DatasetSchema, views_of
+from exporters import group_by_image, read_annotations
+
+VIEWS = DEFAULT_SCHEMA.views
+_DONE = object()
+# How often a producer blocked on a full queue checks whether the writer gave up (seconds)
+PUT_POLL_INTERVAL = 0.5
+
+
+def iter_image_sets(folder_sets):
+    """Yield (folder name, image set) in manifest order"""
+    for folder_set in folder_sets:
+        for image_set in folder_set['image_sets']:
+            yield folder_set['folder'], image_set
+
+
+def build_sample(folder, image_set, boxes_by_image, read_bytes):
+    """Read the views of one image set and return (key, {extension: bytes})"""
+    key = f"{folder}/{image_set['file_id']}"
+    files = {}
+    record = {"folder": folder, "file_id": image_set['file_id'], "images": {}, "boxes": {}}
+    for view in views_of(image_set):
+        path = image_set[view]
+        files[view + ".png"] = read_bytes(path)
+        record["images"][view] = path
+        record["boxes"][view] = [
+            {"id": int(box["id"]), "name": box["name"],
+             "centerX": box["centerX"], "centerY": box["centerY"],
+             "width": box["width"], "height": box["height"]}
+            for box in boxes_by_image.get(path, [])
+        ]
+    files["json"] = json.dumps(record).encode()
+    return key, files
+
+
+class ShardWriter:
+    """Write samples to numbered tar shards, rolling over by sample count or size"""
+
+    def __init__(self, out_dir, samples_per_shard=1000, max_shard_bytes=1 << 30, views=VIEWS):
+        self.out_dir = out_dir
+        self.samples_per_shard = samples_per_shard
+        self.max_shard_bytes = max_shard_bytes
+        self.views = list(views)
+        self.shards = []  # [{"file": name, "samples": n, "bytes": n}]
+        self._tar = None
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _open_next(self):
+        self.close_shard()
+        name = "shard-%06d.tar" % len(self.shards)
+        self.shards.append({"file": name, "samples": 0, "bytes": 0})
+        self._tar = tarfile.open(os.path.join(self.out_dir, name + ".tmp"), 'w')
+
+    def close_shard(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        self._tar = None
+        name = self.shards[-1]["file"]
+        os.replace(os.path.join(self.out_dir, name + ".tmp"), os.path.join(self.out_dir, name))
+
+    def abort(self):
+        """Close and delete the shard being written, so a truncated shard is never published"""
+        if self._tar is None:
+            return
+        self._tar.close()
+        self._tar = None
+        os.remove(os.path.join(self.out_dir, self.shards.pop()["file"] + ".tmp"))
+
+    def write(self, key, files):
+        sample_bytes = sum(len(data) for data in files.values())
+        current = self.shards[-1] if self.shards else None
+        if (current is None or current["samples"] >= self.samples_per_shard or
+                (current["samples"] > 0 and current["bytes"] + sample_bytes > self.max_shard_bytes)):
+            self._open_next()
+            current = self.shards[-1]
+        mtime = time.time()
+        for extension, data in files.items():
+            info = tarfile.TarInfo(f"{key}.{extension}")
+            info.size = len(data)
+            info.mtime = mtime
+            self._tar.addfile(info, io.BytesIO(data))
+        current["samples"] += 1
+        current["bytes"] += sample_bytes
+
+    def finish(self):
+        """Close the last shard and write shards.json, returns the shard list"""
+        self.close_shard()
+        with atomic_write(os.path.join(self.out_dir, "shards.json")) as f:
+            json.dump({"views": self.views, "shards": self.shards}, f, indent=2)
+        return self.shards
+
+
+def export_shards(folder_sets, annotations, read_bytes, out_dir,
+                  samples_per_shard=1000, max_shard_bytes=1 << 30, workers=8, queue_size=32, views=VIEWS):
+    """Producer/consumer export: readers fill a bounded queue, one writer drains it into shards"""
+    boxes_by_image = group_by_image(annotations)
+    samples = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()  # Set when the writer fails, so the producer doesn't wait on a queue nobody drains
+    errors = []
+
+    def put(item):
+        """Queue item unless the writer has stopped; returns False if it has"""
+        while not stop.is_set():
+            try:
+                samples.put(item, timeout=PUT_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            pending = deque()
+            for folder, image_set in iter_image_sets(folder_sets):
+                pending.append(pool.submit(build_sample, folder, image_set, boxes_by_image, read_bytes))
+                # Keep at most queue_size reads in flight so memory stays bounded
+                if len(pending) >= queue_size and not put(pending.popleft().result()):
+                    return
+            while pending:
+                if not put(pending.popleft().result()):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            pool.shutdown(cancel_futures=True)
+            put(_DONE)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    writer = ShardWriter(out_dir, samples_per_shard, max_shard_bytes, views)
+    count = 0
+    try:
+        while True:
+            sample = samples.get()
+            if sample is _DONE:
+                break
+            writer.write(*sample)
+            count += 1
+            if count % 1000 == 0:
+                print(f"Wrote {count} samples to {len(writer.shards)} shards")
+    except BaseException:
+        stop.set()
+        producer.join()
+        writer.abort()
+        raise
+    producer.join()
+    if errors:
+        writer.abort()
+        raise errors[0]
+    shards = writer.finish()
+    print(f"Exported {count} samples to {len(shards)} shards in {out_dir}")
+    return shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export RGB + transient image sets with boxes to tar shards")
+    parser.add_argument('--dir', default=None, help='local images directory (uses the HF dataset if not provided)')
+    parser.add_argument('--hf-dataset', default="0001AMA/multimodal_data_annotator_dataset")
+    parser.add_argument('--csv', default="out.csv", help='annotation CSV')
+    parser.add_argument('--out', required=True, help='output directory for shard-*.tar and shards.json')
+    parser.add_argument('--samples-per-shard', type=int, default=1000)
+    parser.add_argument('--max-shard-mb', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=8, help='concurrent image readers')
+    parser.add_argument('--classes', default=None, help='class registry JSON; class IDs are taken from it')
+    parser.add_argument('--schema', default=None, help='dataset schema JSON (views, suffixes, file ID rule; default: the three built-in views)')
+    args = parser.parse_args()
+    schema = DatasetSchema.load(args.schema) if args.schema else DEFAULT_SCHEMA
+
+    from app import load_from_huggingface_dataset, load_from_local_directory
+
+    if args.dir:
+        directory = args.dir if args.dir.endswith('/') else args.dir + '/'
+        folder_sets = load_from_local_directory(directory, schema)
+
+        def read_bytes(path):
+            with open(os.path.join(directory, path), 'rb') as f:
+                return f.read()
+    else:
+        from huggingface_hub import hf_hub_download
+        folder_sets = load_from_huggingface_dataset(args.hf_dataset, schema=schema)
+        import http_client
+        hf_token = http_client.hf_token()
+        http_client.share_with_hf_hub()
+
+        def read_bytes(path):
+            local_path = hf_hub_download(repo_id=args.hf_dataset, filename=path,
+                                         repo_type="dataset", token=hf_token)
+            with open(local_path, 'rb') as f:
+                return f.read()
+
+    registry = ClassRegistry(args.classes) if args.classes else None
+    annotations = read_annotations(args.csv, registry) if os.path.exists(args.csv) else []
+    export_shards(folder_sets, annotations, read_bytes, args.out,
+                  samples_per_shard=args.samples_per_shard,
+                  max_shard_bytes=args.max_shard_mb << 20,
+                  workers=args.workers,
+                  views=schema.views)
@@ -0,0 +1,133 @@
+"""Request coalescing and load shedding for slow downloads.
+
+SingleFlight runs one call per key at a time: concurrent callers with the same
+key wait for the leader and share its result (or its exception).
+DownloadLimiter caps how many leaders download at once; callers beyond the
+queue limit, or waiting longer than the timeout, get Overloaded immediately
+instead of pinning a server thread behind a slow hub. Callers waiting on a
+leader count against the same queue when SingleFlight is given the limiter.
+"""
+
+import threading
+
+
+class Overloaded(Exception):
+    """Too many downloads in flight; the caller should answer 503"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls by key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # {key: _Call}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key, func, limiter=None):
+        """Run func() once for all concurrent callers with this key and return its result to each.
+
+        With a DownloadLimiter, callers waiting on the leader take a place in its
+        queue and raise Overloaded when it is full or the wait times out.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats["leaders"] += 1
+                leader = True
+
+        if not leader:
+            if limiter is not None:
+                limiter.wait(call.done)
+            else:
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class DownloadLimiter:
+    """Semaphore with a bounded wait queue"""
+
+    def __init__(self, max_concurrent=8, max_queue=32, wait_timeout=30.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.wait_timeout = wait_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "shed": 0, "timed_out": 0}
+
+    def __enter__(self):
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self.active += 1
+                self.stats["admitted"] += 1
+            return self
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.stats["shed"] += 1
+                raise Overloaded(f"{self.active} downloads running and {self.waiting} queued")
+            self.waiting += 1
+        acquired = self._slots.acquire(timeout=self.wait_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.stats["timed_out"] += 1
+                raise Overloaded(f"No download slot within {self.wait_timeout:.0f}s")
+            self.active += 1
+            self.stats["admitted"] += 1
+        return self
+
+    def wait(self, event):
+        """Wait for event as a queued request: Overloaded beyond the queue limit or after the timeout"""
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.stats["shed"] += 1
+                raise Overloaded(f"{self.active} downloads running and {self.waiting} queued")
+            self.waiting += 1
+        try:
+            if not event.wait(self.wait_timeout):
+                with self._lock:
+                    self.stats["timed_out"] += 1
+                raise Overloaded(f"Download not finished within {self.wait_timeout:.0f}s")
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+        return False
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats, active=self.active, waiting=self.waiting,
+                        max_concurrent=self.max_concurrent, max_queue=self.max_queue)
@@ -0,0 +1,218 @@
+"""Per-image grid-bucket spatial index over annotation boxes.
+
+Used for IoU duplicate checks on /add, "boxes near this point" hit-testing and
+batch de-duplication of an annotation CSV.
+"""
+
+import argparse
+import math
+
+DEFAULT_CELL_SIZE = 128
+DEFAULT_MAX_CELLS = 256  # 2048 x 2048 px at the default cell size
+DEFAULT_DUPLICATE_IOU = 0.9
+
+
+def center_to_corners(center_x, center_y, width, height):
+    half_w, half_h = abs(width) / 2, abs(height) / 2
+    return (center_x - half_w, center_y - half_h, center_x + half_w, center_y + half_h)
+
+
+def iou(a, b):
+    """Intersection over union of two (xMin, yMin, xMax, yMax) boxes"""
+    inter_w = min(a[2], b[2]) - max(a[0], b[0])
+    inter_h = min(a[3], b[3]) - max(a[1], b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class GridIndex:
+    """Uniform grid over the boxes of one image; each box is listed in every cell it overlaps.
+
+    Boxes spanning more than max_cells cells (or with non-finite corners) go to
+    an overflow set that every query scans instead, so one huge box costs a
+    comparison per query rather than millions of cells.
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE, max_cells=DEFAULT_MAX_CELLS):
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self.cells = {}  # {(col, row): set of keys}
+        self.overflow = set()  # Keys of boxes too large to bucket
+        self.boxes = {}  # {key: (xMin, yMin, xMax, yMax)}
+
+    def _cell_range(self, box):
+        """(cols, rows) covered by box, or None when it spans more than max_cells cells"""
+        if not all(math.isfinite(v) for v in box):
+            return None
+        size = self.cell_size
+        cols = range(math.floor(box[0] / size), math.floor(box[2] / size) + 1)
+        rows = range(math.floor(box[1] / size), math.floor(box[3] / size) + 1)
+        if len(cols) * len(rows) > self.max_cells:
+            return None
+        return cols, rows
+
+    def insert(self, key, box):
+        self.remove(key)
+        self.boxes[key] = box
+        cell_range = self._cell_range(box)
+        if cell_range is None:
+            self.overflow.add(key)
+            return
+        cols, rows = cell_range
+        for col in cols:
+            for row in rows:
+                self.cells.setdefault((col, row), set()).add(key)
+
+    def remove(self, key):
+        box = self.boxes.pop(key, None)
+        if box is None:
+            return
+        cell_range = self._cell_range(box)
+        if cell_range is None:
+            self.overflow.discard(key)
+            return
+        cols, rows = cell_range
+        for col in cols:
+            for row in rows:
+                bucket = self.cells.get((col, row))
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self.cells[(col, row)]
+
+    def query(self, box):
+        """Return keys of boxes intersecting box"""
+        cell_range = self._cell_range(box)
+        if cell_range is None:
+            candidates = self.boxes  # A query this large would visit more cells than there are boxes to check
+        else:
+            candidates = set(self.overflow)
+            cols, rows = cell_range
+            for col in cols:
+                for row in rows:
+                    candidates.update(self.cells.get((col, row), ()))
+        found = set()
+        for key in candidates:
+            other = self.boxes[key]
+            if other[0] <= box[2] and box[0] <= other[2] and other[1] <= box[3] and box[1] <= other[3]:
+                found.add(key)
+        return found
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+class SpatialIndex:
+    """Grid indexes for every image, over label dicts in the app.config["LABELS"] format"""
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.images = {}  # {image: GridIndex}
+        self.labels = {}  # {key: label dict}
+
+    @staticmethod
+    def key_of(label):
+        # Label dicts are mutable and unhashable; identity is stable while the index holds them
+        return id(label)
+
+    def add(self, label):
+        key = self.key_of(label)
+        self.labels[key] = label
+        grid = self.images.setdefault(label["image"], GridIndex(self.cell_size))
+        grid.insert(key, center_to_corners(float(label["centerX"]), float(label["centerY"]),
+                                           float(label["width"]), float(label["height"])))
+
+    def discard(self, label):
+        key = self.key_of(label)
+        if self.labels.pop(key, None) is None:
+            return
+        grid = self.images.get(label["image"])
+        if grid is not None:
+            grid.remove(key)
+            if not len(grid):
+                del self.images[label["image"]]
+
+    def rebuild(self, labels):
+        self.images = {}
+        self.labels = {}
+        for label in labels:
+            self.add(label)
+
+    def labels_on(self, image):
+        """All indexed labels on one image"""
+        grid = self.images.get(image)
+        return [self.labels[key] for key in grid.boxes] if grid is not None else []
+
+    def find_duplicate(self, image, center_x, center_y, width, height, iou_threshold=DEFAULT_DUPLICATE_IOU, where=None):
+        """Return the existing label on image with the highest IoU >= iou_threshold, or None.
+
+        where(label) restricts the candidates, e.g. to boxes of one class.
+        """
+        grid = self.images.get(image)
+        if grid is None:
+            return None
+        box = center_to_corners(center_x, center_y, width, height)
+        best, best_iou = None, iou_threshold
+        for key in grid.query(box):
+            if where is not None and not where(self.labels[key]):
+                continue
+            overlap = iou(box, grid.boxes[key])
+            if overlap >= best_iou:
+                best, best_iou = self.labels[key], overlap
+        return best
+
+    def near(self, image, x, y, radius=0.0):
+        """Return labels on image whose box (grown by radius) contains (x, y), closest center first"""
+        grid = self.images.get(image)
+        if grid is None:
+            return []
+        hits = grid.query((x - radius, y - radius, x + radius, y + radius))
+        labels = [self.labels[key] for key in hits]
+        labels.sort(key=lambda label: (float(label["centerX"]) - x) ** 2 + (float(label["centerY"]) - y) ** 2)
+        return labels
+
+
+def dedupe_labels(labels, iou_threshold=DEFAULT_DUPLICATE_IOU, same_class=True):
+    """Drop boxes that duplicate an earlier box on the same image; returns (kept, removed)"""
+    index = SpatialIndex()
+    kept, removed = [], []
+    for label in labels:
+        # Only boxes of the same class compete, so a better-overlapping box of another class doesn't hide a duplicate
+        where = (lambda other, name=label.get("name"): other.get("name") == name) if same_class else None
+        duplicate = index.find_duplicate(label["image"], float(label["centerX"]), float(label["centerY"]),
+                                         float(label["width"]), float(label["height"]), iou_threshold, where)
+        if duplicate is not None:
+            removed.append(label)
+            continue
+        index.add(label)
+        kept.append(label)
+    return kept, removed
+
+
+if __name__ == "__main__":
+    from atomic_io import atomic_write
+    from box_array import csv_rows
+    from exporters import read_annotations
+
+    parser = argparse.ArgumentParser(description="Remove duplicate boxes from an annotation CSV")
+    parser.add_argument('--csv', default="out.csv")
+    parser.add_argument('--iou', type=float, default=DEFAULT_DUPLICATE_IOU, help='IoU at or above which boxes are duplicates')
+    parser.add_argument('--any-class', action='store_true', help='treat overlapping boxes of different classes as duplicates too')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be removed')
+    args = parser.parse_args()
+
+    labels = read_annotations(args.csv)
+    kept, removed = dedupe_labels(labels, args.iou, same_class=not args.any_class)
+    for label in removed:
+        print(f"Duplicate: {label['image']} {label['name']} "
+              f"({label['centerX']:.0f},{label['centerY']:.0f}) {label['width']:.0f}x{label['height']:.0f}")
+    print(f"{len(removed)} duplicates found in {len(labels)} boxes")
+    if removed and not args.dry_run:
+        with atomic_write(args.csv) as f:
+            f.write("image,id,name,centerX,centerY,width,height\n")
+            for row in csv_rows(kept):
+                f.write(row + "\n")
+        print(f"Rewrote {args.csv} with {len(kept)} boxes")
@@ -0,0 +1,129 @@
+"""Seed each image set's boxes from the previous set in the same folder.
+
+Image sets inside a folder are consecutive captures (e.g. teddy__1, teddy__17,
+teddy__19), so boxes barely move between them. Seeded boxes are proposals: the
+annotator accepts them with one click (which assigns the suggested class) or
+deletes them. An optional phase-correlation step, on downsampled grayscale
+images, shifts the seeds by the estimated motion between the two captures.
+"""
+
+import re
+
+import numpy as np
+
+from dataset_schema import views_of
+
+PROPOSAL_SOURCE = "temporal"
+# Downsampled size (longest side) used for phase correlation
+CORRELATION_SIDE = 256
+# Below this normalized correlation peak the shift estimate is ignored
+MIN_PEAK = 0.05
+
+
+def natural_key(file_id):
+    """Sort key that orders teddy__2 before teddy__17"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', file_id)]
+
+
+def ordered_image_sets(image_sets):
+    return sorted(image_sets, key=lambda image_set: natural_key(image_set['file_id']))
+
+
+def load_gray(path, max_side=CORRELATION_SIDE):
+    """Load an image as a float32 grayscale array, downsampled so its longest side is max_side"""
+    from PIL import Image
+    with Image.open(path) as img:
+        scale = min(1.0, max_side / max(img.size))
+        gray = img.convert('L')
+        if scale < 1.0:
+            gray = gray.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))))
+        return np.asarray(gray, dtype=np.float32), scale
+
+
+def phase_correlation(a, b):
+    """Return (dx, dy, peak) such that b is approximately a shifted by (dx, dy)"""
+    height = min(a.shape[0], b.shape[0])
+    width = min(a.shape[1], b.shape[1])
+    a = a[:height, :width] - a[:height, :width].mean()
+    b = b[:height, :width] - b[:height, :width].mean()
+    window = np.outer(np.hanning(height), np.hanning(width))
+    cross_power = np.fft.fft2(b * window) * np.conj(np.fft.fft2(a * window))
+    cross_power /= np.abs(cross_power) + 1e-9
+    response = np.abs(np.fft.ifft2(cross_power))
+    dy, dx = np.unravel_index(np.argmax(response), response.shape)
+    if dy > height // 2:
+        dy -= height
+    if dx > width // 2:
+        dx -= width
+    return float(dx), float(dy), float(response.max())
+
+
+def estimate_shift(prev_path, next_path):
+    """Estimate the (dx, dy) motion in original pixels between two captures, (0, 0) if unreliable"""
+    prev_gray, prev_scale = load_gray(prev_path)
+    next_gray, _ = load_gray(next_path)
+    dx, dy, peak = phase_correlation(prev_gray, next_gray)
+    if peak < MIN_PEAK:
+        return 0.0, 0.0
+    return dx / prev_scale, dy / prev_scale
+
+
+def make_proposal(image, source, temp_id, center_x, center_y, width, height, source_name=PROPOSAL_SOURCE):
+    """Label dict for a proposal: unlabelled (not saved) until accepted with its suggested class"""
+    return {
+        "image": image,
+        "temp_id": temp_id,
+        "id": "",
+        "name": "",
+        "centerX": center_x,
+        "centerY": center_y,
+        "width": width,
+        "height": height,
+        "proposal": source_name,
+        "suggested_name": source.get("name", ""),
+        "suggested_id": source.get("id", "")
+    }
+
+
+def seed_from_previous(image_sets, labels, resolve_path=None, refine=True, only_empty=True):
+    """Walk a folder's image sets in capture order and seed each set from the last labelled one.
+
+    image_sets: the folder's image sets; labels: current label dicts;
+    resolve_path: maps an image path to a local file (needed when refine is True).
+    Returns the list of new proposal label dicts.
+    """
+    by_image = {}
+    for label in labels:
+        by_image.setdefault(label["image"], []).append(label)
+
+    proposals = []
+    previous = {}  # {view: (image path, [labelled source boxes])}
+    for image_set in ordered_image_sets(image_sets):
+        for view in views_of(image_set):
+            image = image_set[view]
+            existing = by_image.get(image, [])
+            labelled = [label for label in existing if label.get("id") and label.get("name")]
+            if labelled:
+                previous[view] = (image, labelled)
+                continue
+            if view not in previous or (only_empty and existing):
+                continue
+
+            prev_image, sources = previous[view]
+            dx, dy = 0.0, 0.0
+            if refine and resolve_path is not None:
+                try:
+                    prev_path, next_path = resolve_path(prev_image), resolve_path(image)
+                    if prev_path and next_path:
+                        dx, dy = estimate_shift(prev_path, next_path)
+                except Exception as e:
+                    print(f"Error estimating shift {prev_image} -> {image}: {e}")
+
+            for n, source in enumerate(sources, start=1):
+                proposals.append(make_proposal(
+                    image, source, f"t{n}",
+                    float(source["centerX"]) + dx, float(source["centerY"]) + dy,
+                    float(source["width"]), float(source["height"])
+                ))
+            print(f"DEBUG: Seeded {len(sources)} proposals on {image} from {prev_image} (shift {dx:.1f},{dy:.1f})")
+    return proposals
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+from annotation_stats import AnnotationStats
+from set_index import SetIndex
+
+
+def make_folder(name, count):
+    return {'folder': name, 'image_sets': [
+        {'file_id': f"{name}{n}", 'sr_int_full': f"{name}/{n}sr_int_full.png",
+         'tr_line': f"{name}/{n}-tr_line.png", 'tr_int_full': f"{name}/{n}-tr_int_full.png"}
+        for n in range(count)
+    ]}
+
+
+def make_label(image, name, width, height):
+    return {"image": image, "id": "1" if name else "", "name": name,
+            "centerX": 100, "centerY": 100, "width": width, "height": height}
+
+
+def test_incremental_updates_match_rebuild():
+    set_index = SetIndex([make_folder("cup", 2), make_folder("toy", 2)])
+    first = make_label("cup/0sr_int_full.png", "cup", 100, 50)
+    second = make_label("cup/0-tr_line.png", "cup", 20, 20)
+    third = make_label("cup/0-tr_line.png", "mug", 3000, 1000)
+    stats = AnnotationStats(set_index, [first, make_label("toy/1-tr_line.png", "", 50, 50)])
+    stats.add(second)
+    stats.add(third)
+
+    report = stats.report()
+    assert report["boxes"] == 3
+    assert report["classes"] == {"cup": 2, "mug": 1}
+    assert report["folders"][0] == {"folder": "cup", "sets": 2, "labelled_sets": 1, "completion": 0.5, "boxes": 3}
+    assert report["boxes_per_image"] == {"1": 1, "2": 1}
+    assert report["width_histogram"]["64-128"] == 1
+    assert report["aspect_histogram"][">=4.00"] == 0
+    assert report["aspect_histogram"]["2.00-4.00"] == 2
+
+    stats.remove(second)
+    stats.remove(third)
+    stats.remove(first)
+    report = stats.report()
+    assert report["boxes"] == 0 and report["classes"] == {} and report["boxes_per_image"] == {}
+    assert report["folders"][0]["labelled_sets"] == 0
+    assert sum(report["width_histogram"].values()) == 0
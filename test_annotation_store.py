@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+from annotation_store import AnnotationStore
+
+
+def test_annotation_store_roundtrip(tmp_path):
+    store = AnnotationStore(str(tmp_path / "annotations.db"))
+    db_id = store.add({"image": "toy/teddy__1-sr_int_full.png", "temp_id": "1",
+                       "centerX": 100.4, "centerY": 200.6, "width": 50, "height": 60})
+    store.add({"image": "cup/cupin__8-sr_int_full.png", "temp_id": "1",
+               "centerX": 10, "centerY": 20, "width": 30, "height": 40})
+
+    # Unlabelled boxes keep their temp_id and are not exported
+    assert store.labels_for_image("toy/teddy__1-sr_int_full.png")[0]["temp_id"] == "1"
+    assert store.export_csv(str(tmp_path / "out.csv")) == 0
+
+    store.set_class("toy", 1)
+    store.set_label(db_id, 1, "toy")
+    assert store.class_map() == {"toy": 1}
+    assert len(store.labels_for_folder("toy")) == 1
+
+    assert store.export_csv(str(tmp_path / "out.csv")) == 1
+    lines = (tmp_path / "out.csv").read_text().splitlines()
+    assert lines == ["image,id,name,centerX,centerY,width,height",
+                     "toy/teddy__1-sr_int_full.png,1,toy,100,201,50,60"]
+
+    assert store.remove_folder("cup") == 1
+    assert store.count() == 1
+    store.close()
+
+    # Changes survive reopening, and an exported CSV imports back
+    reopened = AnnotationStore(str(tmp_path / "annotations.db"))
+    assert reopened.labels()[0]["name"] == "toy"
+    reopened.clear()
+    assert reopened.import_csv(str(tmp_path / "out.csv")) == 1
+    assert reopened.labels()[0]["id"] == "1"
+    reopened.close()
+
+
+def test_export_rounds_like_the_csv_writer(tmp_path):
+    from box_array import csv_rows
+
+    store = AnnotationStore(str(tmp_path / "annotations.db"))
+    label = {"image": "cup/a-tr_line.png", "temp_id": "1", "centerX": 12.5, "centerY": 13.5, "width": 20.5, "height": -0.5}
+    store.set_class("cup", 2)
+    store.set_label(store.add(label), 2, "cup")
+    store.export_csv(str(tmp_path / "out.csv"))
+    # Halves round to even, exactly as save_and_next writes them
+    assert (tmp_path / "out.csv").read_text().splitlines()[1:] == csv_rows([dict(label, id="2", name="cup")])
+    store.close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import threading
+
+import pytest
+
+import fake_hub
+import http_client
+from asgi_app import AsyncFetcher
+from image_cache import ContentCache
+from single_flight import Overloaded
+
+REPO_ID = "0001AMA/multimodal_data_annotator_dataset"
+
+
+@pytest.fixture
+def hub():
+    files = {"toy/a-tr_line.png": b"a" * 5000, "toy/b-tr_line.png": b"b" * 5000, "cup/a-tr_line.png": b"a" * 5000}
+    hub = fake_hub.start(files, latency=0.2)
+    http_client.set_hf_endpoint(hub.url)
+    try:
+        yield hub
+    finally:
+        http_client.set_hf_endpoint(None)
+        hub.shutdown()
+        hub.server_close()
+
+
+def fetch_all(cache, paths, **kwargs):
+    async def run():
+        fetcher = AsyncFetcher(cache, REPO_ID, **kwargs)
+        try:
+            results = await asyncio.gather(*(fetcher.fetch(path) for path in paths), return_exceptions=True)
+            return results, fetcher.report()
+        finally:
+            await fetcher.aclose()
+    return asyncio.run(run())
+
+
+def test_concurrent_fetches_of_a_path_share_one_download(hub, tmp_path):
+    cache = ContentCache(str(tmp_path / "cache"))
+    lookup_threads = []
+    get = cache.get
+
+    def recording_get(key):
+        lookup_threads.append(threading.current_thread())
+        return get(key)
+
+    cache.get = recording_get
+    results, report = fetch_all(cache, ["toy/a-tr_line.png"] * 5)
+    assert len(set(results)) == 1
+    with open(results[0], 'rb') as f:
+        assert f.read() == b"a" * 5000
+    assert (report["leaders"], report["coalesced"]) == (1, 4)
+    assert hub.resolves_by_path["toy/a-tr_line.png"] == 2  # One HEAD for the etag, one GET
+    # Cache lookups can write the index, so they never run on the event loop's thread
+    assert lookup_threads and threading.main_thread() not in lookup_threads
+    assert not [name for name in os.listdir(cache.root) if name.endswith(".part")]
+
+
+def test_known_content_is_linked_instead_of_downloaded(hub, tmp_path):
+    cache = ContentCache(str(tmp_path / "cache"))
+    first, = fetch_all(cache, ["toy/a-tr_line.png"])[0]
+    sent = hub.stats["bytes_sent"]
+    second, = fetch_all(cache, ["cup/a-tr_line.png"])[0]
+    assert os.path.samefile(second, first)
+    assert hub.stats["bytes_sent"] == sent
+
+
+def test_downloads_beyond_the_queue_are_shed(hub, tmp_path):
+    cache = ContentCache(str(tmp_path / "cache"))
+    results, report = fetch_all(cache, ["toy/a-tr_line.png", "toy/b-tr_line.png"], max_concurrent=1, max_queue=0)
+    assert isinstance(results[1], Overloaded)
+    assert cache.get("toy/a-tr_line.png") == results[0]
+    assert report["shed"] == 1
+
+
+def test_missing_files_raise_and_leave_no_part_file(hub, tmp_path):
+    cache = ContentCache(str(tmp_path / "cache"))
+    results, _ = fetch_all(cache, ["toy/missing.png"])
+    assert isinstance(results[0], FileNotFoundError)
+    assert not [name for name in os.listdir(cache.root) if name.endswith(".part")]
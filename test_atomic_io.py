@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from atomic_io import atomic_write, rotate_backup
+
+
+def test_atomic_write_keeps_old_file_on_error(tmp_path):
+    target = tmp_path / "out.csv"
+    target.write_text("old\n")
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(target)) as f:
+            f.write("partial")
+            raise RuntimeError("crash mid-write")
+    assert target.read_text() == "old\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["out.csv"]
+
+    with atomic_write(str(target)) as f:
+        f.write("new\n")
+    assert target.read_text() == "new\n"
+
+
+def test_rotate_backup_is_rate_limited(tmp_path):
+    src, dst = tmp_path / "stats.json", tmp_path / "stats_backup.json"
+    src.write_text("1")
+    assert rotate_backup(str(src), str(dst), 60)
+    src.write_text("2")
+    assert not rotate_backup(str(src), str(dst), 60)
+    assert dst.read_text() == "1"
+    assert rotate_backup(str(src), str(dst), 0)
+    assert dst.read_text() == "2"
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+import box_array
+from spatial_index import center_to_corners, iou
+
+
+def make_label(image, center_x, center_y, width, height, name="toy", class_id="1"):
+    return {"image": image, "id": class_id, "name": name, "centerX": center_x, "centerY": center_y,
+            "width": width, "height": height}
+
+
+def test_corner_round_trips():
+    boxes = np.array([[100.0, 50.0, 40.0, 20.0], [10.5, 7.25, 3.0, 0.5], [0.0, 0.0, 0.0, 0.0]])
+    corners = box_array.to_corners(boxes)
+    assert corners[0].tolist() == [80.0, 40.0, 120.0, 60.0]
+    assert np.array_equal(box_array.from_corners(corners[:, 0], corners[:, 2], corners[:, 1], corners[:, 3]), boxes)
+    assert box_array.to_xywh(boxes)[0].tolist() == [80.0, 40.0, 40.0, 20.0]
+    assert box_array.normalize(boxes[:1], np.array([200]), np.array([100]))[0].tolist() == [0.5, 0.5, 0.2, 0.2]
+
+    # Clipping keeps the center/size layout
+    clipped = box_array.clip(np.array([[10.0, 10.0, 40.0, 40.0]]), np.array([100]), np.array([100]))
+    assert clipped[0].tolist() == [15.0, 15.0, 30.0, 30.0]
+
+    # Rounding matches round(float(v)) in the CSV writer, halves to even
+    assert box_array.round_boxes([[0.5, 1.5, 2.5, -0.5]])[0].tolist() == [round(v) for v in (0.5, 1.5, 2.5, -0.5)]
+
+
+def test_iou_of_array_corners_matches_the_spatial_index():
+    labels = [make_label("a.png", 50, 50, 40, 40), make_label("a.png", 60, 50, 40, 40),
+              make_label("a.png", 200, 200, 10, 10)]
+    corners = box_array.to_corners(box_array.from_labels(labels)).tolist()
+    for label, row in zip(labels, corners):
+        assert tuple(row) == center_to_corners(label["centerX"], label["centerY"], label["width"], label["height"])
+    assert iou(corners[0], corners[1]) == 30 * 40 / (2 * 40 * 40 - 30 * 40)
+    assert iou(corners[0], corners[0]) == 1.0
+    assert iou(corners[0], corners[2]) == 0.0
+
+
+def test_crop_band_mask_and_flags():
+    labels = [
+        make_label("s-tr_int_full.png", 100, 100, 40, 40),    # Reaches into the top 150px band
+        make_label("s-sr_int_full.png", 100, 100, 40, 40),    # Same box, but that view isn't cropped
+        make_label("s-tr_int_full.png", 100, 270, 40, 40),    # Between the bands
+        make_label("s-tr_int_full.png", 100, 530, 40, 40),    # Into the bottom band and out of bounds
+        make_label("s-tr_line.png", 100, 100, -20, 5),
+        make_label("unknown.png", 90, 90, 40, 40),
+    ]
+    sizes = {"s-tr_int_full.png": (320, 540), "s-sr_int_full.png": (640, 480), "s-tr_line.png": (320, 240)}
+    report = box_array.qa_report(labels, sizes)
+
+    flags = {tuple(problem["box"]): problem["flags"] for problem in report["problems"]}
+    assert report["invalid_boxes"] == 4
+    assert flags[(100.0, 100.0, 40.0, 40.0)] == ["in_crop_band"]
+    assert flags[(100.0, 530.0, 40.0, 40.0)] == ["out_of_bounds", "in_crop_band"]
+    assert flags[(100.0, 100.0, -20.0, 5.0)] == ["negative_size", "too_small"]
+    assert report["problems"][-1]["image"] == "unknown.png"
+    assert report["problems"][-1]["flags"] == ["unknown_image_size"]
+    assert report["counts"] == {"negative_size": 1, "out_of_bounds": 1, "in_crop_band": 2, "too_small": 1,
+                                "unknown_image_size": 1}
+
+    assert box_array.csv_rows([labels[0], dict(labels[1], id="")]) == ["s-tr_int_full.png,1,toy,100,100,40,40"]
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from class_registry import ClassRegistry, normalize
+
+
+def test_normalization_and_aliases(tmp_path):
+    registry = ClassRegistry(str(tmp_path / "classes.json"))
+    assert normalize("  Hollow_Hybrid ") == "hollow hybrid"
+    assert registry.get_or_create("Cup") == (1, "cup")
+    assert registry.get_or_create("hollow-hybrid") == (2, "hollow hybrid")
+    assert registry.get_or_create("HOLLOW  hybrid") == (2, "hollow hybrid")
+
+    registry.add_alias("mug", "cup")
+    assert registry.get_or_create("Mug") == (1, "cup")
+    with pytest.raises(ValueError):
+        registry.add_alias("mug", "hollow hybrid")
+    with pytest.raises(ValueError):
+        registry.get_or_create(" , ")
+
+
+def test_ids_persist_and_imported_ids_are_kept_when_free(tmp_path):
+    path = str(tmp_path / "classes.json")
+    registry = ClassRegistry(path)
+    assert registry.get_or_create("headset", preferred_id="5") == (5, "headset")
+    assert registry.get_or_create("tile", preferred_id="5") == (6, "tile")
+    registry.add_alias("hs", "headset")
+
+    reloaded = ClassRegistry(path)
+    assert reloaded.as_map() == {"headset": 5, "tile": 6}
+    assert reloaded.get_or_create("toy") == (7, "toy")
+    label = {"image": "headset/a-sr_int_full.png", "id": "2", "name": "HS"}
+    assert reloaded.canonicalize(label) == {"image": "headset/a-sr_int_full.png", "id": "5", "name": "headset"}
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import random
+
+from dataset_schema import DEFAULT_SCHEMA, DatasetSchema, views_of
+from manifest import Manifest
+
+
+def legacy_image_sets(filenames):
+    """The three-view grouping the loaders did before dataset_schema.py"""
+    required_suffixes = ['sr_int_full.png', '-tr_line.png', '-tr_int_full.png']
+    found_images = {suffix: [] for suffix in required_suffixes}
+    for filename in filenames:
+        for suffix in required_suffixes:
+            if filename.endswith(suffix):
+                found_images[suffix].append(filename)
+    image_groups = {}
+    for suffix in required_suffixes:
+        for filename in found_images[suffix]:
+            if '-' in filename:
+                image_groups.setdefault(filename.split('-')[0], {})[suffix] = filename
+    return [{'file_id': file_id, 'sr_int_full': images['sr_int_full.png'],
+             'tr_line': images['-tr_line.png'], 'tr_int_full': images['-tr_int_full.png']}
+            for file_id, images in image_groups.items() if all(suffix in images for suffix in required_suffixes)]
+
+
+def test_default_schema_groups_like_the_legacy_loader():
+    rng = random.Random(0)
+    endings = ["-sr_int_full.png", "sr_int_full.png", "-tr_line.png", "-tr_int_full.png", "-x-tr_line.png",
+               "tr_line.png", "-tr_int_full.jpg", ".txt"]
+    filenames = [f"s{rng.randrange(40)}{rng.choice(endings)}" for _ in range(300)]
+    complete, incomplete = DEFAULT_SCHEMA.image_sets(filenames)
+    assert complete == legacy_image_sets(filenames)
+    assert not set(incomplete) & {image_set['file_id'] for image_set in complete}
+
+    assert DEFAULT_SCHEMA.match("a-b-tr_int_full.png") == ("a", "tr_int_full")
+    assert DEFAULT_SCHEMA.match("asr_int_full.png") is None  # No file ID separator
+    assert DEFAULT_SCHEMA.view_of("toy/asr_int_full.png") == "sr_int_full"
+    assert DEFAULT_SCHEMA.view_of("toy/a-tr_line.png.bak") is None
+
+
+def test_custom_schemas():
+    two = DatasetSchema.from_dict({"views": [{"name": "rgb", "suffix": "_rgb.png"},
+                                             {"name": "depth", "suffix": "_depth.png"}],
+                                   "id": {"separator": "_"}})
+    complete, incomplete = two.image_sets(["d/a_depth.png", "d/a_rgb.png", "d/b_rgb.png", "d/c_ir.png"])
+    assert complete == [{'file_id': "a", 'rgb': "d/a_rgb.png", 'depth': "d/a_depth.png"}]
+    assert incomplete == {"b": ["depth"]}
+    assert views_of(complete[0]) == ["rgb", "depth"]
+    assert DatasetSchema.from_dict(two.to_dict()) == two
+
+    five = DatasetSchema([(f"band{n}", f".b{n}.tif") for n in range(5)],
+                         id_pattern=r"^scene(\d+)\.")
+    names = [f"scene{s}.b{n}.tif" for s in (3, 1) for n in range(5)] + ["scene2.b0.tif", "other.b0.tif"]
+    complete, incomplete = five.image_sets(names)
+    assert [image_set['file_id'] for image_set in complete] == ["3", "1"]
+    assert complete[1]['band4'] == "scene1.b4.tif"
+    assert incomplete == {"2": ["band1", "band2", "band3", "band4"]}
+
+
+def test_longest_suffix_wins():
+    schema = DatasetSchema([("line", "-line.png"), ("full_line", "-full-line.png")])
+    assert schema.view_of("x-full-line.png") == "full_line"
+    assert schema.view_of("x-line.png") == "line"
+
+
+def test_manifest_keeps_the_schema(tmp_path):
+    schema = DatasetSchema([("rgb", "_rgb.png"), ("depth", "_depth.png")], id_separator="_")
+    folder_sets = [{'folder': "d", 'image_sets': schema.image_sets(
+        [f"d/s{n}_rgb.png" for n in range(3)] + [f"d/s{n}_depth.png" for n in range(3)])[0]}]
+    manifest = Manifest.from_folder_sets(folder_sets, {"source": "test"}, schema)
+    assert manifest.to_folder_sets() == folder_sets
+    assert len(manifest.exception_keys) == 0
+
+    path = str(tmp_path / "manifest.bin")
+    manifest.save(path)
+    loaded = Manifest.load(path)
+    assert loaded.schema == schema
+    assert loaded.to_folder_sets() == folder_sets
+    assert loaded.find("d/s2_depth.png") == (2, 'depth')
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+import pytest
+
+from dataset_watcher import DirectoryWatcher, Inotify, RevisionWatcher, fingerprint
+
+
+def settle(watcher, reported, seconds=5):
+    deadline = time.monotonic() + seconds
+    while not reported and time.monotonic() < deadline:
+        watcher.poll(0.05)
+
+
+@pytest.mark.parametrize("backend", ["inotify", "poll"])
+def test_directory_changes_are_reported_once_settled(tmp_path, backend):
+    if backend == "inotify":
+        try:
+            Inotify(str(tmp_path)).close()
+        except OSError as e:
+            pytest.skip(f"inotify unavailable: {e}")
+    (tmp_path / "cup").mkdir()
+    reported = []
+    watcher = DirectoryWatcher(str(tmp_path), lambda dirs, observed_ns: reported.append(dirs),
+                               settle=0.2, backend=backend)
+    assert watcher.stats["backend"] == backend
+    time.sleep(0.02)  # Let directory mtimes move past the poller's snapshot
+
+    (tmp_path / "cup" / "a-tr_line.png").write_bytes(b"x")
+    (tmp_path / "toy" / "nested").mkdir(parents=True)
+    (tmp_path / "toy" / "nested" / "b-tr_line.png").write_bytes(b"x")
+    settle(watcher, reported)
+    changed = set(reported[0])
+    assert {str(tmp_path / "cup"), str(tmp_path / "toy" / "nested")} <= changed
+
+    reported.clear()
+    (tmp_path / "cup" / "a-tr_line.png").unlink()
+    settle(watcher, reported)
+    assert reported == [[str(tmp_path / "cup")]]
+    watcher.backend.close()
+
+
+def test_changes_made_before_the_watcher_started_are_caught_up(tmp_path):
+    (tmp_path / "old").mkdir()
+    since = time.time_ns()
+    (tmp_path / "new").mkdir()
+    os.utime(tmp_path / "old", ns=(since - 10 ** 10, since - 10 ** 10))
+    reported = []
+    watcher = DirectoryWatcher(str(tmp_path), lambda dirs, observed_ns: reported.append(dirs),
+                               settle=0, since_ns=since, backend="poll")
+    watcher.poll(0)
+    assert reported == [sorted([str(tmp_path), str(tmp_path / "new")])]
+
+
+def test_revision_watcher_retries_failed_updates():
+    revisions = iter(["a", "b", "b", "b"])
+    applied = []
+
+    def apply(revision):
+        if not applied:
+            applied.append(None)
+            raise OSError("listing failed")
+        applied.append(revision)
+
+    watcher = RevisionWatcher(lambda: next(revisions), apply, revision="a")
+    assert not watcher.check()
+    assert not watcher.check()  # "b" fails to apply ...
+    assert watcher.check()      # ... and is applied on the next check
+    assert not watcher.check()
+    assert applied == [None, "b"]
+    assert watcher.stats["revision"] == "b" and watcher.stats["errors"] == 1
+
+
+def test_fingerprint_moves_when_entries_change(tmp_path):
+    (tmp_path / "cup").mkdir()
+    (tmp_path / "cup" / "a-tr_line.png").write_bytes(b"x")
+    before = fingerprint(str(tmp_path))
+    assert fingerprint(str(tmp_path)) == before
+    # Rewriting a file in place keeps the listing, and the fingerprint
+    (tmp_path / "cup" / "a-tr_line.png").write_bytes(b"y")
+    assert fingerprint(str(tmp_path)) == before
+    (tmp_path / "out.csv").write_text("image\n")
+    assert fingerprint(str(tmp_path)) == before
+
+    os.utime(tmp_path / "cup", ns=(1, 1))  # A new or removed entry moves the directory's mtime
+    assert fingerprint(str(tmp_path)) != before
+    moved = fingerprint(str(tmp_path))
+    (tmp_path / "toy").mkdir()
+    assert fingerprint(str(tmp_path)) != moved
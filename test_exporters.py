@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import json
+import os
+from xml.etree import ElementTree
+
+from PIL import Image
+
+import fake_hub
+from exporters import ImageSizeCache, read_annotations, write_coco, write_voc, write_yolo
+
+REPO_ID = "0001AMA/multimodal_data_annotator_dataset"
+HEADER = "image,id,name,centerX,centerY,width,height\n"
+SIZES = {"toy/a-tr_line.png": (200, 100), "toy/b-tr_line.png": (400, 300)}
+
+
+def write_csv(path, rows):
+    path.write_text(HEADER + "".join(row + "\n" for row in rows))
+    return str(path)
+
+
+def annotations(tmp_path):
+    return read_annotations(write_csv(tmp_path / "out.csv", [
+        "toy/a-tr_line.png,2,cup,50,25,20,10",
+        "toy/a-tr_line.png,1,toy,100.5,50,41,30",
+        "toy/b-tr_line.png,2,cup,200,150,100,60",
+        "toy/unknown-tr_line.png,1,toy,10,10,10,10",  # No size: left out of every export
+        "toy/b-tr_line.png,,,5,5,10,10",              # Unlabelled rows are never read
+    ]))
+
+
+def test_coco(tmp_path):
+    out_path = str(tmp_path / "coco" / "annotations.json")
+    assert write_coco(annotations(tmp_path), SIZES, out_path) == 3
+    with open(out_path) as f:
+        coco = json.load(f)
+    assert coco["categories"] == [{"id": 1, "name": "toy"}, {"id": 2, "name": "cup"}]
+    assert coco["images"] == [{"id": 1, "file_name": "toy/a-tr_line.png", "width": 200, "height": 100},
+                              {"id": 2, "file_name": "toy/b-tr_line.png", "width": 400, "height": 300}]
+    first, second, third = coco["annotations"]
+    assert first == {"id": 1, "image_id": 1, "category_id": 2, "bbox": [40.0, 20.0, 20.0, 10.0],
+                     "area": 200.0, "iscrowd": 0}
+    assert second["bbox"] == [80.0, 35.0, 41.0, 30.0]
+    assert (third["image_id"], third["bbox"]) == (2, [150.0, 120.0, 100.0, 60.0])
+
+
+def test_yolo(tmp_path):
+    out_dir = tmp_path / "yolo"
+    assert write_yolo(annotations(tmp_path), SIZES, str(out_dir)) == 3
+    assert (out_dir / "classes.txt").read_text() == "toy\ncup\n"
+    assert (out_dir / "toy" / "a-tr_line.txt").read_text() == (
+        "1 0.250000 0.250000 0.100000 0.100000\n"
+        "0 0.502500 0.500000 0.205000 0.300000\n")
+    assert (out_dir / "toy" / "b-tr_line.txt").read_text() == "1 0.500000 0.500000 0.250000 0.200000\n"
+    assert not (out_dir / "toy" / "unknown-tr_line.txt").exists()
+
+
+def test_voc(tmp_path):
+    out_dir = tmp_path / "voc"
+    assert write_voc(annotations(tmp_path), SIZES, str(out_dir)) == 3
+    root = ElementTree.parse(str(out_dir / "toy" / "a-tr_line.xml")).getroot()
+    assert (root.findtext("folder"), root.findtext("filename")) == ("toy", "a-tr_line.png")
+    assert (root.findtext("size/width"), root.findtext("size/height"), root.findtext("size/depth")) == ("200", "100", "3")
+    objects = root.findall("object")
+    assert [obj.findtext("name") for obj in objects] == ["cup", "toy"]
+    # Corners are rounded like the CSV writer: 100.5 - 20.5 = 80.0, 100.5 + 20.5 = 121.0
+    assert [objects[1].findtext(f"bndbox/{tag}") for tag in ("xmin", "ymin", "xmax", "ymax")] == ["80", "35", "121", "65"]
+    assert sorted(os.listdir(out_dir / "toy")) == ["a-tr_line.xml", "b-tr_line.xml"]
+
+
+def test_local_sizes_follow_file_changes(tmp_path):
+    Image.new('RGB', (32, 24)).save(tmp_path / "a.png")
+    cache = ImageSizeCache(str(tmp_path / "sizes.json"))
+    assert cache.local_sizes(["a.png", "missing.png"], str(tmp_path), workers=1) == {"a.png": (32, 24)}
+    cache.save()
+
+    reloaded = ImageSizeCache(str(tmp_path / "sizes.json"))
+    assert reloaded.cached_sizes(["a.png"], str(tmp_path)) == ({"a.png": (32, 24)}, [])
+    Image.new('RGB', (16, 16)).save(tmp_path / "a.png")
+    os.utime(tmp_path / "a.png", ns=(1, 1))
+    assert reloaded.cached_sizes(["a.png"], str(tmp_path)) == ({}, ["a.png"])
+
+
+def test_remote_sizes_are_cached_per_commit(tmp_path):
+    hub = fake_hub.start(fake_hub.synthetic_files(2, size=1000))
+    try:
+        images = hub.paths[:3]
+        cache = ImageSizeCache(str(tmp_path / "sizes.json"))
+
+        def read(revision):
+            return cache.remote_sizes(
+                images, lambda image: f"{hub.url}/datasets/{REPO_ID}/resolve/{revision}/{image}", revision)
+
+        sizes = read("c1")
+        assert sorted(sizes) == images and hub.stats["resolves"] == 3
+        assert read("c1") == sizes and hub.stats["resolves"] == 3
+        assert cache.cached_sizes(images) == ({}, images)  # No commit, nothing to trust
+
+        # A new commit may have rewritten any path, so its sizes are read again
+        assert read("c2") == sizes and hub.stats["resolves"] == 6
+        assert cache.cached_sizes(images, revision="c1") == ({}, images)
+    finally:
+        hub.shutdown()
+        hub.server_close()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import os
+
+import pytest
+import requests
+from huggingface_hub import HfApi, hf_hub_download
+
+import fake_hub
+
+REPO_ID = "0001AMA/multimodal_data_annotator_dataset"
+
+
+@pytest.fixture
+def hub():
+    server = fake_hub.start(fake_hub.synthetic_files(4, size=1000), page_size=5)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_list_repo_files_follows_pagination(hub):
+    files = HfApi(endpoint=hub.url).list_repo_files(REPO_ID, repo_type="dataset")
+    assert sorted(files) == hub.paths
+    # 12 files in 4 folders (folder0..folder3) are 16 tree entries: 4 pages of 5
+    assert hub.stats["listings"] == 4
+
+
+def test_non_recursive_tree_lists_top_level_directories(hub):
+    response = requests.get(f"{hub.url}/api/datasets/{REPO_ID}/tree/main")
+    assert [entry["path"] for entry in response.json()] == ["folder0", "folder1", "folder2", "folder3"]
+
+
+def test_hf_hub_download_and_range_requests(hub, tmp_path):
+    path = hub.paths[0]
+    local_path = hf_hub_download(REPO_ID, path, repo_type="dataset", local_dir=str(tmp_path), endpoint=hub.url)
+    with open(local_path, 'rb') as f:
+        assert f.read() == hub.files[path]
+
+    response = requests.get(f"{hub.url}/datasets/{REPO_ID}/resolve/main/{path}", headers={"Range": "bytes=0-23"})
+    assert response.status_code == 206
+    assert response.content == hub.files[path][:24]
+    assert response.headers["Content-Range"] == f"bytes 0-23/{len(hub.files[path])}"
+
+    assert requests.get(f"{hub.url}/datasets/{REPO_ID}/resolve/main/missing.png").status_code == 404
+
+
+def test_failure_injection_is_reproducible():
+    def statuses(seed):
+        server = fake_hub.start({"a.png": b"x"}, fail_rate=0.5, seed=seed)
+        try:
+            return [requests.get(f"{server.url}/datasets/{REPO_ID}/resolve/main/a.png").status_code
+                    for _ in range(20)]
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    first = statuses(seed=1)
+    assert first == statuses(seed=1)
+    assert set(first) == {200, 503}
+
+
+def test_directory_root_and_metrics(tmp_path):
+    os.makedirs(tmp_path / "toy")
+    (tmp_path / "toy" / "a-tr_line.png").write_bytes(b"png")
+    (tmp_path / ".hidden").write_bytes(b"skip")
+    server = fake_hub.start(fake_hub.scan_directory(str(tmp_path)), visits=42)
+    try:
+        assert server.paths == ["toy/a-tr_line.png"]
+        assert requests.get(f"{server.url}/datasets/{REPO_ID}/resolve/main/toy/a-tr_line.png").content == b"png"
+        assert requests.get(f"{server.url}/api/spaces/x/y/metrics").json() == {"all_time_visits": 42}
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import threading
+
+import pytest
+from huggingface_hub import hf_hub_download
+
+import fake_hub
+import http_client
+from http_client import HostBusy, HttpClient
+
+REPO_ID = "0001AMA/multimodal_data_annotator_dataset"
+FILES = {"toy/a-tr_line.png": b"a" * 1000}
+
+
+def resolve_url(hub, path="toy/a-tr_line.png"):
+    return f"{hub.url}/datasets/{REPO_ID}/resolve/main/{path}"
+
+
+@pytest.fixture
+def hub():
+    hub = fake_hub.start(FILES)
+    try:
+        yield hub
+    finally:
+        hub.shutdown()
+        hub.server_close()
+
+
+def test_failing_gets_are_retried_then_returned(hub):
+    hub.fail_rate = 1.0
+    client = HttpClient(retries=2, backoff=0)
+    response = client.get(resolve_url(hub))
+    assert response.status_code == 503
+    assert hub.stats["resolves"] == 3  # The first try and two retries
+    assert client.counters()["requests"] == 1
+
+    hub.fail_rate = 0.0
+    assert client.get(resolve_url(hub)).content == FILES["toy/a-tr_line.png"]
+
+
+def test_a_saturated_host_raises_host_busy(hub):
+    hub.latency = 0.5
+    client = HttpClient(host_limit=1)
+    first = threading.Thread(target=client.get, args=(resolve_url(hub),))
+    first.start()
+    try:
+        while not hub.stats["in_flight"]:
+            threading.Event().wait(0.01)
+        with pytest.raises(HostBusy):
+            client.get(resolve_url(hub), acquire_timeout=0.05)
+    finally:
+        first.join()
+    # The slot is free again once the first request finishes
+    assert client.get(resolve_url(hub)).status_code == 200
+
+
+def test_errors_are_counted(hub):
+    client = HttpClient(retries=0)
+    hub.shutdown()
+    hub.server_close()
+    with pytest.raises(http_client.requests.ConnectionError):
+        client.get(resolve_url(hub), timeout=1)
+    assert client.counters()["errors"] == 1
+
+
+def test_hub_downloads_show_up_in_the_report(hub, tmp_path):
+    assert http_client.share_with_hf_hub()
+    before = http_client.report()["hub_requests"]
+    path = hf_hub_download(REPO_ID, "toy/a-tr_line.png", repo_type="dataset", endpoint=hub.url,
+                           cache_dir=str(tmp_path))
+    with open(path, 'rb') as f:
+        assert f.read() == FILES["toy/a-tr_line.png"]
+    assert http_client.report()["hub_requests"] > before
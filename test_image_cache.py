@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import os
+
+import image_cache
+from image_cache import ContentCache
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_duplicates_share_one_object(tmp_path):
+    cache = ContentCache(str(tmp_path / "cache"), max_bytes=1000)
+    src = tmp_path / "download"
+    first = cache.put("toy/a-tr_line.png", write(src, b"x" * 100))
+    second = cache.put("toy/b-tr_line.png", write(src, b"x" * 100), move=True)
+
+    assert not src.exists()
+    assert cache.get("toy/a-tr_line.png") == first
+    assert open(second, 'rb').read() == b"x" * 100
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    report = cache.report()
+    assert (report["objects"], report["paths"], report["bytes"], report["dedup_hits"]) == (1, 2, 100, 1)
+    assert cache.get("toy/missing.png") is None
+    assert (report["hits"], cache.report()["misses"]) == (1, 1)
+
+
+def test_lru_eviction_and_reload(tmp_path):
+    root = str(tmp_path / "cache")
+    cache = ContentCache(root, max_bytes=250)
+    src = tmp_path / "download"
+    cache.put("a.png", write(src, b"a" * 100))
+    cache.put("b.png", write(src, b"b" * 100))
+    assert cache.get("a.png") is not None  # b is now least recently used
+    cache.put("c.png", write(src, b"c" * 100))
+
+    assert cache.get("b.png") is None
+    assert cache.report()["evictions"] == 1
+    assert cache.total_bytes == 200
+
+    reloaded = ContentCache(root, max_bytes=250)
+    assert sorted(reloaded.paths) == ["a.png", "c.png"]
+    assert open(reloaded.get("c.png"), 'rb').read() == b"c" * 100
+
+
+def test_known_etag_links_without_a_download(tmp_path):
+    root = str(tmp_path / "cache")
+    cache = ContentCache(root, max_bytes=1000)
+    src = tmp_path / "download"
+    first = cache.put("toy/a-tr_line.png", write(src, b"x" * 100), move=True, etag="sha256-x")
+
+    assert cache.link_etag("toy/b-tr_line.png", "sha256-unknown") is None
+    second = cache.link_etag("toy/b-tr_line.png", "sha256-x")
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    assert cache.report()["etag_hits"] == 1
+
+    # Etags are forgotten with their object, and survive a reload otherwise
+    reloaded = ContentCache(root, max_bytes=1000)
+    assert reloaded.get("toy/b-tr_line.png") == second
+    assert reloaded.etags == {"sha256-x": cache.paths["toy/a-tr_line.png"]}
+    reloaded.put("toy/a-tr_line.png", write(src, b"y" * 100))
+    reloaded.put("toy/b-tr_line.png", write(src, b"y" * 100))
+    assert reloaded.etags == {} and reloaded.report()["objects"] == 1
+
+
+def test_puts_are_journaled_until_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "MIN_COMPACT_ENTRIES", 4)
+    root = tmp_path / "cache"
+    cache = ContentCache(str(root), max_bytes=250)
+    src = tmp_path / "download"
+    for name in "abc":
+        cache.put(f"{name}.png", write(src, name.encode() * 100))
+    # Three puts and one eviction so far, all in the journal
+    assert not (root / image_cache.INDEX_FILE).exists()
+    assert len((root / image_cache.JOURNAL_FILE).read_text().splitlines()) == 4
+    assert sorted(ContentCache(str(root), max_bytes=250).paths) == ["b.png", "c.png"]
+
+    cache.put("d.png", write(src, b"d" * 100))  # The fifth entry compacts; its eviction starts a new journal
+    assert (root / image_cache.INDEX_FILE).exists()
+    assert len((root / image_cache.JOURNAL_FILE).read_text().splitlines()) == 1
+    reloaded = ContentCache(str(root), max_bytes=250)
+    assert sorted(reloaded.paths) == ["c.png", "d.png"]
+    assert reloaded.total_bytes == 200
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import os
+import struct
+
+import pytest
+from PIL import Image
+
+from integrity import IntegrityCache, PngError, check_png, check_sets
+
+
+def write_png(path, size):
+    Image.effect_noise(size, 40).convert('RGB').save(path)
+    return str(path)
+
+
+def test_check_png_catches_truncation_and_corruption(tmp_path):
+    good = write_png(tmp_path / "good.png", (64, 48))
+    assert check_png(good) == (64, 48)
+    assert check_png(good, decode=True) == (64, 48)
+    data = open(good, 'rb').read()
+
+    truncated = tmp_path / "truncated.png"
+    truncated.write_bytes(data[:len(data) // 2])
+    with pytest.raises(PngError, match="truncated"):
+        check_png(str(truncated))
+
+    flipped = bytearray(data)
+    flipped[len(data) // 2] ^= 0xff
+    corrupt = tmp_path / "corrupt.png"
+    corrupt.write_bytes(bytes(flipped))
+    with pytest.raises(PngError, match="CRC mismatch in IDAT"):
+        check_png(str(corrupt))
+
+    not_png = tmp_path / "not.png"
+    not_png.write_bytes(b"<html>404</html>")
+    with pytest.raises(PngError, match="signature"):
+        check_png(str(not_png))
+
+    # A first chunk claiming 2 GiB is refused from its header, before any of it is read
+    huge = tmp_path / "huge.png"
+    huge.write_bytes(data[:8] + struct.pack('>I4s', 0x7fffffff, b'IDAT'))
+    with pytest.raises(PngError, match="first chunk is not IHDR"):
+        check_png(str(huge))
+
+
+def test_check_sets_flags_bad_sets_and_reuses_the_cache(tmp_path):
+    sizes = {'sr_int_full': (40, 30), 'tr_line': (32, 24)}
+    image_sets = []
+    for n in range(4):
+        image_set = {'file_id': f"s{n}"}
+        for view, size in sizes.items():
+            image_set[view] = write_png(tmp_path / f"s{n}-{view}.png", size)
+        image_sets.append(image_set)
+    write_png(image_sets[1]['tr_line'], (24, 32))  # Mis-sized view
+    with open(image_sets[2]['sr_int_full'], 'r+b') as f:
+        f.truncate(100)
+    os.remove(image_sets[3]['tr_line'])
+
+    cache = IntegrityCache(str(tmp_path / "integrity.json"))
+    invalid, mismatched, stats = check_sets(image_sets, lambda image: image, cache, workers=2)
+    assert sorted(invalid) == [2, 3]
+    assert invalid[2][0].startswith("sr_int_full: truncated")
+    assert invalid[3][0].startswith("tr_line: missing")
+    # A mis-sized view is reported, but the set isn't invalid
+    assert mismatched == {1: ["tr_line: 24x32, other tr_line images are 32x24"]}
+    assert (stats["checked"], stats["cached"], stats["mismatched_sets"]) == (8, 0, 1)
+
+    # A re-run only reads what changed (and what couldn't be cached: the missing file)
+    write_png(image_sets[1]['tr_line'], (32, 24))
+    invalid, mismatched, stats = check_sets(image_sets, lambda image: image,
+                                            IntegrityCache(str(tmp_path / "integrity.json")))
+    assert sorted(invalid) == [2, 3]
+    assert mismatched == {}
+    assert (stats["checked"], stats["cached"]) == (2, 6)
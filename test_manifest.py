@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+from manifest import Manifest
+from set_index import SetIndex
+
+
+def make_folder(name, count, directory=None):
+    directory = directory or name
+    return {'folder': name, 'image_sets': [
+        {'file_id': f"f{n}", 'sr_int_full': f"{directory}/f{n}-sr_int_full.png",
+         'tr_line': f"{directory}/f{n}-tr_line.png", 'tr_int_full': f"{directory}/f{n}-tr_int_full.png"}
+        for n in range(count)
+    ]}
+
+
+def folder_sets():
+    irregular = {'folder': "odd", 'image_sets': [
+        # Paths that don't follow "{dir}{file_id}-<view>.png" (loaders match suffixes only)
+        {'file_id': "x", 'sr_int_full': "odd/x-a-sr_int_full.png",
+         'tr_line': "odd/x-tr_line.png", 'tr_int_full': "odd/deeper/x-b-tr_int_full.png"},
+        {'file_id': "tëddy", 'sr_int_full': "tëddy-sr_int_full.png",
+         'tr_line': "tëddy-tr_line.png", 'tr_int_full': "tëddy-tr_int_full.png"},
+    ]}
+    return [make_folder("cup", 3), irregular, make_folder("toy", 2, directory="toy/nested")]
+
+
+def check_same(manifest, expected):
+    assert len(manifest) == len(expected)
+    assert manifest.to_folder_sets() == expected
+    for position, folder_set in enumerate(expected):
+        entry = manifest[position]
+        assert entry['folder'] == folder_set['folder']
+        assert len(entry['image_sets']) == len(folder_set['image_sets'])
+        assert entry['image_sets'][-1] == folder_set['image_sets'][-1]
+        assert entry['image_sets'][1:] == folder_set['image_sets'][1:]
+        assert entry['image_sets'] == folder_set['image_sets']
+    assert manifest[-1]['folder'] == expected[-1]['folder']
+    assert [folder_set['folder'] for folder_set in manifest] == [folder_set['folder'] for folder_set in expected]
+
+
+def test_manifest_matches_folder_sets(tmp_path):
+    expected = folder_sets()
+    manifest = Manifest.from_folder_sets(expected, {"source": "test"})
+    check_same(manifest, expected)
+    assert len(manifest.exception_keys) == 2  # Only set "x" strays from the templates
+
+    path = str(tmp_path / "manifest.bin")
+    manifest.save(path)
+    loaded = Manifest.load(path)
+    check_same(loaded, expected)
+    assert loaded.meta == {"source": "test"}
+
+
+def test_path_lookups():
+    expected = folder_sets()
+    manifest = Manifest.from_folder_sets(expected)
+    paths = [image_set[view] for folder_set in expected for image_set in folder_set['image_sets']
+             for view in ('sr_int_full', 'tr_line', 'tr_int_full')]
+    assert list(manifest.image_to_set) == paths
+    assert manifest.find("odd/deeper/x-b-tr_int_full.png") == (3, 'tr_int_full')
+    assert "toy/nested/f1-tr_line.png" in manifest.image_to_set
+    assert "toy/f1-tr_line.png" not in manifest.image_to_set
+    assert manifest.image_to_set.get("missing.png") is None
+
+
+def test_set_index_over_manifest_behaves_the_same():
+    labels = [{"image": "cup/f0-tr_line.png", "id": "1", "name": "cup"},
+              {"image": "odd/x-a-sr_int_full.png", "id": "2", "name": "cup"},
+              {"image": "toy/nested/f0-sr_int_full.png", "id": "", "name": ""}]
+    from_dicts = SetIndex(folder_sets(), labels)
+    from_manifest = SetIndex(Manifest.from_folder_sets(folder_sets()), labels)
+
+    assert len(from_manifest) == len(from_dicts) == 7
+    assert from_manifest.offsets == from_dicts.offsets
+    assert [from_manifest.locate(i) for i in range(7)] == [from_dicts.locate(i) for i in range(7)]
+    assert from_manifest.unlabelled == from_dicts.unlabelled
+    assert list(from_manifest.image_sets) == from_dicts.image_sets
+    assert from_manifest.next_unlabelled(3) == from_dicts.next_unlabelled(3) == 4
+    from_manifest.refresh("cup/f1-sr_int_full.png", lambda image: labels[:1] if image == "cup/f1-tr_line.png" else [])
+    assert from_manifest.unlabelled[1] == 0
+
+
+def test_replace_folders_copies_untouched_folders_and_maps_sets():
+    original = folder_sets()
+    manifest = Manifest.from_folder_sets(original, {"source": "test"})
+    cup = original[0]['image_sets'][1:] + make_folder("cup", 4)['image_sets'][3:]
+    updated, folder_map, set_map = manifest.replace_folders({0: cup, 1: []}, [make_folder("new", 2)])
+
+    expected = [{'folder': "cup", 'image_sets': cup}, original[2], make_folder("new", 2)]
+    assert updated.to_folder_sets() == expected
+    assert updated.meta == {"source": "test"}
+    assert folder_map.tolist() == [0, -1, 1]
+    assert set_map.tolist() == [-1, 0, 1, -1, -1, 3, 4]  # f1, f2 of "cup" keep their identity
+    assert updated.find("toy/nested/f1-tr_line.png") == (4, 'tr_line')
+    assert updated.find("odd/x-tr_line.png") is None
+    assert len(updated.exception_keys) == 0
+
+    readded, _, _ = updated.replace_folders({}, [original[1]])
+    assert readded.to_folder_sets() == expected + [original[1]]
+    assert readded.find("odd/deeper/x-b-tr_int_full.png") == (7, 'tr_int_full')
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import proposals
+from proposals import PROPOSERS, ProposalEngine, register_proposer
+from spatial_index import center_to_corners, iou
+
+
+def write_square(path, box=(80, 40, 140, 100), size=(256, 192)):
+    """Dark noisy image with one bright square at box (x0, y0, x1, y1)"""
+    rng = np.random.default_rng(0)
+    pixels = (rng.random((size[1], size[0])) * 20).astype(np.uint8)
+    x0, y0, x1, y1 = box
+    pixels[y0:y1, x0:x1] = 230
+    Image.fromarray(pixels).save(path)
+    return str(path)
+
+
+@pytest.mark.parametrize("method", ["saliency", "contour"])
+def test_proposers_find_the_object(tmp_path, method):
+    square = (80, 40, 140, 100)
+    boxes = PROPOSERS[method](write_square(tmp_path / "square.png", square))
+    assert 0 < len(boxes) <= proposals.MAX_PROPOSALS
+    corners = [center_to_corners(*box[:4]) for box in boxes]
+    # In original pixels, inside the image, best first, and at least one of them on the square
+    assert all(0 <= x0 and 0 <= y0 and x1 <= 256 and y1 <= 192 for x0, y0, x1, y1 in corners)
+    assert [box[4] for box in boxes] == sorted((box[4] for box in boxes), reverse=True)
+    assert max(iou(square, box) for box in corners) > 0
+
+
+def test_components_and_registration():
+    mask = np.zeros((6, 6), dtype=bool)
+    mask[0:2, 0:2] = True
+    mask[3:6, 4] = True
+    assert sorted(proposals._components(mask)) == [(0, 0, 2, 2, 4), (4, 3, 5, 6, 3)]
+
+    @register_proposer("test-fixed")
+    def fixed(path):
+        return [(1.0, 2.0, 3.0, 4.0, 0.5)]
+    try:
+        assert PROPOSERS["test-fixed"] is fixed
+    finally:
+        del PROPOSERS["test-fixed"]
+    with pytest.raises(ValueError, match="Unknown proposer"):
+        ProposalEngine("missing")
+
+
+def wait_for(engine, path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        boxes = engine.cached(path)
+        if boxes is not None:
+            return boxes
+        time.sleep(0.05)
+    raise AssertionError(f"No proposals for {path} within {timeout}s")
+
+
+def test_engine_caches_by_content(tmp_path):
+    engine = ProposalEngine("contour", cache_dir=str(tmp_path / "cache"), workers=1)
+    try:
+        first = write_square(tmp_path / "a.png")
+        assert engine.cached(first) is None
+        engine.prefetch([first, None])
+        boxes = wait_for(engine, first)
+        assert boxes == [list(box) for box in PROPOSERS["contour"](first)]
+
+        # Identical bytes under another path share the cached result without being computed again
+        copy = tmp_path / "b.png"
+        copy.write_bytes(open(first, 'rb').read())
+        assert engine.cached(str(copy)) == boxes
+        assert len(os.listdir(tmp_path / "cache")) == 1
+
+        # A rewritten file is hashed again
+        write_square(first, box=(10, 10, 60, 60))
+        os.utime(first, ns=(1, 1))
+        assert engine.cached(first) is None
+    finally:
+        engine.shutdown()
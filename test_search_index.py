@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+from search_index import SearchIndex
+from set_index import SetIndex
+
+
+def make_folder(name, file_ids):
+    return {'folder': name, 'image_sets': [
+        {'file_id': file_id, 'sr_int_full': f"{name}/{file_id}-sr_int_full.png",
+         'tr_line': f"{name}/{file_id}-tr_line.png", 'tr_int_full': f"{name}/{file_id}-tr_int_full.png"}
+        for file_id in file_ids
+    ]}
+
+
+def build():
+    folder_sets = [
+        make_folder("toy", ["NOBJ__pu_pm15dtsn_x_bd_av1_randist___teddy__1",
+                            "NOBJ__pu_pm15dtsn_x_bd_av10_randist___teddy_back__17"]),
+        make_folder("WGF", ["WGF__pu_pm15dtsn_x_bd_av1_280cm_____75"]),
+    ]
+    labels = [{"image": "toy/NOBJ__pu_pm15dtsn_x_bd_av1_randist___teddy__1-tr_line.png", "id": "1", "name": "toy"},
+              {"image": "toy/NOBJ__pu_pm15dtsn_x_bd_av1_randist___teddy__1-tr_line.png", "id": "2", "name": "teddy bear"}]
+    set_index = SetIndex(folder_sets, labels)
+    return set_index, SearchIndex(set_index, labels)
+
+
+def test_token_substring_and_field_queries():
+    _, search = build()
+    assert search.search("teddy") == [0, 1]
+    assert search.search("av10") == [1]
+    assert search.search("av1") == [0, 1, 2]
+    assert search.search("280cm folder:wgf") == [2]
+    assert search.search("teddy_back") == [1]
+    assert search.search("class:toy") == [0]
+    assert search.search("class:Teddy_Bear") == [0]
+    assert search.search("status:unlabelled teddy") == [1]
+    assert search.search("nothing") == []
+
+
+def test_class_postings_follow_label_changes():
+    set_index, search = build()
+    image = "WGF/WGF__pu_pm15dtsn_x_bd_av1_280cm_____75-sr_int_full.png"
+    search.refresh(image, lambda i: [{"id": "2", "name": "tile"}] if i == image else [])
+    assert search.search("class:tile") == [2]
+    search.refresh(image, lambda i: [])
+    assert search.search("class:tile") == []
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+from set_index import SetIndex
+
+
+def make_folder(name, count):
+    return {'folder': name, 'image_sets': [
+        {'file_id': f"{name}{n}", 'sr_int_full': f"{name}/{n}sr_int_full.png",
+         'tr_line': f"{name}/{n}-tr_line.png", 'tr_int_full': f"{name}/{n}-tr_int_full.png"}
+        for n in range(count)
+    ]}
+
+
+def test_locate_and_folder_lookup():
+    index = SetIndex([make_folder("cup", 3), make_folder("empty", 0), make_folder("toy", 2)])
+    assert len(index) == 5
+    assert index.locate(0) == (0, 0)
+    assert index.locate(3) == (2, 0)
+    assert index.locate(4) == (2, 1)
+    assert index.global_index(2, 1) == 4
+    assert index.folder_start("toy") == 3
+    assert index.folder_start("missing") is None
+
+
+def test_next_unlabelled_tracks_labels():
+    labels = [{"image": "cup/0-tr_line.png", "id": "1", "name": "cup"},
+              {"image": "cup/1sr_int_full.png", "id": "", "name": ""}]
+    index = SetIndex([make_folder("cup", 3), make_folder("toy", 2)], labels)
+    assert index.unlabelled_count == 4
+    assert index.next_unlabelled(0) == 1
+
+    by_image = {}
+    for n in (1, 2):
+        by_image[f"cup/{n}-tr_int_full.png"] = [{"id": "1", "name": "cup"}]
+        index.refresh(f"cup/{n}-tr_int_full.png", lambda image: by_image.get(image, []))
+    assert index.next_unlabelled(0) == 3
+
+    for n in range(5):
+        index.set_labelled(n, True)
+    assert index.next_unlabelled(2) is None
+    index.set_labelled(1, False)
+    assert index.next_unlabelled(4) == 1
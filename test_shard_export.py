@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import json
+import tarfile
+import threading
+
+import pytest
+
+import shard_export
+from dataset_schema import DEFAULT_SCHEMA
+from shard_export import export_shards
+
+
+def make_folder_sets(folders, sets_per_folder):
+    folder_sets = []
+    for folder in folders:
+        names = [f"{folder}/s{n}-{view}.png" for n in range(sets_per_folder) for view in DEFAULT_SCHEMA.views]
+        folder_sets.append({'folder': folder, 'image_sets': DEFAULT_SCHEMA.image_sets(names)[0]})
+    return folder_sets
+
+
+def read_bytes(path):
+    return path.encode() * 10
+
+
+def test_samples_roll_over_into_shards(tmp_path):
+    folder_sets = make_folder_sets(["cup", "toy"], 3)
+    annotations = [{"image": "cup/s1-tr_line.png", "id": "2", "name": "cup",
+                    "centerX": 10.0, "centerY": 20.0, "width": 30.0, "height": 40.0}]
+    shards = export_shards(folder_sets, annotations, read_bytes, str(tmp_path), samples_per_shard=4,
+                           workers=2, queue_size=2)
+    assert [(shard["file"], shard["samples"]) for shard in shards] == [("shard-000000.tar", 4), ("shard-000001.tar", 2)]
+    assert json.loads((tmp_path / "shards.json").read_text())["views"] == DEFAULT_SCHEMA.views
+
+    with tarfile.open(str(tmp_path / "shard-000000.tar")) as tar:
+        names = tar.getnames()
+        assert names[:4] == ["cup/s0.sr_int_full.png", "cup/s0.tr_line.png", "cup/s0.tr_int_full.png", "cup/s0.json"]
+        assert tar.extractfile("cup/s1.tr_line.png").read() == read_bytes("cup/s1-tr_line.png")
+        record = json.load(tar.extractfile("cup/s1.json"))
+    assert record["boxes"]["tr_line"] == [{"id": 2, "name": "cup", "centerX": 10.0, "centerY": 20.0,
+                                           "width": 30.0, "height": 40.0}]
+    assert record["boxes"]["sr_int_full"] == []
+
+
+def test_read_errors_are_raised_after_the_shards_close(tmp_path):
+    def failing_read(path):
+        if path.startswith("toy/s2"):
+            raise OSError("unreadable")
+        return read_bytes(path)
+
+    with pytest.raises(OSError, match="unreadable"):
+        export_shards(make_folder_sets(["toy"], 5), [], failing_read, str(tmp_path), workers=1, queue_size=2)
+    assert not (tmp_path / "shards.json").exists()
+    assert not list(tmp_path.glob("*.tmp"))
+    # The shard open when the read failed is incomplete, so it is deleted rather than published
+    assert not list(tmp_path.glob("shard-*.tar"))
+
+
+def test_a_failing_writer_stops_the_producer(tmp_path, monkeypatch):
+    monkeypatch.setattr(shard_export, "PUT_POLL_INTERVAL", 0.01)
+    written = []
+
+    def write(self, key, files):
+        if len(written) == 2:
+            raise OSError("disk full")
+        written.append(key)
+
+    monkeypatch.setattr(shard_export.ShardWriter, "write", write)
+    before = set(threading.enumerate())
+    with pytest.raises(OSError, match="disk full"):
+        # Far more sets than the queue holds, so the producer is blocked on a full queue when the writer fails
+        export_shards(make_folder_sets(["toy"], 50), [], read_bytes, str(tmp_path), workers=2, queue_size=2)
+    assert written == ["toy/s0", "toy/s1"]
+    assert not list(tmp_path.glob("shard-*"))
+    assert not [thread for thread in set(threading.enumerate()) - before if thread.is_alive()]
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+import pytest
+
+from single_flight import DownloadLimiter, Overloaded, SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def slow_download():
+        calls.append(1)
+        release.wait(5)
+        return "/cache/a.png"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("a.png", slow_download)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flight.stats["leaders"] + flight.stats["coalesced"] < 5:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ["/cache/a.png"] * 5
+    assert flight.stats == {"leaders": 1, "coalesced": 4}
+    assert flight.in_flight() == 0
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("a.png", lambda: (_ for _ in ()).throw(ValueError("hub down")))
+    assert flight.do("a.png", lambda: "ok") == "ok"
+
+
+def test_limiter_sheds_beyond_queue():
+    limiter = DownloadLimiter(max_concurrent=1, max_queue=0, wait_timeout=0.05)
+    with limiter:
+        with pytest.raises(Overloaded):
+            with limiter:
+                pass
+    assert limiter.report()["shed"] == 1
+
+    limiter = DownloadLimiter(max_concurrent=1, max_queue=1, wait_timeout=0.05)
+    with limiter:
+        with pytest.raises(Overloaded):
+            with limiter:
+                pass
+    assert limiter.report()["timed_out"] == 1
+    with limiter:
+        assert limiter.report()["active"] == 1
+
+
+def test_coalesced_waiters_count_against_the_queue():
+    limiter = DownloadLimiter(max_concurrent=1, max_queue=1, wait_timeout=0.2)
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_download():
+        started.set()
+        release.wait(5)
+        return "/cache/a.png"
+
+    leader = threading.Thread(target=flight.do, args=("a.png", slow_download, limiter))
+    leader.start()
+    started.wait(5)
+    # The only queue place goes to a waiter that gives up after wait_timeout
+    errors = []
+    waiter = threading.Thread(target=lambda: errors.append(pytest.raises(Overloaded, flight.do, "a.png",
+                                                                         slow_download, limiter)))
+    waiter.start()
+    while limiter.report()["waiting"] < 1:
+        time.sleep(0.001)
+    with pytest.raises(Overloaded):
+        flight.do("a.png", slow_download, limiter)  # Queue full: shed without waiting
+    waiter.join()
+    assert len(errors) == 1
+    assert (limiter.report()["shed"], limiter.report()["timed_out"], limiter.report()["waiting"]) == (1, 1, 0)
+
+    release.set()
+    leader.join()
+    assert flight.do("a.png", lambda: "ok", limiter) == "ok"
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+from spatial_index import SpatialIndex, dedupe_labels
+
+
+def make_label(image, center_x, center_y, width, height, name="toy"):
+    return {"image": image, "name": name, "centerX": center_x, "centerY": center_y,
+            "width": width, "height": height}
+
+
+def test_duplicate_and_point_queries():
+    index = SpatialIndex(cell_size=64)
+    first = make_label("toy/a-sr_int_full.png", 100, 100, 80, 60)
+    second = make_label("toy/a-sr_int_full.png", 400, 300, 50, 50)
+    index.rebuild([first, second])
+
+    assert index.find_duplicate("toy/a-sr_int_full.png", 101, 100, 80, 60) is first
+    assert index.find_duplicate("toy/a-sr_int_full.png", 140, 100, 80, 60) is None
+    assert index.find_duplicate("toy/b-sr_int_full.png", 100, 100, 80, 60) is None
+
+    assert index.near("toy/a-sr_int_full.png", 410, 310) == [second]
+    assert index.near("toy/a-sr_int_full.png", 250, 250) == []
+
+    index.discard(first)
+    assert index.find_duplicate("toy/a-sr_int_full.png", 100, 100, 80, 60) is None
+
+
+def test_dedupe_keeps_first_of_each_class():
+    labels = [
+        make_label("cup/a.png", 50, 50, 40, 40, "cup"),
+        make_label("cup/a.png", 51, 50, 40, 40, "cup"),
+        make_label("cup/a.png", 50, 50, 40, 40, "toy"),
+    ]
+    kept, removed = dedupe_labels(labels)
+    assert kept == [labels[0], labels[2]]
+    assert removed == [labels[1]]
+
+
+def test_dedupe_compares_against_the_best_same_class_box():
+    labels = [
+        make_label("cup/a.png", 50, 50, 40, 40, "cup"),
+        make_label("cup/a.png", 52, 50, 40, 40, "toy"),
+        # Overlaps the toy box best, but still duplicates the first cup box
+        make_label("cup/a.png", 52, 50, 40, 40, "cup"),
+    ]
+    kept, removed = dedupe_labels(labels)
+    assert kept == labels[:2]
+    assert removed == [labels[2]]
+
+
+def test_huge_boxes_overflow_instead_of_filling_cells():
+    index = SpatialIndex(cell_size=64)
+    huge = make_label("cup/a.png", 100000, 100000, 200000, 200000)
+    small = make_label("cup/a.png", 50, 50, 20, 20)
+    index.rebuild([huge, small])
+    grid = index.images["cup/a.png"]
+    assert len(grid.cells) == 1 and len(grid.overflow) == 1
+    assert index.near("cup/a.png", 50, 50) == [small, huge]
+    assert index.find_duplicate("cup/a.png", 100000, 100000, 200000, 200000) is huge
+
+    index.discard(huge)
+    assert not grid.overflow
+    assert index.near("cup/a.png", 5000, 5000) == []
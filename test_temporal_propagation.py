@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import numpy as np
+from PIL import Image
+
+from temporal_propagation import (estimate_shift, natural_key, ordered_image_sets, phase_correlation,
+                                  seed_from_previous)
+
+
+def make_set(file_id):
+    return {'file_id': file_id, 'sr_int_full': f"toy/{file_id}sr_int_full.png",
+            'tr_line': f"toy/{file_id}-tr_line.png", 'tr_int_full': f"toy/{file_id}-tr_int_full.png"}
+
+
+def make_label(image, center_x, center_y, width=40, height=30, name="toy", class_id="1"):
+    return {"image": image, "id": class_id, "name": name, "centerX": center_x, "centerY": center_y,
+            "width": width, "height": height}
+
+
+def test_capture_order_is_natural():
+    assert sorted(["teddy__17", "teddy__2", "teddy__1"], key=natural_key) == ["teddy__1", "teddy__2", "teddy__17"]
+    sets = [make_set(file_id) for file_id in ("teddy__19", "teddy__1", "teddy__17")]
+    assert [image_set['file_id'] for image_set in ordered_image_sets(sets)] == ["teddy__1", "teddy__17", "teddy__19"]
+
+
+def test_phase_correlation_recovers_a_shift(tmp_path):
+    rng = np.random.default_rng(0)
+    scene = rng.random((200, 200)).astype(np.float32)
+    moved = np.roll(scene, (7, -12), axis=(0, 1))
+    dx, dy, peak = phase_correlation(scene, moved)
+    assert (dx, dy) == (-12.0, 7.0) and peak > 0.05
+
+    # Estimated on images downsampled to 256px and scaled back to original pixels
+    big = np.kron(rng.random((128, 128)), np.ones((4, 4)))
+    Image.fromarray((big * 255).astype(np.uint8)).save(tmp_path / "prev.png")
+    Image.fromarray((np.roll(big, 8, axis=1) * 255).astype(np.uint8)).save(tmp_path / "next.png")
+    dx, dy = estimate_shift(str(tmp_path / "prev.png"), str(tmp_path / "next.png"))
+    assert (dx, dy) == (8.0, 0.0)
+
+
+def test_seeds_unlabelled_views_from_the_last_labelled_set():
+    sets = [make_set(file_id) for file_id in ("teddy__17", "teddy__1", "teddy__19", "teddy__2")]
+    labels = [
+        make_label("toy/teddy__1sr_int_full.png", 100, 100),
+        make_label("toy/teddy__17sr_int_full.png", 200, 150, name="cup", class_id="2"),
+        make_label("toy/teddy__2-tr_line.png", 50, 60),
+        dict(make_label("toy/teddy__19sr_int_full.png", 10, 10), id="", name=""),  # Unlabelled box
+    ]
+    proposals = seed_from_previous(sets, labels, refine=False)
+    seeded = {(proposal["image"], proposal["suggested_name"], proposal["centerX"]) for proposal in proposals}
+    assert seeded == {
+        ("toy/teddy__2sr_int_full.png", "toy", 100.0),   # From teddy__1
+        ("toy/teddy__17-tr_line.png", "toy", 50.0),      # From teddy__2
+        ("toy/teddy__19-tr_line.png", "toy", 50.0),
+    }
+    assert all(proposal["proposal"] == "temporal" and proposal["id"] == "" for proposal in proposals)
+
+    # With only_empty=False, views that only have unlabelled boxes are seeded too
+    proposals = seed_from_previous(sets, labels, refine=False, only_empty=False)
+    assert ("toy/teddy__19sr_int_full.png", "cup") in {(p["image"], p["suggested_name"]) for p in proposals}
+
+
+def test_refinement_shifts_seeds_and_survives_missing_images(tmp_path):
+    rng = np.random.default_rng(1)
+    scene = np.kron(rng.random((64, 64)), np.ones((4, 4)))
+    Image.fromarray((scene * 255).astype(np.uint8)).save(tmp_path / "a.png")
+    Image.fromarray((np.roll(scene, (4, 0), axis=(0, 1)) * 255).astype(np.uint8)).save(tmp_path / "b.png")
+    sets = [{'file_id': "s1", 'rgb': "a.png"}, {'file_id': "s2", 'rgb': "b.png"}, {'file_id': "s3", 'rgb': "c.png"}]
+    labels = [make_label("a.png", 100, 100)]
+
+    paths = {"a.png": str(tmp_path / "a.png"), "b.png": str(tmp_path / "b.png")}
+    proposals = seed_from_previous(sets, labels, resolve_path=paths.get)
+    assert [(p["image"], p["centerX"], p["centerY"]) for p in proposals] == [("b.png", 100.0, 104.0),
+                                                                             ("c.png", 100.0, 100.0)]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+import os
+
+from PIL import Image
+
+import thumbnails
+from thumbnails import ThumbnailCache, box_color, build_sprite, cell_origin, page_count, page_slice, sprite_size
+
+
+def test_page_and_cell_layout():
+    assert (page_count(0), page_count(48), page_count(49)) == (1, 1, 2)
+    assert page_slice(list(range(100)), 2) == [96, 97, 98, 99]
+    # Four sets per row, three 128px views per set
+    assert cell_origin(0) == (0, 0)
+    assert cell_origin(5) == (384, 128)
+    assert sprite_size(5) == (1536, 256)
+    assert sprite_size(2, n_views=2) == (512, 128)
+    assert sprite_size(0) == (128, 128)
+    assert box_color("cup") == box_color("cup") != box_color("toy")
+
+
+def test_thumbnails_are_cached_until_the_file_changes(tmp_path):
+    source = tmp_path / "a.png"
+    Image.new('RGB', (640, 320), (200, 0, 0)).save(source)
+    cache = ThumbnailCache(str(tmp_path / "cache"), side=64)
+    thumb, original = cache.thumbnail(str(source))
+    assert (thumb.size, original) == ((64, 32), (640, 320))
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    cached, original = cache.thumbnail(str(source))
+    assert (cached.size, original) == ((64, 32), (640, 320))
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    Image.new('RGB', (100, 200)).save(source)
+    os.utime(source, ns=(1, 1))
+    assert cache.thumbnail(str(source))[1] == (100, 200)
+    assert len(os.listdir(tmp_path / "cache")) == 2
+
+
+def test_sprite_draws_boxes_and_skips_missing_views(tmp_path):
+    for name, color in (("s-rgb.png", (0, 0, 200)), ("s-depth.png", (0, 200, 0))):
+        Image.new('RGB', (256, 256), color).save(tmp_path / name)
+    image_sets = [{'file_id': "s", 'rgb': "s-rgb.png", 'depth': "s-depth.png"},
+                  {'file_id': "t", 'rgb': "t-rgb.png", 'depth': "t-depth.png"}]
+    boxes = {"s-rgb.png": [{"name": "cup", "centerX": 128, "centerY": 128, "width": 128, "height": 128}]}
+
+    def resolve(image):
+        path = tmp_path / image
+        return str(path) if path.exists() else None
+
+    cache = ThumbnailCache(str(tmp_path / "cache"), side=32)
+    sprite = build_sprite(image_sets, resolve, boxes, cache, columns=2, workers=2)
+    assert sprite.size == (128, 32)
+    pixels = sprite.load()
+    # The box outline (64x64 at scale 1/8: corners 8..24) is drawn in the class color over the rgb view
+    assert max(abs(a - b) for a, b in zip(pixels[8, 16], box_color("cup"))) < 40
+    assert pixels[16, 16][2] > 150
+    assert pixels[48, 16][1] > 150          # depth view, no boxes
+    assert pixels[80, 16] == thumbnails.BACKGROUND  # set t has no images
+    assert thumbnails.encode_sprite(sprite)[:3] == b'\xff\xd8\xff'
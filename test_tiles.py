@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+from PIL import Image
+
+import tiles
+
+
+def write_image(path, width, height):
+    img = Image.new('RGB', (width, height))
+    img.frombytes(bytes((x + 3 * y + c * 85) % 256 for y in range(height) for x in range(width) for c in range(3)))
+    img.save(path)
+    return str(path), img
+
+
+def test_layout():
+    assert tiles.level_count(1000, 300) == 11  # 1000 px needs 10 halvings to reach 1 px
+    assert tiles.level_size(1000, 300, 9, 11) == (500, 150)
+    assert tiles.level_size(1001, 301, 9, 11) == (501, 151)
+    assert tiles.min_level(1000, 300) == 8  # 250x75
+    assert tiles.min_level(200, 100) == tiles.level_count(200, 100) - 1
+
+
+def test_pyramid_tiles_reassemble_each_level(tmp_path):
+    path, original = write_image(tmp_path / "a-tr_line.png", 1000, 300)
+    cache = tiles.TileCache(str(tmp_path / "tiles"))
+    info = cache.info(path)
+    assert (info["width"], info["height"], info["levels"], info["min_level"]) == (1000, 300, 11, 8)
+
+    top = Image.new('RGB', (1000, 300))
+    for row in range(2):
+        for col in range(4):
+            with Image.open(cache.tile(path, 10, col, row)) as tile:
+                top.paste(tile, (col * 256, row * 256))
+    assert top.tobytes() == original.tobytes()
+
+    with Image.open(cache.tile(path, 9, 1, 0)) as tile:
+        assert tile.size == (500 - 256, 150)
+    with Image.open(cache.tile(path, 8, 0, 0)) as tile:
+        assert tile.size == (250, 75)
+
+    assert cache.tile(path, 7, 0, 0) is None
+    assert cache.tile(path, 11, 0, 0) is None
+    assert cache.tile(path, 10, 4, 0) is None
+    assert cache.report()["builds"] == 1
+
+
+def test_reload_and_eviction(tmp_path):
+    first, _ = write_image(tmp_path / "a.png", 600, 300)
+    second, _ = write_image(tmp_path / "b.png", 600, 300)
+    root = str(tmp_path / "tiles")
+    cache = tiles.TileCache(root)
+    cache.info(first)
+
+    reloaded = tiles.TileCache(root)
+    assert reloaded.info(first)["levels"] == 11
+    assert reloaded.report()["builds"] == 0
+
+    small = tiles.TileCache(root, max_bytes=reloaded.report()["bytes"])
+    small.info(second)
+    assert small.report()["evictions"] == 1
+    assert small.report()["pyramids"] == 1
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import io
+import random
+
+from PIL import Image
+
+import fake_hub
+import transcode
+
+BROWSER_ACCEPT = "image/avif,image/webp,image/apng,image/*,*/*;q=0.8"
+FORMATS = ["image/avif", "image/webp"]
+
+
+def test_negotiate():
+    assert transcode.negotiate(BROWSER_ACCEPT, FORMATS) == "image/avif"
+    assert transcode.negotiate(BROWSER_ACCEPT, FORMATS, lossless=True) == "image/webp"
+    assert transcode.negotiate("image/avif;q=0, image/webp", FORMATS) == "image/webp"
+    assert transcode.negotiate("*/*", FORMATS) is None
+    assert transcode.negotiate(None, FORMATS) is None
+    assert transcode.clamp_quality("42") == 40
+    assert transcode.clamp_quality(5) == transcode.MIN_QUALITY
+
+
+def test_view_of():
+    assert transcode.view_of("toy/a-tr_int_full.png") == "tr_int_full"
+    assert transcode.view_of("toy/asr_int_full.png") == "sr_int_full"
+    assert transcode.view_of("toy/a.png") is None
+
+
+def test_variants_are_cached_per_quality(tmp_path):
+    path = tmp_path / "set00000-sr_int_full.png"
+    path.write_bytes(fake_hub.scene_png("x", "sr_int_full.png"))
+    cache = transcode.TranscodeCache(str(tmp_path / "variants"))
+
+    low = cache.variant(str(path), "image/webp", quality=40)
+    high = cache.variant(str(path), "image/webp", quality=90)
+    assert low != high
+    assert cache.variant(str(path), "image/webp", quality=40) == low
+    with Image.open(low) as img:
+        assert (img.format, img.size) == ("WEBP", (640, 480))
+    assert cache.report()["transcodes"] == 2 and cache.report()["hits"] == 1
+
+    reloaded = transcode.TranscodeCache(str(tmp_path / "variants"))
+    assert reloaded.variant(str(path), "image/webp", quality=90) == high
+    assert reloaded.report()["transcodes"] == 0
+
+
+def test_lossless_keeps_pixels_and_larger_variants_fall_back(tmp_path):
+    plot = tmp_path / "set00000-tr_line.png"
+    plot.write_bytes(fake_hub.scene_png("x", "-tr_line.png"))
+    cache = transcode.TranscodeCache(str(tmp_path / "variants"))
+    variant = cache.variant(str(plot), "image/webp", lossless=True)
+    with Image.open(variant) as img, Image.open(plot) as original:
+        assert img.convert("RGB").tobytes() == original.convert("RGB").tobytes()
+
+    # 1-bit noise: a few KiB as PNG, far more as lossy WebP
+    bits = tmp_path / "bits.png"
+    buffer = io.BytesIO()
+    Image.frombytes("1", (200, 200), random.Random(0).getrandbits(200 * 200).to_bytes(5000, "little")).save(buffer, format="PNG")
+    bits.write_bytes(buffer.getvalue())
+    assert cache.variant(str(bits), "image/webp", quality=95) is None
+    assert cache.variant(str(bits), "image/webp", quality=95) is None
+    assert cache.report()["not_smaller"] == 1
+
+    cache.record_served(str(plot), variant)
+    cache.record_served(str(bits), None)
+    report = cache.report()
+    assert report["source_bytes"] == plot.stat().st_size + bits.stat().st_size
+    assert 0 < report["saved_fraction"] < 1
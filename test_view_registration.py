@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import numpy as np
+import pytest
+
+from spatial_index import SpatialIndex
+from view_registration import ViewRegistration, propagate_to_views
+
+IMAGE_SET = {'file_id': "s", 'sr_int_full': "toy/ssr_int_full.png", 'tr_line': "toy/s-tr_line.png",
+             'tr_int_full': "toy/s-tr_int_full.png"}
+SIZES = {"toy/ssr_int_full.png": (640, 480), "toy/s-tr_line.png": (320, 240), "toy/s-tr_int_full.png": (320, 540)}
+
+
+def make_label(image, center_x, center_y, width, height, name="toy", class_id="1"):
+    return {"image": image, "id": class_id, "name": name, "centerX": center_x, "centerY": center_y,
+            "width": width, "height": height}
+
+
+def test_projection_scales_views_and_skips_the_crop_band():
+    registration = ViewRegistration()
+    box = [[320.0, 240.0, 64.0, 48.0]]
+    assert np.allclose(registration.project(box, 'sr_int_full', (640, 480), 'tr_line', (320, 240)),
+                       [[160.0, 120.0, 32.0, 24.0]])
+    # tr_int_full's scene is rows 150..390 of 540
+    assert np.allclose(registration.project(box, 'sr_int_full', (640, 480), 'tr_int_full', (320, 540)),
+                       [[160.0, 270.0, 32.0, 24.0]])
+    back = registration.project([[160.0, 270.0, 32.0, 24.0]], 'tr_int_full', (320, 540), 'sr_int_full', (640, 480))
+    assert np.allclose(back, box)
+    assert registration.project([], 'sr_int_full', (640, 480), 'tr_line', (320, 240)).shape == (0, 4)
+
+
+def test_short_cropped_views_use_their_full_height():
+    registration = ViewRegistration()
+    for height in (300, 200):
+        projected = registration.project([[100.0, 100.0, 20.0, 20.0]], 'tr_int_full', (200, height),
+                                         'tr_line', (200, height))
+        assert np.all(np.isfinite(projected))
+        assert np.allclose(projected, [[100.0, 100.0, 20.0, 20.0]])
+    with pytest.raises(ValueError, match="no area"):
+        registration.to_scene('tr_line', (0, 240))
+
+
+def test_overrides_are_applied_in_normalized_coordinates():
+    registration = ViewRegistration({'tr_line': [[1, 0, 0.25], [0, 1, 0]]})
+    projected = registration.project([[160.0, 120.0, 32.0, 24.0]], 'tr_line', (320, 240), 'sr_int_full', (640, 480))
+    assert np.allclose(projected, [[480.0, 240.0, 64.0, 48.0]])
+
+
+def test_propagate_to_views_skips_duplicates_and_projections():
+    labelled = make_label("toy/ssr_int_full.png", 320, 240, 64, 48)
+    unlabelled = dict(make_label("toy/ssr_int_full.png", 100, 100, 20, 20), id="", name="")
+    existing = make_label("toy/s-tr_line.png", 160, 120, 32, 24)
+    index = SpatialIndex()
+    index.rebuild([labelled, unlabelled, existing])
+
+    new_labels = propagate_to_views([labelled, unlabelled], [IMAGE_SET], SIZES, ViewRegistration(), index)
+    assert [label["image"] for label in new_labels] == ["toy/s-tr_int_full.png"]
+    assert new_labels[0]["projected_from"] == "toy/ssr_int_full.png"
+    assert (new_labels[0]["centerY"], new_labels[0]["name"]) == (270.0, "toy")
+
+    # Projected boxes are not projected again, and views of unknown or empty size are skipped
+    assert propagate_to_views(new_labels, [IMAGE_SET], SIZES, ViewRegistration()) == []
+    sizes = dict(SIZES, **{"toy/s-tr_int_full.png": (0, 0)})
+    del sizes["toy/s-tr_line.png"]
+    assert propagate_to_views([labelled], [IMAGE_SET], sizes, ViewRegistration()) == []
+
+
+def test_unaccepted_proposals_do_not_block_projections():
+    labelled = make_label("toy/ssr_int_full.png", 320, 240, 64, 48)
+    proposal = dict(make_label("toy/s-tr_line.png", 160, 120, 32, 24), id="", name="", proposal="temporal")
+    index = SpatialIndex()
+    index.rebuild([labelled, proposal])
+    new_labels = propagate_to_views([labelled], [IMAGE_SET], SIZES, ViewRegistration(), index)
+    assert sorted(label["image"] for label in new_labels) == ["toy/s-tr_int_full.png", "toy/s-tr_line.png"]
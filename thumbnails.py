@@ -0,0 +1,141 @@
+"""Folder overview: lazily cached thumbnails packed into one sprite sheet per page.
+
+Each grid cell is one image set, shown as its views side by side. Boxes
+are drawn onto the sprite at request time, so the disk cache only holds plain
+thumbnails and never goes stale when labels change.
+"""
+
+import hashlib
+import io
+import math
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from dataset_schema import DEFAULT_SCHEMA, views_of
+
+VIEWS = DEFAULT_SCHEMA.views
+THUMB_SIDE = 128          # Every view is letterboxed into a THUMB_SIDE square
+GRID_COLUMNS = 4          # Image sets per sprite row
+PAGE_SIZE = 48            # Image sets per page / sprite
+BACKGROUND = (32, 32, 32)
+PROPOSAL_COLOR = (160, 160, 160)
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "thumbnail_cache")
+
+
+def page_count(n_sets, page_size=PAGE_SIZE):
+    return max(1, math.ceil(n_sets / page_size))
+
+
+def page_slice(image_sets, page, page_size=PAGE_SIZE):
+    """Image sets shown on a 0-based page"""
+    return image_sets[page * page_size:(page + 1) * page_size]
+
+
+def cell_origin(position, columns=GRID_COLUMNS, side=THUMB_SIDE, n_views=len(VIEWS)):
+    """Top-left pixel of the position-th cell of a sprite"""
+    row, col = divmod(position, columns)
+    return col * n_views * side, row * side
+
+
+def sprite_size(n_sets, columns=GRID_COLUMNS, side=THUMB_SIDE, n_views=len(VIEWS)):
+    rows = max(1, math.ceil(n_sets / columns))
+    return min(n_sets, columns) * n_views * side or side, rows * side
+
+
+def box_color(name):
+    """Stable bright color per class name"""
+    digest = hashlib.md5(name.encode('utf-8')).digest()
+    return tuple(96 + b % 160 for b in digest[:3])
+
+
+class ThumbnailCache:
+    """On-disk JPEG thumbnails keyed by source path, size and mtime"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, side=THUMB_SIDE):
+        self.cache_dir = cache_dir
+        self.side = side
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_file(self, path):
+        st = os.stat(path)
+        key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{self.side}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".jpg")
+
+    def thumbnail(self, path):
+        """Return (thumbnail RGB image, original (width, height)), generating it on first use"""
+        cache_file = self._cache_file(path)
+        try:
+            with Image.open(cache_file) as cached:
+                cached.load()
+                original = tuple(int(v) for v in cached.info.get("comment", b"").decode().split("x"))
+                if len(original) == 2:
+                    return cached.convert('RGB'), original
+        except (OSError, ValueError):
+            pass
+
+        with Image.open(path) as img:
+            original = img.size
+            img.draft('RGB', (self.side, self.side))
+            thumb = img.convert('RGB')
+            thumb.thumbnail((self.side, self.side), Image.BILINEAR)
+        tmp_file = cache_file + f".{os.getpid()}.tmp"
+        thumb.save(tmp_file, "JPEG", quality=85, comment=f"{original[0]}x{original[1]}".encode())
+        os.replace(tmp_file, cache_file)
+        return thumb, original
+
+
+def _paste_view(sprite, draw, thumb, original, origin, boxes, side):
+    """Letterbox one view thumbnail into its square and draw its boxes"""
+    offset_x = origin[0] + (side - thumb.width) // 2
+    offset_y = origin[1] + (side - thumb.height) // 2
+    sprite.paste(thumb, (offset_x, offset_y))
+    scale = thumb.width / original[0] if original[0] else 1.0
+    for label in boxes:
+        center_x, center_y = float(label["centerX"]), float(label["centerY"])
+        half_w, half_h = abs(float(label["width"])) / 2, abs(float(label["height"])) / 2
+        rect = [offset_x + (center_x - half_w) * scale, offset_y + (center_y - half_h) * scale,
+                offset_x + (center_x + half_w) * scale, offset_y + (center_y + half_h) * scale]
+        color = box_color(label["name"]) if label.get("name") else PROPOSAL_COLOR
+        draw.rectangle(rect, outline=color, width=2 if label.get("name") else 1)
+
+
+def build_sprite(image_sets, resolve_path, boxes_by_image, cache, columns=GRID_COLUMNS, workers=8):
+    """Render a page of image sets into one RGB sprite.
+
+    resolve_path maps a dataset image path to a local file (or None);
+    boxes_by_image maps image paths to their label dicts.
+    """
+    side = cache.side
+    views = views_of(image_sets[0]) if image_sets else VIEWS
+    images = [image_set[view] for image_set in image_sets for view in views]
+
+    def load(image):
+        try:
+            local_path = resolve_path(image)
+            return cache.thumbnail(local_path) if local_path else None
+        except Exception as e:
+            print(f"Error creating thumbnail for {image}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        thumbnails = list(pool.map(load, images))
+
+    sprite = Image.new('RGB', sprite_size(len(image_sets), columns, side, len(views)), BACKGROUND)
+    draw = ImageDraw.Draw(sprite)
+    for n, (image, loaded) in enumerate(zip(images, thumbnails)):
+        if loaded is None:
+            continue
+        position, view_index = divmod(n, len(views))
+        cell_x, cell_y = cell_origin(position, columns, side, len(views))
+        _paste_view(sprite, draw, loaded[0], loaded[1], (cell_x + view_index * side, cell_y),
+                    boxes_by_image.get(image, []), side)
+    return sprite
+
+
+def encode_sprite(sprite, quality=80):
+    buffer = io.BytesIO()
+    sprite.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
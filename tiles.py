@@ -0,0 +1,180 @@
+"""Deep-zoom tile pyramids for the large tr_line / tr_int_full images.
+
+Levels follow the Deep Zoom layout: the top level is the full-resolution
+image and each level below halves both sides (rounding up). Every level is cut
+into TILE_SIZE square tiles, edge tiles being smaller; levels below min_level
+(the largest one that fits in a single tile) are not stored. A PNG can't be
+decoded partially, so the first request for any tile of an image decodes it
+once and writes its whole pyramid; later requests are plain file reads.
+Tiles are PNG so plotted lines stay sharp.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from single_flight import SingleFlight
+
+TILE_SIZE = 256
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "tile_cache")
+DEFAULT_MAX_BYTES = 1024 ** 3
+INFO_FILE = "info.json"
+
+
+def level_count(width, height):
+    """Levels from 1x1 up to full resolution"""
+    return math.ceil(math.log2(max(width, height, 1))) + 1
+
+
+def level_size(width, height, level, levels):
+    factor = 2 ** (levels - 1 - level)
+    return math.ceil(width / factor), math.ceil(height / factor)
+
+
+def min_level(width, height, tile_size=TILE_SIZE):
+    """Largest level whose whole image fits in one tile"""
+    levels = level_count(width, height)
+    level = levels - 1
+    while level > 0 and max(level_size(width, height, level, levels)) > tile_size:
+        level -= 1
+    return level
+
+
+def describe(width, height, tile_size=TILE_SIZE):
+    """Pyramid layout sent to the tagger (?tiles=info)"""
+    return {"width": width, "height": height, "tile_size": tile_size,
+            "levels": level_count(width, height), "min_level": min_level(width, height, tile_size)}
+
+
+def tile_path(directory, level, col, row):
+    return os.path.join(directory, str(level), f"{col}_{row}.png")
+
+
+class TileCache:
+    """On-disk tile pyramids keyed by source path, size and mtime, evicted least recently used first"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, tile_size=TILE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.tile_size = tile_size
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.pyramids = OrderedDict()  # {key: (info, bytes on disk)}, least recently used first
+        self.stats = {"builds": 0, "build_seconds": 0.0, "hits": 0, "evictions": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        for key in sorted(os.listdir(cache_dir), key=lambda k: os.path.getmtime(os.path.join(cache_dir, k))):
+            try:
+                with open(os.path.join(cache_dir, key, INFO_FILE), 'r') as f:
+                    info = json.load(f)
+                self.pyramids[key] = (info, info["bytes"])
+            except (OSError, ValueError, KeyError):
+                shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)  # Torn build
+
+    def _key(self, path):
+        st = os.stat(path)
+        key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{self.tile_size}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def pyramid(self, path):
+        """Return (directory, info) for an image's pyramid, building it on first use"""
+        key = self._key(path)
+        with self._lock:
+            entry = self.pyramids.get(key)
+            if entry is not None:
+                self.pyramids.move_to_end(key)
+                self.stats["hits"] += 1
+                return os.path.join(self.cache_dir, key), entry[0]
+        # Concurrent tile requests for one image share a single build
+        info = self._flight.do(key, lambda: self._build(path, key))
+        return os.path.join(self.cache_dir, key), info
+
+    def info(self, path):
+        return self.pyramid(path)[1]
+
+    def tile(self, path, level, col, row):
+        """Local file of one tile, or None if it is outside the pyramid"""
+        directory, info = self.pyramid(path)
+        if not info["min_level"] <= level < info["levels"]:
+            return None
+        width, height = level_size(info["width"], info["height"], level, info["levels"])
+        if not (0 <= col < math.ceil(width / self.tile_size) and 0 <= row < math.ceil(height / self.tile_size)):
+            return None
+        return tile_path(directory, level, col, row)
+
+    def _build(self, path, key):
+        with self._lock:
+            if key in self.pyramids:
+                return self.pyramids[key][0]
+        start = time.perf_counter()
+        build_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".build-")
+        try:
+            with Image.open(path) as img:
+                img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info else 'RGB')
+            info = describe(img.width, img.height, self.tile_size)
+            total = 0
+            for level in range(info["levels"] - 1, info["min_level"] - 1, -1):
+                os.makedirs(os.path.join(build_dir, str(level)))
+                for row in range(math.ceil(img.height / self.tile_size)):
+                    for col in range(math.ceil(img.width / self.tile_size)):
+                        box = (col * self.tile_size, row * self.tile_size,
+                               min((col + 1) * self.tile_size, img.width), min((row + 1) * self.tile_size, img.height))
+                        out = tile_path(build_dir, level, col, row)
+                        img.crop(box).save(out, format='PNG', compress_level=3)
+                        total += os.path.getsize(out)
+                if level > info["min_level"]:
+                    # reduce() averages 2x2 blocks and rounds odd sizes up, matching level_size()
+                    img = img.reduce(2)
+            info["bytes"] = total
+            with open(os.path.join(build_dir, INFO_FILE), 'w') as f:
+                json.dump(info, f)
+            final_dir = os.path.join(self.cache_dir, key)
+            shutil.rmtree(final_dir, ignore_errors=True)
+            os.replace(build_dir, final_dir)
+        except BaseException:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        with self._lock:
+            self.pyramids[key] = (info, total)
+            self.stats["builds"] += 1
+            self.stats["build_seconds"] += time.perf_counter() - start
+            self._evict(keep=key)
+        return info
+
+    def _evict(self, keep=None):
+        total = sum(size for _, size in self.pyramids.values())
+        for key in list(self.pyramids):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.pyramids.pop(key)[1]
+            shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+            self.stats["evictions"] += 1
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats, pyramids=len(self.pyramids), max_bytes=self.max_bytes,
+                        bytes=sum(size for _, size in self.pyramids.values()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the tile pyramid of images and report timings")
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    cache = TileCache(args.cache_dir)
+    for image in args.images:
+        start = time.perf_counter()
+        directory, info = cache.pyramid(image)
+        print(f"{image}: {info['width']}x{info['height']}, levels {info['min_level']}-{info['levels'] - 1}, "
+              f"{info['bytes'] / 1024:.0f} KiB of tiles in {time.perf_counter() - start:.2f}s -> {directory}")
@@ -0,0 +1,257 @@
+"""WebP / AVIF variants of dataset PNGs, picked from the client's Accept header.
+
+sr_int_full captures are photographic, so a lossy variant is a fraction of
+the PNG. The tr_line / tr_int_full plots (and any view listed as lossless)
+keep every pixel; they only get lossless WebP, which still beats PNG on most
+plots. Variants are cached on disk per source file, format and quality
+level. If a variant comes out no smaller than its source, the source is served.
+
+    python transcode.py [--root DIR | --synthetic-sets N] [--quality 50 75 90]
+
+measures bytes per image set and the estimated transfer time of a page for
+each format on the benchmark dataset.
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image, features
+
+from dataset_schema import DEFAULT_SCHEMA
+from single_flight import SingleFlight
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "transcode_cache")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_QUALITY = 75
+QUALITY_STEP = 5  # Client-requested qualities are rounded to this, bounding the variants per file
+MIN_QUALITY, MAX_QUALITY = 30, 95
+DEFAULT_LOSSLESS_VIEWS = ('tr_line', 'tr_int_full')
+# Lossless WebP compression effort: on 1600x900 plots, 50 with method 2 is about 5x faster than the
+# maximum and about 10% larger
+LOSSLESS_EFFORT = 50
+
+# Server preference order; AVIF is smaller but only exists in newer Pillow builds
+FORMATS = OrderedDict([
+    ("image/avif", {"pil": "AVIF", "ext": ".avif", "feature": "avif", "lossless": False}),
+    ("image/webp", {"pil": "WEBP", "ext": ".webp", "feature": "webp", "lossless": True}),
+])
+VIEW_SUFFIXES = DEFAULT_SCHEMA.suffixes
+
+
+def view_of(name, schema=DEFAULT_SCHEMA):
+    """View an image path belongs to, or None"""
+    return schema.view_of(name)
+
+
+def available_formats(names=None):
+    """Mime types (preference order) this Pillow can encode, optionally limited to names like 'webp'"""
+    return [mime for mime, spec in FORMATS.items()
+            if features.check(spec["feature"]) and (names is None or spec["feature"] in names)]
+
+
+def accepted_types(accept):
+    """{mime type: q} from an Accept header"""
+    types = {}
+    for part in (accept or "").split(','):
+        fields = [field.strip() for field in part.split(';')]
+        if not fields[0]:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        types[fields[0].lower()] = q
+    return types
+
+
+def negotiate(accept, formats, lossless=False):
+    """First of formats the client lists explicitly (a bare */* isn't enough), or None for the original PNG"""
+    types = accepted_types(accept)
+    for mime in formats:
+        if types.get(mime, 0) > 0 and (FORMATS[mime]["lossless"] or not lossless):
+            return mime
+    return None
+
+
+def clamp_quality(quality):
+    quality = QUALITY_STEP * round(int(quality) / QUALITY_STEP)
+    return min(max(quality, MIN_QUALITY), MAX_QUALITY)
+
+
+def encode(img, mime, quality, lossless, out):
+    """Write img to out (a path or file object) as mime"""
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if img.mode in ('LA', 'PA') or 'transparency' in img.info else 'RGB')
+    spec = FORMATS[mime]
+    if lossless:
+        img.save(out, format=spec["pil"], lossless=True, quality=LOSSLESS_EFFORT, method=2)
+    elif spec["pil"] == "AVIF":
+        img.save(out, format="AVIF", quality=quality, speed=8)
+    else:
+        img.save(out, format="WEBP", quality=quality, method=4)
+
+
+class TranscodeCache:
+    """On-disk variants keyed by source path, size, mtime, format and quality; least recently used are evicted"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.entries = OrderedDict()  # {file name: bytes}, least recently used first
+        self.not_smaller = set()  # Keys whose variant was no smaller than the source
+        self.stats = {"transcodes": 0, "transcode_seconds": 0.0, "hits": 0, "not_smaller": 0, "evictions": 0,
+                      "served": 0, "source_bytes": 0, "served_bytes": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        extensions = tuple(spec["ext"] for spec in FORMATS.values())
+        names = [name for name in os.listdir(cache_dir) if name.endswith(extensions)]
+        for name in sorted(names, key=lambda n: os.path.getmtime(os.path.join(cache_dir, n))):
+            self.entries[name] = os.path.getsize(os.path.join(cache_dir, name))
+
+    def _name(self, path, mime, quality, lossless):
+        st = os.stat(path)
+        key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{mime}|{'lossless' if lossless else quality}"
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + FORMATS[mime]["ext"]
+
+    def variant(self, path, mime, quality=DEFAULT_QUALITY, lossless=False):
+        """Cached variant of path, transcoding it on first use; None when the original should be served"""
+        name = self._name(path, mime, quality, lossless)
+        with self._lock:
+            if name in self.not_smaller:
+                return None
+            if name in self.entries:
+                self.entries.move_to_end(name)
+                self.stats["hits"] += 1
+                return os.path.join(self.cache_dir, name)
+        # Concurrent requests for one variant share a single encode
+        return self._flight.do(name, lambda: self._transcode(path, name, mime, quality, lossless))
+
+    def _transcode(self, path, name, mime, quality, lossless):
+        start = time.perf_counter()
+        fd, part_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, 'wb') as f, Image.open(path) as img:
+                encode(img, mime, quality, lossless, f)
+            size = os.path.getsize(part_path)
+            if size >= os.path.getsize(path):
+                with self._lock:
+                    self.not_smaller.add(name)
+                    self.stats["not_smaller"] += 1
+                return None
+            final_path = os.path.join(self.cache_dir, name)
+            os.replace(part_path, final_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        with self._lock:
+            self.entries[name] = size
+            self.stats["transcodes"] += 1
+            self.stats["transcode_seconds"] += time.perf_counter() - start
+            self._evict(keep=name)
+        return final_path
+
+    def _evict(self, keep=None):
+        total = sum(self.entries.values())
+        for name in list(self.entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self.entries.pop(name)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            self.stats["evictions"] += 1
+
+    def record_served(self, source_path, served_path):
+        """Count the bytes a response saved against sending the source"""
+        source_bytes = os.path.getsize(source_path)
+        with self._lock:
+            self.stats["served"] += 1
+            self.stats["source_bytes"] += source_bytes
+            self.stats["served_bytes"] += os.path.getsize(served_path) if served_path else source_bytes
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats, variants=len(self.entries), bytes=sum(self.entries.values()),
+                         max_bytes=self.max_bytes)
+        stats["saved_fraction"] = 1 - stats["served_bytes"] / stats["source_bytes"] if stats["source_bytes"] else 0.0
+        return stats
+
+
+def benchmark(files, formats, qualities, lossless_views, bandwidth):
+    """Per-view and per-set bytes served to a client preferring each format (and accepting the
+    ones after it, as browsers do), at each quality, with encode times"""
+    rows = []
+    sets = max(sum(1 for path in files if view_of(path) == 'sr_int_full'), 1)
+    for position, preferred in enumerate([None] + formats):
+        accept = ",".join(formats[position - 1:]) if preferred else ""
+        for quality in ([None] if preferred is None else qualities):
+            totals = {view: 0 for view in VIEW_SUFFIXES}
+            seconds = 0.0
+            for path, source in files.items():
+                view = view_of(path)
+                if view is None:
+                    continue
+                lossless = view in lossless_views
+                mime = negotiate(accept, formats, lossless)
+                if mime is None:
+                    totals[view] += os.path.getsize(source)
+                    continue
+                with tempfile.TemporaryFile() as out, Image.open(source) as img:
+                    start = time.perf_counter()
+                    encode(img, mime, quality, lossless, out)
+                    seconds += time.perf_counter() - start
+                    # Same rule as the server: keep the PNG when the variant isn't smaller
+                    totals[view] += min(out.tell(), os.path.getsize(source))
+            per_set = sum(totals.values()) / sets
+            rows.append({"format": FORMATS[preferred]["feature"] if preferred else "png", "quality": quality,
+                         "per_view_kib": {view: total / 1024 / sets for view, total in totals.items()},
+                         "per_set_kib": per_set / 1024, "page_ms": 1000 * per_set * 8 / bandwidth,
+                         "encode_ms_per_image": 1000 * seconds / max(len(files), 1)})
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure WebP/AVIF byte savings on a dataset of image sets")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--root', help='dataset directory (default: the fake hub\'s synthetic benchmark sets)')
+    source.add_argument('--synthetic-sets', type=int, default=20)
+    parser.add_argument('--content', choices=['scene', 'noise'], default='scene', help='synthetic image content (see fake_hub.py)')
+    parser.add_argument('--formats', nargs='+', default=['avif', 'webp'])
+    parser.add_argument('--quality', type=int, nargs='+', default=[50, DEFAULT_QUALITY, 90])
+    parser.add_argument('--lossless-views', nargs='*', default=list(DEFAULT_LOSSLESS_VIEWS))
+    parser.add_argument('--bandwidth', type=float, default=10e6, help='link speed in bits per second for the page transfer estimate')
+    args = parser.parse_args()
+
+    import fake_hub
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.root:
+            files = fake_hub.scan_directory(args.root)
+        else:
+            files = {}
+            for path, data in fake_hub.synthetic_files(args.synthetic_sets, content=args.content).items():
+                files[path] = os.path.join(tmp, path.replace('/', '_'))
+                with open(files[path], 'wb') as f:
+                    f.write(data)
+        rows = benchmark(files, available_formats(args.formats), args.quality, args.lossless_views, args.bandwidth)
+
+    png_per_set = rows[0]["per_set_kib"]
+    print(f"{'format':<8}{'quality':>8}" + "".join(f"{view:>14}" for view in VIEW_SUFFIXES)
+          + f"{'KiB/set':>10}{'saved':>8}{'page ms':>9}{'enc ms':>8}")
+    for row in rows:
+        print(f"{row['format']:<8}{row['quality'] or '-':>8}"
+              + "".join(f"{row['per_view_kib'][view]:>14.1f}" for view in VIEW_SUFFIXES)
+              + f"{row['per_set_kib']:>10.1f}{1 - row['per_set_kib'] / png_per_set:>8.0%}"
+              + f"{row['page_ms']:>9.0f}{row['encode_ms_per_image']:>8.1f}")
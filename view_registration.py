@@ -0,0 +1,130 @@
+"""Per-view affine registration between the three synchronized views of an image set.
+
+Every view maps its pixel coordinates into a shared normalized scene frame
+([0, 1] x [0, 1]). By default sr_int_full and tr_line cover their whole image,
+while tr_int_full only covers the rows that setupCanvas keeps after cropping
+TR_INT_FULL_CROP pixels from the top and bottom (images too short to crop
+cover their whole height). A JSON file can add a further affine per view (in
+normalized coordinates) for setups that are not aligned.
+"""
+
+import json
+
+import numpy as np
+
+from box_array import TR_INT_FULL_CROP, from_corners, to_corners
+from dataset_schema import DEFAULT_SCHEMA, views_of
+
+VIEW_SUFFIXES = DEFAULT_SCHEMA.suffixes
+CROPPED_VIEWS = {'tr_int_full': TR_INT_FULL_CROP}
+
+
+def view_of(image):
+    """Return the view name of an image path, or None"""
+    return DEFAULT_SCHEMA.view_of(image)
+
+
+class ViewRegistration:
+    """Affine transforms from each view's pixels to the shared scene frame"""
+
+    def __init__(self, overrides=None):
+        # {view: 3x3 matrix applied to normalized view coordinates}
+        self.overrides = {view: np.array(matrix, dtype=np.float64) for view, matrix in (overrides or {}).items()}
+        for view, matrix in self.overrides.items():
+            if matrix.shape == (2, 3):
+                self.overrides[view] = np.vstack([matrix, [0.0, 0.0, 1.0]])
+
+    @classmethod
+    def load(cls, path):
+        """Load per-view overrides from JSON: {"tr_line": [[a, b, c], [d, e, f]], ...}"""
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def to_scene(self, view, size):
+        """3x3 matrix from view pixel coordinates to scene coordinates"""
+        width, height = size
+        if width <= 0 or height <= 0:
+            raise ValueError(f"{view} image has no area ({width}x{height})")
+        crop = CROPPED_VIEWS.get(view, 0)
+        if height <= 2 * crop:
+            crop = 0  # Nothing would be left after the crop: the whole image is the scene
+        normalize = np.array([
+            [1.0 / width, 0.0, 0.0],
+            [0.0, 1.0 / (height - 2 * crop), -crop / (height - 2 * crop)],
+            [0.0, 0.0, 1.0]
+        ])
+        return self.overrides.get(view, np.eye(3)) @ normalize
+
+    def project(self, boxes, src_view, src_size, dst_view, dst_size):
+        """Project (N, 4) center/size boxes from one view to another (axis-aligned bounding box of the corners)"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if len(boxes) == 0:
+            return boxes
+        matrix = np.linalg.inv(self.to_scene(dst_view, dst_size)) @ self.to_scene(src_view, src_size)
+        corners = to_corners(boxes)
+        # (N, 4 corners, 3) homogeneous points
+        points = np.stack([
+            np.stack([corners[:, 0], corners[:, 1]], axis=1),
+            np.stack([corners[:, 2], corners[:, 1]], axis=1),
+            np.stack([corners[:, 0], corners[:, 3]], axis=1),
+            np.stack([corners[:, 2], corners[:, 3]], axis=1)
+        ], axis=1)
+        points = np.concatenate([points, np.ones(points.shape[:2] + (1,))], axis=2)
+        projected = points @ matrix.T
+        x, y = projected[:, :, 0], projected[:, :, 1]
+        return from_corners(x.min(axis=1), x.max(axis=1), y.min(axis=1), y.max(axis=1))
+
+
+def _has_area(size):
+    return size is not None and size[0] > 0 and size[1] > 0
+
+
+def propagate_to_views(labels, image_sets, sizes, registration, index=None, iou_threshold=0.9):
+    """Create projected copies of labelled boxes in the sibling views of their image set.
+
+    Boxes that are themselves projections are not projected again, and a projection
+    is skipped when the target view already has a box with IoU >= iou_threshold
+    (index is a spatial_index.SpatialIndex over the current labels). Returns the
+    new label dicts; the caller appends them.
+    """
+    image_to_set = {}  # {image path: (image set, view)}
+    for image_set in image_sets:
+        for view in views_of(image_set):
+            image_to_set[image_set[view]] = (image_set, view)
+
+    # Group source boxes by (source image, target image) so each pair is one batched projection
+    batches = {}
+    for label in labels:
+        if not (label.get("id") and label.get("name")) or label.get("projected_from"):
+            continue
+        image_set, src_view = image_to_set.get(label["image"], (None, None))
+        if image_set is None or not _has_area(sizes.get(label["image"])):
+            continue
+        for dst_view in views_of(image_set):
+            dst_image = image_set[dst_view]
+            if dst_view != src_view and _has_area(sizes.get(dst_image)):
+                batches.setdefault((label["image"], src_view, dst_image, dst_view), []).append(label)
+
+    new_labels = []
+    for (src_image, src_view, dst_image, dst_view), sources in batches.items():
+        boxes = np.array([(l["centerX"], l["centerY"], l["width"], l["height"]) for l in sources], dtype=np.float64)
+        projected = registration.project(boxes, src_view, sizes[src_image], dst_view, sizes[dst_image])
+        for source, box in zip(sources, projected.tolist()):
+            # Unaccepted proposals are suggestions, not boxes a projection could duplicate
+            if index is not None and index.find_duplicate(dst_image, *box, iou_threshold=iou_threshold,
+                                                          where=lambda label: not label.get("proposal")) is not None:
+                continue
+            new_label = {
+                "image": dst_image,
+                "id": source["id"],
+                "name": source["name"],
+                "centerX": box[0],
+                "centerY": box[1],
+                "width": box[2],
+                "height": box[3],
+                "projected_from": src_image
+            }
+            new_labels.append(new_label)
+            if index is not None:
+                index.add(new_label)
+    return new_labels